@@ -0,0 +1,126 @@
+# backtest.py
+#
+# Batched rolling-origin backtesting for the soil-moisture forecasters.
+#
+# All input windows of a series are taken at once as a strided view over `y`
+# and scored in one batched predict call per step: a one-step model is rolled
+# forward recursively (FORECAST_DAYS calls in total, each over every origin),
+# a multi-output model is scored in a single call. Errors are reported per
+# forecast horizon and per district, next to a persistence baseline.
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def make_windows(y, window, horizon=1):
+    """
+    Return (X, Y) for every origin of `y`: X is a read-only (n, window) strided
+    view of the inputs and Y the (n, horizon) targets that follow each window,
+    NaN-padded where the series ends before the horizon does.
+    """
+    y = np.asarray(y, dtype=np.float32)
+    n = len(y) - window
+    if n <= 0:
+        return np.empty((0, window), np.float32), np.empty((0, horizon), np.float32)
+    X = sliding_window_view(y, window)[:n]
+    y_pad = np.concatenate([y[window:], np.full(horizon - 1, np.nan, np.float32)])
+    Y = sliding_window_view(y_pad, horizon)
+    return X, Y
+
+
+def forecast_paths(predict, X, horizon):
+    """
+    Forecast `horizon` steps from every window in X (n, window).
+
+    `predict` maps a (n, window, 1) batch to (n, k) outputs. If k >= horizon
+    the model is treated as direct multi-output; otherwise it is rolled forward
+    recursively, feeding each batched prediction back into the windows.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    if len(X) == 0:
+        return np.empty((0, horizon), np.float32)
+    out = np.asarray(predict(X[..., None]), dtype=np.float32).reshape(len(X), -1)
+    if out.shape[1] >= horizon:
+        return out[:, :horizon]
+
+    paths = np.empty((len(X), horizon), np.float32)
+    paths[:, :out.shape[1]] = out
+    buf = np.concatenate([X, out], axis=1)
+    h = out.shape[1]
+    while h < horizon:
+        step = np.asarray(predict(buf[:, -X.shape[1]:, None]), dtype=np.float32).reshape(len(X), -1)
+        take = min(step.shape[1], horizon - h)
+        paths[:, h:h + take] = step[:, :take]
+        buf = np.concatenate([buf, step[:, :take]], axis=1)
+        h += take
+    return paths
+
+
+def _scores(err, base_err):
+    ok = ~np.isnan(err)
+    n = ok.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse = np.sqrt(np.nansum(err ** 2, axis=0) / n)
+        mae = np.nansum(np.abs(err), axis=0) / n
+        rmse_p = np.sqrt(np.nansum(base_err ** 2, axis=0) / n)
+    return n, rmse, mae, rmse_p
+
+
+def split_series(df, group_col="district"):
+    """Yield (district, series sorted by ds); a frame without `group_col` is one series 'all'."""
+    groups = df.groupby(group_col, sort=False) if group_col in df.columns else [("all", df)]
+    for name, g in groups:
+        yield name, g.sort_values("ds")
+
+
+def rolling_origin_backtest(predict, df, window, horizon, first_origin=None, step=1,
+                            group_col="district", since=None):
+    """
+    Score `predict` from every `step`-th origin of each series in `df`
+    (columns ds, y and optionally `group_col`) out to `horizon` days.
+
+    `first_origin` is the index of the first target scored (default: the
+    first complete window). `since` keeps only the origins whose targets all
+    fall after that date, e.g. the model's training cutoff, so the scores
+    are out of sample.
+
+    Returns a DataFrame with one row per (district, horizon): n, RMSE, MAE,
+    the persistence RMSE (last observed value carried forward) and the skill
+    score 1 - RMSE / RMSE_persistence.
+    """
+    rows = []
+    for name, g in split_series(df, group_col):
+        y = g.y.to_numpy(np.float32)
+        X, Y = make_windows(y, window, horizon)
+        start = max(0, (window if first_origin is None else first_origin) - window)
+        if since is not None:
+            first = np.searchsorted(g.ds.to_numpy(), np.datetime64(pd.Timestamp(since)), side="right")
+            start = max(start, first - window)
+        X, Y = X[start::step], Y[start::step]
+        if len(X) == 0:
+            continue
+        err = forecast_paths(predict, X, horizon) - Y
+        base_err = X[:, -1:] - Y
+        n, rmse, mae, rmse_p = _scores(err, base_err)
+        for h in range(horizon):
+            rows.append({"district": name, "horizon": h + 1, "n": int(n[h]),
+                         "RMSE": rmse[h], "MAE": mae[h], "RMSE_persistence": rmse_p[h]})
+    res = pd.DataFrame(rows, columns=["district", "horizon", "n", "RMSE", "MAE", "RMSE_persistence"])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        res["skill"] = 1 - res.RMSE / res.RMSE_persistence
+    return res
+
+
+def summarize(res):
+    """Pool per-district rows into one row per horizon (n-weighted)."""
+    w = res.n.astype(float)
+    by_h = lambda col: (col.fillna(0) * w).groupby(res.horizon).sum() / w.groupby(res.horizon).sum()
+    agg = pd.DataFrame({
+        "n": res.n.groupby(res.horizon).sum(),
+        "RMSE": np.sqrt(by_h(res.RMSE ** 2)),
+        "MAE": by_h(res.MAE),
+        "RMSE_persistence": np.sqrt(by_h(res.RMSE_persistence ** 2)),
+    })
+    agg["skill"] = 1 - agg.RMSE / agg.RMSE_persistence
+    return agg.reset_index()
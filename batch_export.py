@@ -0,0 +1,187 @@
+# batch_export.py
+#
+# Earth Engine batch-export backend for long backfills.
+#
+# Interactive getInfo() requests are capped in elements, payload and time, so
+# multi-year windows cannot come back that way. BatchExport splits the window
+# into month shards and starts one ee.batch.Export.table.toCloudStorage task
+# per shard (CSV, fixed columns). The shard -> task mapping is saved to
+# BATCH_DIR/<name>-<hash>.json after every change. An interrupted poller
+# (closed page, killed cron job) therefore picks up the same tasks on the next
+# run instead of starting them again. Completed shards are downloaded and kept
+# as Parquet under BATCH_DIR/<name>-<hash>/. Failed tasks are restarted up to
+# MAX_ATTEMPTS times per run.
+#
+# The bucket comes from SM_BATCH_BUCKET and is read with google-cloud-storage
+# (installed with earthengine-api). A local directory is read directly; that
+# is where fake_ee's task service writes.
+
+import io, os, json, time, hashlib
+from collections import Counter
+
+import pandas as pd
+
+from ee_executor import get_executor
+from obs_cache import _month_starts
+
+BATCH_DIR    = os.environ.get("SM_BATCH_DIR", "batch_state")
+BUCKET       = os.environ.get("SM_BATCH_BUCKET", "")
+PREFIX       = "sm_batch"  # object name prefix inside the bucket
+POLL_S       = float(os.environ.get("SM_BATCH_POLL_S", 30))
+MAX_ATTEMPTS = 3
+
+# Shard states: NEW/RETRY (task to be started), READY/RUNNING (task live),
+# DONE (downloaded) and FAILED (gave up after MAX_ATTEMPTS)
+PENDING = ("NEW", "RETRY")
+FINAL   = ("DONE", "FAILED")
+
+
+def month_shards(start, end):
+    """[start, end) cut at month boundaries, as (start, end) date strings."""
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    shards = []
+    for m in _month_starts(start, end):
+        a, b = max(start, m.start_time), min(end, (m + 1).start_time)
+        shards.append((a.strftime("%Y-%m-%d"), b.strftime("%Y-%m-%d")))
+    return shards
+
+
+def read_object(bucket, name):
+    """Bytes of one exported file: a local directory, or a Cloud Storage bucket."""
+    if os.path.isdir(bucket):
+        with open(os.path.join(bucket, name), "rb") as f:
+            return f.read()
+    from google.cloud import storage
+    return storage.Client().bucket(bucket).blob(name).download_as_bytes()
+
+
+class BatchExport:
+    """
+    Month-sharded Export.table tasks for one table, tracked in a state file.
+
+    `params` describes everything besides the dates that shapes the table
+    (districts, options); it selects the state file, so a different district
+    set never reuses another set's shards.
+    """
+
+    def __init__(self, name, columns, params=None, bucket=None, root=None):
+        if not (bucket or BUCKET):
+            raise ValueError("batch export needs a bucket: set SM_BATCH_BUCKET")
+        self.columns = list(columns)
+        self.params = params or {}
+        digest = hashlib.sha1(json.dumps(self.params, sort_keys=True).encode()).hexdigest()[:8]
+        self.name = f"{name}-{digest}"
+        self.bucket = bucket or BUCKET
+        root = root or BATCH_DIR
+        self.state_path = os.path.join(root, self.name + ".json")
+        self.shard_dir = os.path.join(root, self.name)
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.state = self._load()
+
+    # ------------------ State ------------------
+    def _load(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"params": self.params, "columns": self.columns, "shards": {}}
+
+    def _save(self):
+        with open(self.state_path + ".tmp", "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+    def _shard(self, start, end):
+        key = f"{start}_{end}"
+        return key, self.state["shards"].setdefault(
+            key, {"start": start, "end": end, "state": "NEW", "attempts": 0})
+
+    def progress(self, shards=None):
+        """{state: count} over the given (start, end) shards, or all of them."""
+        keys = [f"{a}_{b}" for a, b in shards] if shards is not None else list(self.state["shards"])
+        return Counter(self.state["shards"][k]["state"] for k in keys if k in self.state["shards"])
+
+    def failed(self, shards):
+        return [self.state["shards"][f"{a}_{b}"] for a, b in shards
+                if self.state["shards"].get(f"{a}_{b}", {}).get("state") == "FAILED"]
+
+    # ------------------ Tasks ------------------
+    def submit(self, ee, shards, build):
+        """Start a task for every shard that has none yet or may be retried."""
+        todo = [(key, sh) for key, sh in (self._shard(a, b) for a, b in shards) if sh["state"] in PENDING]
+
+        def start_task(item):
+            key, sh = item
+            obj = f"{PREFIX}/{self.name}/{key}.{sh['attempts'] + 1}"
+            task = ee.batch.Export.table.toCloudStorage(
+                collection=build(sh["start"], sh["end"]), description=f"{self.name}_{key}"[:100],
+                bucket=self.bucket, fileNamePrefix=obj, fileFormat="CSV", selectors=self.columns)
+            task.start()
+            return task.id, obj + ".csv"
+
+        # Saved after every start, so a crash never loses a running task
+        for (key, sh), (task_id, obj) in zip(todo, get_executor().imap(start_task, todo)):
+            sh.update(task_id=task_id, object=obj, state="READY", attempts=sh["attempts"] + 1)
+            self._save()
+        return len(todo)
+
+    def poll(self, ee):
+        """Refresh the live tasks' states and download the shards that completed."""
+        live = {sh["task_id"]: sh for sh in self.state["shards"].values()
+                if sh["state"] not in PENDING + FINAL}
+        if not live:
+            return self.progress()
+        for st in get_executor().call(ee.data.getTaskStatus, list(live)):
+            sh = live[st["id"]]
+            if st["state"] == "COMPLETED":
+                self._download(sh)
+                sh["state"] = "DONE"
+            elif st["state"] in ("FAILED", "CANCELLED", "UNKNOWN"):
+                sh["error"] = st.get("error_message", st["state"])
+                sh["state"] = "RETRY" if sh["attempts"] < MAX_ATTEMPTS else "FAILED"
+            else:
+                sh["state"] = st["state"]
+            self._save()
+        return self.progress()
+
+    def _path(self, sh):
+        return os.path.join(self.shard_dir, f"{sh['start']}_{sh['end']}.parquet")
+
+    def _download(self, sh):
+        raw = read_object(self.bucket, sh["object"])
+        # EE leaves out the header of an empty table
+        df = pd.read_csv(io.BytesIO(raw)) if raw.strip() else pd.DataFrame(columns=self.columns)
+        path = self._path(sh)
+        df.reindex(columns=self.columns).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+
+    # ------------------ Driver ------------------
+    def run(self, ee, start, end, build, wait=True, poll_s=POLL_S, on_progress=None):
+        """
+        Export [start, end) with `build(shard_start, shard_end)` giving each
+        shard's FeatureCollection. Submits and polls until every shard is done
+        or failed for good (or once, with wait=False), then returns the rows of
+        the finished shards.
+        """
+        shards = month_shards(start, end)
+        # Months that failed in an earlier run get another MAX_ATTEMPTS
+        for key, sh in (self._shard(a, b) for a, b in shards):
+            if sh["state"] == "FAILED":
+                sh.update(state="RETRY", attempts=0)
+        while True:
+            self.submit(ee, shards, build)
+            self.poll(ee)
+            counts = self.progress(shards)
+            if on_progress is not None:
+                on_progress(counts)
+            if not wait or sum(counts[s] for s in FINAL) == len(shards):
+                break
+            time.sleep(poll_s)
+        return self.frame(shards)
+
+    def frame(self, shards):
+        """Rows of the downloaded shards among `shards`, in date order."""
+        parts = [pd.read_parquet(self._path(sh)) for sh in (self._shard(a, b)[1] for a, b in shards)
+                 if sh["state"] == "DONE"]
+        parts = [p for p in parts if len(p)]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=self.columns)
@@ -0,0 +1,276 @@
+# benchmark.py
+#
+# Benchmarks for the exporters, the EE downscaling (interactive and batch
+# export) and the LSTM steps, run against fake_ee (no Earth Engine account or
+# network needed).
+#
+# Every benchmark runs in its own child process inside a scratch directory, so
+# Streamlit caches, the geometry store and peak memory start from zero. Each
+# step reports wall time, getInfo() round trips (and the JSON bytes they
+# returned), executor retries and the process peak RSS; exporter runs also keep
+# the script's own per-stage metrics (see instrument). Results are written to
+# bench_results/<commit>.json; pass --baseline with an earlier file to compare
+# and fail on regressions.
+#
+#   python benchmark.py --latency 0.1 --days 7
+#   python benchmark.py --only downscale --baseline bench_results/ac8f38d.json
+#   python benchmark.py --only chirps_export --days 365 --stream
+
+import os, sys, json, time, runpy, argparse, platform, tempfile, subprocess
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+ROOT        = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, "bench_results")
+MARK        = "@@bench "
+START       = "2024-06-01"
+DISTRICTS   = ["Aurangabad", "Latur", "Nanded"]
+EXPORTERS   = ["srtm_export", "modis_export", "gldas_export", "chirps_export"]
+BENCHMARKS  = EXPORTERS + ["downscale", "lstm"]
+METRICS     = ("wall_s", "getinfo", "payload_kb", "peak_rss_mb")
+# Absolute change a metric may show before its ratio counts as a regression
+SLACK       = {"wall_s": 0.25, "getinfo": 0, "payload_kb": 1.0, "peak_rss_mb": 16.0}
+
+
+# ------------------ Child side ------------------
+class Probe:
+    """Collects one result row per measured step."""
+
+    def __init__(self, bench):
+        self.bench, self.rows = bench, []
+
+    @contextmanager
+    def step(self, name):
+        import fake_ee, instrument
+        from ee_executor import get_executor
+        ex = get_executor()
+        fake_ee.reset_stats()
+        retries, t0 = ex.retries, time.perf_counter()
+        yield
+        wall = time.perf_counter() - t0
+        self.rows.append({
+            "bench": self.bench, "step": name,
+            "wall_s": round(wall, 3),
+            "getinfo": fake_ee.STATS["getinfo"],
+            "payload_kb": round(fake_ee.STATS["payload_bytes"] / 1024, 1),
+            "ee_latency_s": round(fake_ee.STATS["latency_s"], 3),
+            "retries": ex.retries - retries,
+            "peak_rss_mb": round(instrument.peak_rss_mb(), 1),
+        })
+
+
+def _script_argv(opts):
+    argv = ["--start", opts.start, "--end", opts.end]
+    for d in opts.districts:
+        argv += ["--district", d]
+    return argv + (["--stream"] if opts.stream else [])
+
+
+def bench_exporter(probe, opts):
+    script = os.path.join(ROOT, probe.bench + ".py")
+    sys.argv = [script] + _script_argv(opts)
+    with probe.step("run"):
+        runpy.run_path(script, run_name="__main__")
+    import instrument
+    probe.rows[-1]["stages"] = instrument.tracer().summary()
+
+
+def bench_downscale(probe, opts):
+    # The page reads its date window and districts from the command line on import
+    sys.argv = [os.path.join(ROOT, "rf_downscaling.py")] + _script_argv(opts)
+    import rf_downscaling, ee_session
+    rf_downscaling.ee = ee_session.get_ee()
+    geoms = rf_downscaling.get_districts(opts.districts)
+    for step, kw in [("batched", {}), ("regional", {"regional": True}), ("loop", {"batched": False})]:
+        with probe.step(step):
+            df = rf_downscaling.downscale(geoms, **kw)
+        probe.rows[-1]["rows"] = len(df)
+    # Batch export against fake_ee's task service, polled until every month is in
+    with probe.step("batch"):
+        df = rf_downscaling.downscale_batch(geoms)
+    probe.rows[-1]["rows"] = len(df)
+
+
+def synthetic_series(districts, end, days=730, seed=0):
+    """Seasonal soil-moisture-like daily series per district."""
+    rng = np.random.default_rng(seed)
+    ds = pd.date_range(end=pd.Timestamp(end) - pd.Timedelta(days=1), periods=days, freq="D")
+    doy = ds.dayofyear.values
+    frames = []
+    for i, d in enumerate(districts):
+        y = 0.22 + 0.08 * np.sin(2 * np.pi * (doy - 150 - 5 * i) / 365.25)
+        y = y + np.convolve(rng.normal(0, 0.01, days), np.ones(5) / 5, mode="same")
+        frames.append(pd.DataFrame({"ds": ds, "y": y, "district": d}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def bench_lstm(probe, opts):
+    sys.argv = [os.path.join(ROOT, "lstm_forecasting.py")]
+    import lstm_forecasting as lf
+    df = synthetic_series(opts.districts, opts.end, opts.series_days)
+    df.to_csv(lf.SERIES_CSV, index=False)
+    with probe.step("train_model"):
+        lf.train_model(df)
+    model = lf.cached_engine(lf.MODEL_FILE)
+    with probe.step("validate_model"):
+        lf.validate_model(model, df)
+    with probe.step("generate_forecast"):
+        fc = lf.generate_forecast(model, df)
+    probe.rows[-1]["rows"] = len(fc)
+
+
+def child(name, opts):
+    import fake_ee
+    fake_ee.configure(latency=opts.latency, jitter=opts.jitter, error_rate=opts.error_rate,
+                      task_seconds=opts.task_seconds, task_error_rate=opts.task_error_rate)
+    sys.modules["ee"] = fake_ee
+    # The geometry store is built once up front so it is not charged to any step
+    import district_geometry
+    district_geometry.load_store()
+
+    probe = Probe(name)
+    run = bench_exporter if name in EXPORTERS else globals()[f"bench_{name}"]
+    run(probe, opts)
+    print(MARK + json.dumps(probe.rows), flush=True)
+
+
+# ------------------ Parent side ------------------
+def run_child(name, opts, argv):
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as work:
+        env = dict(os.environ, PYTHONUNBUFFERED="1", TF_CPP_MIN_LOG_LEVEL="2",
+                   SM_CACHE_DIR=os.path.join(work, "obs_cache"),
+                   SM_GEOM_FILE=os.path.join(work, "district_geoms.geojson"),
+                   SM_STATIC_DIR=os.path.join(work, "static_grid"),
+                   SM_BATCH_DIR=os.path.join(work, "batch_state"),
+                   SM_BATCH_BUCKET=os.path.join(work, "bucket"),
+                   SM_BATCH_POLL_S=str(max(0.05, opts.task_seconds / 4)))
+        os.makedirs(env["SM_BATCH_BUCKET"])
+        env.pop("SM_START", None); env.pop("SM_END", None); env.pop("SM_DISTRICTS", None)
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name] + argv,
+                              cwd=work, env=env, capture_output=True, text=True)
+    rows = [json.loads(l[len(MARK):]) for l in proc.stdout.splitlines() if l.startswith(MARK)]
+    if proc.returncode or not rows:
+        tail = "\n".join((proc.stderr or proc.stdout).strip().splitlines()[-15:])
+        return [{"bench": name, "step": "error", "error": tail,
+                 "wall_s": round(time.perf_counter() - t0, 3)}]
+    return rows[0]
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return out + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(rows, baseline, tolerance):
+    """Print current vs baseline per step; return the regressed (bench, step, metric) keys."""
+    base = {(r["bench"], r["step"]): r for r in baseline["results"]}
+    regressed = []
+    print(f"\n{'step':32s}" + "".join(f"{m:>22s}" for m in METRICS))
+    for r in rows:
+        key = (r["bench"], r["step"])
+        line = f"{r['bench'] + '.' + r['step']:32s}"
+        for m in METRICS:
+            new, old = r.get(m), base.get(key, {}).get(m)
+            if new is None or old is None:
+                line += f"{'' if new is None else new:>22}"
+                continue
+            ratio = new / old if old else (1.0 if not new else float("inf"))
+            # round trips must not grow; the other metrics are allowed some noise
+            limit = 1.0 if m == "getinfo" else tolerance
+            flag = " !" if ratio > limit and new - old > SLACK[m] else "  "
+            if flag.strip():
+                regressed.append(key + (m,))
+            line += f"{f'{old} → {new}':>20s}{flag}"
+        print(line)
+    return regressed
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark exporters, downscaling and LSTM against fake_ee.")
+    p.add_argument("--only", nargs="+", choices=BENCHMARKS, help="run just these benchmarks")
+    p.add_argument("--latency", type=float, default=0.05, help="seconds per getInfo() (default 0.05)")
+    p.add_argument("--jitter", type=float, default=0.0, help="extra random latency per call, seconds")
+    p.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with a quota error")
+    p.add_argument("--task-seconds", type=float, default=0.5, help="time a fake batch task takes (default 0.5)")
+    p.add_argument("--task-error-rate", type=float, default=0.0, help="share of batch tasks that fail")
+    p.add_argument("--start", default=START, help=f"first date (default {START})")
+    p.add_argument("--days", type=int, default=7, help="length of the export window (default 7)")
+    p.add_argument("--district", dest="districts", action="append",
+                   help=f"district to include; repeat (default: {', '.join(DISTRICTS)})")
+    p.add_argument("--series-days", type=int, default=730, help="synthetic series length for the LSTM")
+    p.add_argument("--stream", action="store_true", help="run the exporters in --stream mode")
+    p.add_argument("--out", help="results file (default bench_results/<commit>.json)")
+    p.add_argument("--baseline", help="earlier results file to compare against")
+    p.add_argument("--tolerance", type=float, default=1.25,
+                   help="allowed wall-time/memory ratio against the baseline (default 1.25)")
+    p.add_argument("--child", help=argparse.SUPPRESS)
+    opts = p.parse_args(argv)
+    opts.districts = opts.districts or list(DISTRICTS)
+    opts.end = (pd.Timestamp(opts.start) + pd.Timedelta(days=opts.days)).strftime("%Y-%m-%d")
+
+    if opts.child:
+        child(opts.child, opts)
+        return 0
+
+    child_argv = ["--latency", str(opts.latency), "--jitter", str(opts.jitter),
+                  "--error-rate", str(opts.error_rate), "--task-seconds", str(opts.task_seconds),
+                  "--task-error-rate", str(opts.task_error_rate), "--start", opts.start, "--days", str(opts.days),
+                  "--series-days", str(opts.series_days)] + (["--stream"] if opts.stream else [])
+    for d in opts.districts:
+        child_argv += ["--district", d]
+
+    rows = []
+    for name in opts.only or BENCHMARKS:
+        print(f"[{name}] running…", flush=True)
+        out = run_child(name, opts, child_argv)
+        for r in out:
+            if r["step"] == "error":
+                print(f"[{name}] failed:\n{r['error']}")
+            else:
+                print(f"[{name}.{r['step']}] {r['wall_s']}s, {r['getinfo']} getInfo, "
+                      f"{r['payload_kb']} KB, {r['retries']} retries, peak {r['peak_rss_mb']} MB")
+        rows += out
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "created": pd.Timestamp.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {"latency": opts.latency, "jitter": opts.jitter, "error_rate": opts.error_rate,
+                   "task_seconds": opts.task_seconds, "task_error_rate": opts.task_error_rate,
+                   "start": opts.start, "end": opts.end, "districts": opts.districts,
+                   "series_days": opts.series_days, "stream": opts.stream},
+        "results": rows,
+    }
+    path = opts.out or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(result, f, indent=1)
+    print(f"\nResults written to {path}")
+
+    failed = any(r["step"] == "error" for r in rows)
+    if opts.baseline:
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print("Note: baseline was run with different parameters; ratios are not comparable.")
+        regressed = compare(rows, baseline, opts.tolerance)
+        if regressed:
+            print(f"\n{len(regressed)} regression(s): "
+                  + ", ".join(f"{b}.{s} {m}" for b, s, m in regressed))
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
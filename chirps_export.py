@@ -1,86 +1,198 @@
-import ee
 import streamlit as st
 import pandas as pd
-import datetime
-from dateutil.relativedelta import relativedelta
-import tempfile, os, json
-
-# ------------------ Earth Engine Initialization ------------------
-def init_ee():
-    if "ee_credentials" not in st.secrets:
-        st.error("Missing Earth Engine credentials in secrets.")
-        st.stop()
-    raw = st.secrets["ee_credentials"]["json"]
-    key_data = json.dumps(raw) if isinstance(raw, dict) else raw
-    creds = json.loads(key_data)
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as tf:
-        tf.write(key_data)
-        key_path = tf.name
-    try:
-        ee.Initialize(ee.ServiceAccountCredentials(creds['client_email'], key_path))
-        st.success("✅ Earth Engine initialized")
-    finally:
-        os.remove(key_path)
+import numpy as np
+from obs_cache import ObservationCache
+from ee_executor import get_executor, ee_date_str
+from ee_session import init_ee, district_geoms as session_geoms
+from columnar import ColumnarRecords, download_buttons
+from run_config import parse_args
+from streaming import export_cached
+import instrument
 
 # ------------------ Parameters ------------------
-DISTRICTS = ['Aurangabad','Bid','Hingoli','Jalna','Latur','Osmanabad','Parbhani','Nanded']
+ARGS = parse_args()  # --start/--end/--district, see run_config
+DISTRICTS = ARGS.districts
 BUFFER_M = 5000  # buffer around district boundaries
-START = datetime.date.today() - relativedelta(months=12)
-END   = datetime.date.today()
+START = pd.Timestamp(ARGS.start).date()
+END   = pd.Timestamp(ARGS.end).date()
 
-# ------------------ Load GAUL and Prepare District Polygons ------------------
-init_ee()
-gaul = ee.FeatureCollection("FAO/GAUL/2015/level2") \
-    .filter(ee.Filter.eq('ADM0_NAME','India')) \
-    .filter(ee.Filter.eq('ADM1_NAME','Maharashtra'))
-
-# Build a dict of district geometries
-district_geoms = {d: gaul.filter(ee.Filter.eq('ADM2_NAME', d)).geometry().buffer(BUFFER_M) 
-                  for d in DISTRICTS}
+# EE client, district geometries and progress widgets, set up by main()
+ee = district_geoms = progress = status = None
 
 # ------------------ CHIRPS Precipitation Export ------------------
-# Daily precipitation raster
-chirps = ee.ImageCollection("UCSB-CHG/CHIRPS/DAILY") \
-    .filterDate(START.strftime('%Y-%m-%d'), END.strftime('%Y-%m-%d'))
-
-st.title("🌧️ CHIRPS Precipitation Export by District")
-st.write(f"Period: {START} to {END}")
-progress = st.progress(0)
-status = st.empty()
-all_records = []
-
-# Iterate per image and per district
-dates = chirps.aggregate_array('system:time_start').getInfo()
-total = len(dates)
-for idx, ts in enumerate(dates):
-    img = ee.Image(chirps.filter(ee.Filter.eq('system:time_start', ts)).first())
-    date_str = img.date().format('YYYY-MM-dd').getInfo()
-    status.write(f"Processing image {idx+1}/{total}: {date_str}")
-    # Sample every pixel in each district
-    for d, geom in district_geoms.items():
-        pts = img.sample(
-            region=geom,
+CHUNK = 'M'  # bulk mode: one stacked multi-band image per calendar month
+
+def chirps_records():
+    # Coordinates stay float64 so pixel centres can be matched exactly
+    return ColumnarRecords(['district','date','band'],
+                           {'lon': np.float64, 'lat': np.float64, 'value': np.float32})
+
+def fetch_chirps(districts, start, end, bulk=True):
+    if bulk:
+        return fetch_chirps_bulk(districts, start, end)
+    return fetch_chirps_daily(districts, start, end)
+
+def fetch_chirps_bulk(districts, start, end):
+    """
+    Stack each month of daily images into one multi-band image and sample every
+    district's 5 km pixel grid once per month. Results are decoded straight into
+    (pixels × days) float32 arrays instead of one dict per pixel per day.
+    """
+    chirps = ee.ImageCollection("UCSB-CHG/CHIRPS/DAILY").filterDate(start, end).select('precipitation')
+    ex = get_executor()
+    times = ex.get_info(chirps.aggregate_array('system:time_start'))
+    rec = chirps_records()
+    if not times:
+        return rec.to_frame(['district','date','lon','lat','band','value'])
+
+    # Group timestamps into month chunks, keeping collection order
+    periods = pd.to_datetime(times, unit='ms').to_period(CHUNK)
+    chunks = [[ts for ts, p in zip(times, periods) if p == per] for per in periods.unique()]
+
+    def sample_chunk(task):
+        ts_list, d = task
+        stack = (chirps.filter(ee.Filter.inList('system:time_start', ts_list))
+                       .toBands()
+                       .rename([f'd{i}' for i in range(len(ts_list))]))
+        return stack.sample(
+            region=district_geoms[d],
+            scale=5000,
+            geometries=True,
+            dropNulls=False
+        ).getInfo()['features']
+
+    tasks = [(ts_list, d) for ts_list in chunks for d in districts]
+    with instrument.stage("ee_fetch") as s:
+        for i, ((ts_list, d), pts) in enumerate(zip(tasks, ex.imap(sample_chunk, tasks))):
+            status.write(f"Sampled {d}, {ee_date_str(ts_list[0])[:7]} ({len(ts_list)} days)")
+            progress.progress((i+1)/len(tasks))
+            if not pts:
+                continue
+            # Decoded straight into flat arrays; EE nulls (masked days) become NaN
+            names = [f'd{j}' for j in range(len(ts_list))]
+            xy = np.fromiter((c for f in pts for c in f['geometry']['coordinates'][:2]),
+                             np.float64, count=2 * len(pts)).reshape(-1, 2)
+            vals = np.fromiter((np.nan if (v := f['properties'].get(b)) is None else v
+                                for f in pts for b in names),
+                               np.float32, count=len(pts) * len(names)).reshape(len(pts), -1)
+            # dropNulls=False keeps pixels masked on every day (ocean, outside
+            # the CHIRPS land mask) as all-NaN rows: drop those
+            keep = ~np.isnan(vals).all(axis=1)
+            xy, vals = xy[keep], vals[keep]
+            n_pix, n_days = vals.shape
+            if n_pix == 0:
+                continue
+            rec.extend(
+                district=d,
+                date=np.tile(np.array([ee_date_str(ts) for ts in ts_list]), n_pix),
+                lon=np.repeat(xy[:, 0], n_days),
+                lat=np.repeat(xy[:, 1], n_days),
+                band='precip_mm',
+                value=vals.ravel(),
+            )
+            s.rows += vals.size
+
+    with instrument.stage("frame"):
+        return rec.to_frame(['district','date','lon','lat','band','value'])
+
+def fetch_chirps_daily(districts, start, end):
+    # Daily precipitation raster
+    chirps = ee.ImageCollection("UCSB-CHG/CHIRPS/DAILY").filterDate(start, end)
+    all_records = chirps_records()
+
+    # Iterate per image and per district; requests go through the shared executor
+    ex = get_executor()
+    dates = ex.get_info(chirps.aggregate_array('system:time_start'))
+    total = len(dates)
+
+    def sample_district(task):
+        ts, d = task
+        img = ee.Image(chirps.filter(ee.Filter.eq('system:time_start', ts)).first())
+        # Sample every pixel in the district
+        return img.sample(
+            region=district_geoms[d],
             scale=5000,
             geometries=True
         ).getInfo()['features']
-        for f in pts:
-            coords = f['geometry']['coordinates']
-            precip = f['properties']['precipitation']
-            all_records.append({
-                'district': d,
-                'date': date_str,
-                'lon': coords[0],
-                'lat': coords[1],
-                'precip_mm': precip
-            })
-    progress.progress((idx+1)/total)
-
-# Build DataFrame and display
-df = pd.DataFrame(all_records)
-df['date'] = pd.to_datetime(df['date'])
-
-st.write(f"Exported {len(df)} pixels")
-st.dataframe(df)
-
-csv = df.to_csv(index=False).encode('utf-8')
-st.download_button("Download pixel-level CSV", data=csv, file_name='chirps_by_district_pixels.csv')
\ No newline at end of file
+
+    tasks = [(ts, d) for ts in dates for d in districts]
+    with instrument.stage("ee_fetch") as s:
+        for i, ((ts, d), pts) in enumerate(zip(tasks, ex.imap(sample_district, tasks))):
+            idx = i // len(districts)
+            date_str = ee_date_str(ts)
+            if d == districts[0]:
+                status.write(f"Processing image {idx+1}/{total}: {date_str}")
+            for f in pts:
+                coords = f['geometry']['coordinates']
+                precip = f['properties']['precipitation']
+                all_records.append(
+                    district=d,
+                    date=date_str,
+                    lon=coords[0],
+                    lat=coords[1],
+                    band='precip_mm',
+                    value=precip
+                )
+            s.rows += len(pts)
+            if d == districts[-1]:
+                progress.progress((idx+1)/total)
+    with instrument.stage("frame"):
+        return all_records.to_frame(['district','date','lon','lat','band','value'])
+
+# Only dates missing from the local cache are requested from EE, and the
+# refresh is memoized per argument set so widget reruns do not touch EE (the
+# cache would otherwise re-fetch the last observed day). Only the refresh is
+# memoized: a memoized frame would be pickled into st.cache_data and copied
+# out on every rerun, so the rows are read back from the Parquet cache.
+# The --stream path goes through export_cached and never calls this.
+@st.cache_data(show_spinner=False)
+def refresh_chirps(districts, start, end):
+    ObservationCache().fill('chirps', list(districts), start, end, fetch_chirps)
+
+def load_chirps(districts, start, end):
+    refresh_chirps(districts, start, end)
+    return ObservationCache().load('chirps', start, end, list(districts))
+
+def chirps_output(cached):
+    df = cached.rename(columns={'value': 'precip_mm'})[['district','date','lon','lat','precip_mm']]
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+def main():
+    global ee, district_geoms, progress, status
+    # Session-wide EE client (initialized once per process, not per rerun)
+    with instrument.stage("ee_init"):
+        ee = init_ee()
+
+    # Buffered, simplified district geometries from the local geometry store
+    with instrument.stage("geometry"):
+        district_geoms = session_geoms(tuple(DISTRICTS), buffer_m=BUFFER_M)
+
+    st.title("🌧️ CHIRPS Precipitation Export by District")
+    st.write(f"Period: {START} to {END}")
+    progress = st.progress(0)
+    status = st.empty()
+
+    start_s, end_s = START.strftime('%Y-%m-%d'), END.strftime('%Y-%m-%d')
+    if ARGS.stream:
+        # Bounded memory: one month in flight, results go straight to exports/
+        _, n = export_cached('chirps', DISTRICTS, start_s, end_s, fetch_chirps, chirps_output,
+                             'chirps_by_district_pixels', "Download pixel-level data")
+        st.write(f"Exported {n} pixels")
+    else:
+        with instrument.stage("cache") as s:
+            cached = load_chirps(tuple(DISTRICTS), start_s, end_s)
+            s.rows += len(cached)
+
+        # Build DataFrame and display
+        with instrument.stage("frame"):
+            df = chirps_output(cached)
+
+        st.write(f"Exported {len(df)} pixels")
+        with instrument.stage("render"):
+            st.dataframe(df)
+            download_buttons(df, 'chirps_by_district_pixels', "Download pixel-level data")
+
+if __name__ == "__main__":
+    with instrument.run("chirps_export"):
+        main()
\ No newline at end of file
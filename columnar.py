@@ -0,0 +1,164 @@
+# columnar.py
+#
+# Columnar, typed record builder and binary output helpers for exporter tables.
+#
+# Exporters append rows (or whole blocks of rows) into preallocated NumPy
+# arrays instead of growing lists of per-row dicts: value columns are float32
+# by default, and string key columns (district, product, variable, band, date)
+# are stored as integer codes and come out as pandas Categoricals. Frames can
+# then be offered as CSV, Parquet and Arrow IPC downloads.
+
+import io
+import functools
+import numpy as np
+import pandas as pd
+
+
+class ColumnarRecords:
+    """
+    Append-only table with categorical `keys` and numeric `values` columns.
+
+    `values` is a list of column names (float32) or a {name: dtype} dict.
+    Arrays start at `capacity` rows and double when full.
+    """
+
+    def __init__(self, keys, values, capacity=1024):
+        self.keys = list(keys)
+        self.dtypes = (dict(values) if isinstance(values, dict)
+                       else {v: np.float32 for v in values})
+        self.n = 0
+        self._cap = max(1, capacity)
+        self._codes = {k: np.empty(self._cap, dtype=np.int32) for k in self.keys}
+        self._cats = {k: {} for k in self.keys}
+        self._vals = {v: np.empty(self._cap, dtype=dt) for v, dt in self.dtypes.items()}
+
+    def __len__(self):
+        return self.n
+
+    def _reserve(self, extra):
+        need = self.n + extra
+        if need <= self._cap:
+            return
+        while self._cap < need:
+            self._cap *= 2
+        for cols in (self._codes, self._vals):
+            for c, arr in cols.items():
+                grown = np.empty(self._cap, dtype=arr.dtype)
+                grown[:self.n] = arr[:self.n]
+                cols[c] = grown
+
+    def _code(self, key, label):
+        cats = self._cats[key]
+        code = cats.get(label)
+        if code is None:
+            code = cats[label] = len(cats)
+        return code
+
+    def append(self, **row):
+        """Append one row; missing or None values become NaN."""
+        self._reserve(1)
+        i = self.n
+        for k in self.keys:
+            self._codes[k][i] = self._code(k, row[k])
+        for v in self._vals:
+            x = row.get(v)
+            self._vals[v][i] = np.nan if x is None else x
+        self.n += 1
+
+    def extend(self, **cols):
+        """
+        Append a block of rows. Key columns may be a scalar (broadcast) or an
+        array of labels; value columns are array-likes of equal length.
+        """
+        m = next(len(c) for c in cols.values() if np.ndim(c) > 0)
+        self._reserve(m)
+        i, j = self.n, self.n + m
+        for k in self.keys:
+            labels = cols[k]
+            if np.ndim(labels) == 0:
+                self._codes[k][i:j] = self._code(k, labels)
+            else:
+                uniq, inv = np.unique(np.asarray(labels), return_inverse=True)
+                table = np.array([self._code(k, u.item() if hasattr(u, 'item') else u) for u in uniq],
+                                 dtype=np.int32)
+                self._codes[k][i:j] = table[inv.ravel()]
+        for v in self._vals:
+            x = cols.get(v)
+            self._vals[v][i:j] = np.nan if x is None else np.asarray(x, dtype=self._vals[v].dtype)
+        self.n = j
+
+    def to_frame(self, columns=None):
+        out = {}
+        for k in self.keys:
+            # Categories in sorted order (not first-seen), so sorting on a key
+            # column orders rows alphabetically as with plain strings
+            cats = list(self._cats[k])
+            order = sorted(range(len(cats)), key=cats.__getitem__)
+            rank = np.empty(len(cats), dtype=np.int32)
+            rank[order] = np.arange(len(cats), dtype=np.int32)
+            out[k] = pd.Categorical.from_codes(rank[self._codes[k][:self.n]],
+                                               categories=[cats[i] for i in order])
+        for v in self._vals:
+            out[v] = self._vals[v][:self.n]
+        df = pd.DataFrame(out)
+        return df[columns] if columns is not None else df
+
+
+def categorize(df, columns):
+    """Cast the given string columns to pandas Categoricals in place."""
+    for c in columns:
+        if c in df.columns:
+            df[c] = df[c].astype('category')
+    return df
+
+
+# ------------------ Output ------------------
+def to_csv_bytes(df):
+    return df.to_csv(index=False).encode('utf-8')
+
+
+def to_parquet_bytes(df):
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+def to_arrow_ipc_bytes(df):
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+FORMATS = {
+    'csv':     ('CSV',       '.csv',     'text/csv',                            to_csv_bytes),
+    'parquet': ('Parquet',   '.parquet', 'application/vnd.apache.parquet',      to_parquet_bytes),
+    'arrow':   ('Arrow IPC', '.arrow',   'application/vnd.apache.arrow.file',   to_arrow_ipc_bytes),
+}
+
+
+def download_buttons(df, basename, label="Download", formats=('csv', 'parquet', 'arrow')):
+    """
+    Render one Streamlit download button per output format. Each file is
+    encoded only when its button is clicked, not on every rerun, and a click
+    does not rerun the page.
+    """
+    import streamlit as st
+    for fmt in formats:
+        name, ext, mime, encode = FORMATS[fmt]
+        st.download_button(f"{label} ({name})", data=functools.partial(encode, df),
+                           file_name=basename + ext, mime=mime, key=f"{basename}-{fmt}",
+                           on_click="ignore")
+
+
+def write_outputs(df, basename, formats=('csv', 'parquet')):
+    """Write `df` to disk as <basename>.csv / .parquet / .arrow."""
+    paths = []
+    for fmt in formats:
+        _, ext, _, encode = FORMATS[fmt]
+        with open(basename + ext, 'wb') as f:
+            f.write(encode(df))
+        paths.append(basename + ext)
+    return paths
@@ -0,0 +1,94 @@
+# compositing.py
+#
+# Server-side temporal compositing applied before anything is extracted.
+#
+# Each exporter declares a cadence (daily / weekly / dekadal, or native to
+# keep the source timestep) and a reducer (mean / sum / max / min, optionally
+# per band) for its collections. composite() turns a raw collection into one
+# image per period, reduced in Earth Engine and stamped with the period start,
+# so a 3-hourly GLDAS day becomes one row per district instead of eight.
+# Periods come from fixed calendar boundaries (weeks start on Monday, dekads
+# on the 1st, 11th and 21st), so a partial refresh lands on the same dates as
+# a full export.
+
+import pandas as pd
+
+CADENCES = ("native", "daily", "weekly", "dekadal")
+REDUCERS = ("mean", "sum", "max", "min")
+
+
+def period_floor(date, cadence):
+    """Start of the period that contains `date`."""
+    t = pd.Timestamp(date).normalize()
+    if cadence == "weekly":
+        return t - pd.Timedelta(days=t.weekday())
+    if cadence == "dekadal":
+        return t.replace(day=min(1 + (t.day - 1) // 10 * 10, 21))
+    return t
+
+
+def periods(start, end, cadence):
+    """(t0, t1) bounds of every period overlapping [start, end)."""
+    if cadence not in CADENCES or cadence == "native":
+        raise ValueError(f"Unknown cadence: {cadence}")
+    t, end = period_floor(start, cadence), pd.Timestamp(end)
+    out = []
+    while t < end:
+        if cadence == "daily":
+            nxt = t + pd.Timedelta(days=1)
+        elif cadence == "weekly":
+            nxt = t + pd.Timedelta(days=7)
+        else:
+            nxt = t + pd.offsets.MonthBegin(1) if t.day == 21 else t + pd.Timedelta(days=10)
+        out.append((t, nxt))
+        t = nxt
+    return out
+
+
+def _reducer(name):
+    import ee
+    if name not in REDUCERS:
+        raise ValueError(f"Unknown reducer: {name}")
+    return getattr(ee.Reducer, name)()
+
+
+def composite(col, start, end, bands, cadence="daily", reducer="mean"):
+    """
+    `col` filtered to [start, end) and composited to `cadence`. `reducer` is
+    one name or a {band: name} dict. Output images keep the band names, carry
+    the period start as system:time_start and the source image count as
+    n_images; periods without any source image are dropped.
+    """
+    import ee
+    col = ee.ImageCollection(col)
+    if cadence == "native":
+        return col.filterDate(start, end).select(bands)
+
+    by_reducer = {}
+    for b in bands:
+        r = reducer.get(b, "mean") if isinstance(reducer, dict) else reducer
+        by_reducer.setdefault(r, []).append(b)
+    ps = periods(start, end, cadence)
+    # The last period stops at `end`: a partial period is composited from the
+    # images so far and replaced when a later refresh covers it (see
+    # ObservationCache's `align`)
+    if ps:
+        ps[-1] = (ps[-1][0], min(ps[-1][1], pd.Timestamp(end)))
+    # Window the source collection once; the first period may start before `start`
+    src = col.filterDate(ps[0][0].strftime("%Y-%m-%d"), ps[-1][1].strftime("%Y-%m-%d")).select(bands) \
+        if ps else col.filterDate(start, end).select(bands)
+    bounds = ee.List([[int(t0.value // 10**6), int(t1.value // 10**6)] for t0, t1 in ps])
+
+    def make(p):
+        p = ee.List(p)
+        t0, t1 = ee.Number(p.get(0)), ee.Number(p.get(1))
+        sub = src.filterDate(t0, t1)
+        img = ee.Image.cat([sub.select(bs).reduce(_reducer(r)).rename(bs)
+                            for r, bs in by_reducer.items()]).select(bands)
+        return ee.Algorithms.If(
+            sub.size().gt(0),
+            img.set({"system:time_start": t0, "n_images": sub.size()}),
+            ee.Image().set({"system:time_start": t0, "n_images": 0}))
+
+    return (ee.ImageCollection.fromImages(bounds.map(make))
+              .filter(ee.Filter.gt("n_images", 0)))
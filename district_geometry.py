@@ -0,0 +1,158 @@
+# district_geometry.py
+#
+# Persisted store of the buffered, simplified Marathwada district polygons.
+#
+# The GAUL level-2 boundaries are filtered, buffered and simplified in Earth
+# Engine exactly once, pulled back with a single getInfo(), and written to
+# GEOM_FILE as a GeoJSON FeatureCollection together with the build parameters
+# and a SHA-256 of the geometry content. Every script loads the polygons from
+# there instead of re-filtering GAUL and re-buffering on every request, and
+# the same coordinates are available locally for clipping and
+# point-in-polygon work.
+
+import os, json, hashlib
+import numpy as np
+
+DISTRICTS  = ['Aurangabad','Bid','Hingoli','Jalna','Latur','Osmanabad','Parbhani','Nanded']
+GEOM_FILE  = os.environ.get("SM_GEOM_FILE", "district_geoms.geojson")
+BUFFER_M   = 5000  # buffer around district boundaries
+SIMPLIFY_M = 250   # max error when simplifying the buffered polygon
+GAUL_COLL  = "FAO/GAUL/2015/level2"
+
+
+def content_hash(features):
+    """SHA-256 over the canonical JSON of the district geometries."""
+    canon = json.dumps([[f['properties']['district'], f['geometry']] for f in features],
+                       sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canon.encode('utf-8')).hexdigest()
+
+
+# ------------------ Build & persist ------------------
+def build_store(names=DISTRICTS, buffer_m=BUFFER_M, simplify_m=SIMPLIFY_M, path=GEOM_FILE):
+    import ee
+    from ee_executor import get_executor
+
+    gaul = (ee.FeatureCollection(GAUL_COLL)
+              .filter(ee.Filter.eq('ADM0_NAME', 'India'))
+              .filter(ee.Filter.eq('ADM1_NAME', 'Maharashtra')))
+    fc = ee.FeatureCollection([
+        ee.Feature(gaul.filter(ee.Filter.eq('ADM2_NAME', d)).geometry()
+                       .buffer(buffer_m).simplify(simplify_m),
+                   {'district': d})
+        for d in names
+    ])
+    features = [{'type': 'Feature', 'properties': {'district': f['properties']['district']},
+                 'geometry': f['geometry']}
+                for f in get_executor().get_info(fc)['features']]
+
+    store = {
+        'type': 'FeatureCollection',
+        'params': {'buffer_m': buffer_m, 'simplify_m': simplify_m, 'source': GAUL_COLL},
+        'sha256': content_hash(features),
+        'features': features,
+    }
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(store, f)
+    os.replace(tmp, path)
+    return store
+
+
+def read_store(path=GEOM_FILE):
+    """Return the stored FeatureCollection, or None if missing or corrupt."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            store = json.load(f)
+    except ValueError:
+        return None
+    if store.get('sha256') != content_hash(store.get('features', [])):
+        return None
+    return store
+
+
+def load_store(names=DISTRICTS, buffer_m=BUFFER_M, simplify_m=SIMPLIFY_M, path=GEOM_FILE):
+    """Load the store, (re)building it when missing, stale or lacking a district."""
+    store = read_store(path)
+    ok = (store is not None
+          and store['params'].get('buffer_m') == buffer_m
+          and store['params'].get('simplify_m') == simplify_m
+          and set(names) <= {f['properties']['district'] for f in store['features']})
+    if not ok:
+        want = list(dict.fromkeys(list(DISTRICTS) + list(names)))
+        store = build_store(want, buffer_m, simplify_m, path)
+    return store
+
+
+def district_geojson(names=DISTRICTS, **kw):
+    """{district: GeoJSON geometry dict} in the order of `names`."""
+    by_name = {f['properties']['district']: f['geometry'] for f in load_store(names, **kw)['features']}
+    return {d: by_name[d] for d in names}
+
+
+# ------------------ Earth Engine views ------------------
+def get_district_geoms(names=DISTRICTS, **kw):
+    """{district: ee.Geometry} built client-side from the stored coordinates."""
+    import ee
+    return {d: ee.Geometry(g) for d, g in district_geojson(names, **kw).items()}
+
+
+def get_district_fc(names=DISTRICTS, **kw):
+    """ee.FeatureCollection of all districts with a 'district' property."""
+    import ee
+    return ee.FeatureCollection([ee.Feature(ee.Geometry(g), {'district': d})
+                                 for d, g in district_geojson(names, **kw).items()])
+
+
+# ------------------ Local geometry ------------------
+def _polygons(geom):
+    if geom['type'] == 'Polygon':
+        return [geom['coordinates']]
+    if geom['type'] == 'MultiPolygon':
+        return geom['coordinates']
+    if geom['type'] == 'GeometryCollection':
+        return [p for g in geom['geometries'] for p in _polygons(g)]
+    return []
+
+
+def _in_ring(lon, lat, ring):
+    ring = np.asarray(ring, dtype=float)
+    x0, y0 = ring[:-1, 0], ring[:-1, 1]
+    x1, y1 = ring[1:, 0], ring[1:, 1]
+    # Even-odd ray casting, vectorized over points (rows) and edges (columns)
+    px, py = lon[:, None], lat[:, None]
+    crosses = (y0 > py) != (y1 > py)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xint = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+    return np.count_nonzero(crosses & (px < xint), axis=1) % 2 == 1
+
+
+def contains(geom, lon, lat):
+    """Boolean mask of the points (lon, lat arrays) that fall inside a GeoJSON polygon."""
+    lon = np.asarray(lon, dtype=float).ravel()
+    lat = np.asarray(lat, dtype=float).ravel()
+    inside = np.zeros(lon.shape, dtype=bool)
+    for rings in _polygons(geom):
+        minx, miny = np.min(rings[0], axis=0)
+        maxx, maxy = np.max(rings[0], axis=0)
+        cand = np.flatnonzero((lon >= minx) & (lon <= maxx) & (lat >= miny) & (lat <= maxy))
+        if cand.size == 0:
+            continue
+        hit = _in_ring(lon[cand], lat[cand], rings[0])
+        for hole in rings[1:]:
+            hit &= ~_in_ring(lon[cand], lat[cand], hole)
+        inside[cand[hit]] = True
+    return inside
+
+
+def assign_district(lon, lat, names=DISTRICTS):
+    """Name of the (first) district containing each point, or None."""
+    lon = np.asarray(lon, dtype=float).ravel()
+    out = np.full(lon.shape, None, dtype=object)
+    free = np.ones(lon.shape, dtype=bool)
+    for d, g in district_geojson(names).items():
+        mask = free & contains(g, lon, lat)
+        out[mask] = d
+        free &= ~mask
+    return out
@@ -0,0 +1,161 @@
+# ee_executor.py
+#
+# Shared, quota-aware executor for Earth Engine requests.
+#
+# Every exporter routes its blocking calls (`.getInfo()` and friends) through
+# one EEExecutor so that independent requests run concurrently on a bounded
+# thread pool, stay under a per-second request budget, and back off
+# exponentially when EE reports quota / 429 errors. Results always come back
+# in submission order.
+#
+# The module never imports `ee`; it only calls the objects it is given, so it
+# can be exercised against a local fake `ee` module with injected latency.
+# Every attempt's latency and result size is reported to the current
+# instrument tracer (per-stage metrics); pool workers run in the submitting
+# thread's context so they see that tracer.
+
+import os
+import time
+import random
+import threading
+import datetime
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import instrument
+
+MAX_WORKERS   = int(os.environ.get("EE_MAX_WORKERS", 8))
+RATE_PER_SEC  = float(os.environ.get("EE_RATE_PER_SEC", 10))
+MAX_RETRIES   = int(os.environ.get("EE_MAX_RETRIES", 6))
+BACKOFF_BASE  = 1.0   # seconds before the first retry
+BACKOFF_MAX   = 60.0  # cap on a single retry delay
+PAGE_SIZE     = 5000  # max features per getInfo() page (interactive EE limit)
+
+# Substrings of EE error messages that mean "slow down and try again"
+RETRYABLE = (
+    "429",
+    "too many requests",
+    "too many concurrent",
+    "quota",
+    "rate limit",
+    "resource exhausted",
+    "resource_exhausted",
+)
+
+
+def is_retryable(exc):
+    msg = str(exc).lower()
+    return any(s in msg for s in RETRYABLE)
+
+
+def ee_date_str(ms):
+    """Format an EE `system:time_start` (ms since epoch, UTC) like Date.format('YYYY-MM-dd')."""
+    return datetime.datetime.fromtimestamp(ms / 1000, tz=datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` calls per second (bursts up to `rate`)."""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.last = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class EEExecutor:
+    def __init__(self, max_workers=MAX_WORKERS, rate_per_sec=RATE_PER_SEC,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, sleep=time.sleep, clock=time.monotonic):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.limiter = RateLimiter(rate_per_sec, clock=clock, sleep=sleep)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ee")
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    # ------------------ Single calls ------------------
+    def call(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` under the rate limit, retrying quota errors."""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            tracer = instrument.tracer()
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                tracer.call(time.perf_counter() - t0, ok=False)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                with self._lock:
+                    self.retries += 1
+                tracer.retry()
+                self.sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
+                continue
+            tracer.call(time.perf_counter() - t0, instrument.payload_size(result))
+            return result
+
+    def get_info(self, obj):
+        return self.call(obj.getInfo)
+
+    # ------------------ Many calls ------------------
+    def imap(self, fn, items):
+        """Yield `fn(item)` for every item, concurrently but in input order."""
+        futures = [self.pool.submit(contextvars.copy_context().run, self.call, fn, it) for it in items]
+        try:
+            for f in futures:
+                yield f.result()
+        finally:
+            for f in futures:
+                f.cancel()
+
+    def map(self, fn, items):
+        return list(self.imap(fn, items))
+
+    def get_info_all(self, objs):
+        return self.map(lambda o: o.getInfo(), objs)
+
+    def fetch_features(self, fc, page_size=PAGE_SIZE):
+        """Pull a FeatureCollection back in paginated toList() calls, pages in parallel."""
+        n = self.get_info(fc.size())
+        pages = self.map(lambda off: fc.toList(page_size, off).getInfo(), range(0, n, page_size))
+        return [f for page in pages for f in page]
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide executor shared by all exporters."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = EEExecutor()
+        return _default
@@ -0,0 +1,63 @@
+# ee_session.py
+#
+# One Earth Engine session per process, shared by every page and rerun.
+#
+# get_ee() imports and initializes the `ee` module the first time any page
+# needs it and is cached with st.cache_resource, so widget interactions and
+# reruns no longer rewrite the service-account key or call ee.Initialize.
+# The service-account JSON from st.secrets is passed to EE in memory; without
+# it, the credentials from `earthengine authenticate` are used (headless runs).
+# District geometries and feature collections are built once per argument set
+# and reused in the same way.
+
+import json
+import streamlit as st
+
+from district_geometry import get_district_geoms, get_district_fc
+
+
+def _key_data():
+    try:
+        if "ee_credentials" not in st.secrets:
+            return None
+        raw = st.secrets["ee_credentials"]["json"]
+    except (FileNotFoundError, KeyError):
+        return None
+    return json.dumps(dict(raw)) if not isinstance(raw, str) else raw.strip()
+
+
+@st.cache_resource(show_spinner="Connecting to Earth Engine…")
+def get_ee():
+    """The initialized `ee` module (imported on first use)."""
+    import ee
+    key_data = _key_data()
+    if key_data:
+        email = json.loads(key_data)["client_email"]
+        ee.Initialize(ee.ServiceAccountCredentials(email, key_data=key_data))
+    else:
+        ee.Initialize()
+    return ee
+
+
+def init_ee():
+    """Page helper: get_ee(), or show the error and stop the page."""
+    try:
+        return get_ee()
+    except Exception as e:
+        st.error(f"Earth Engine initialization error: {e}")
+        st.stop()
+        raise
+
+
+@st.cache_resource(show_spinner=False)
+def district_geoms(names, **kw):
+    """{district: ee.Geometry} for a tuple of names (see district_geometry)."""
+    get_ee()
+    return get_district_geoms(list(names), **kw)
+
+
+@st.cache_resource(show_spinner=False)
+def district_fc(names, **kw):
+    get_ee()
+    return get_district_fc(list(names), **kw)
+
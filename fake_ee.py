@@ -0,0 +1,886 @@
+# fake_ee.py
+#
+# In-process stand-in for the subset of the `ee` API used by the exporters,
+# the downscaling page and district_geometry, for benchmarking without an
+# Earth Engine account (see benchmark.py).
+#
+# Everything is evaluated eagerly on the client: images are dicts of band
+# functions f(lon, lat) -> array over synthetic, smoothly varying rasters, and
+# collections are generated on demand at each dataset's native time step
+# (3-hourly SMAP/GLDAS, daily CHIRPS, daily/8-/16-day MODIS). Only getInfo()
+# counts as a round trip: it sleeps for the configured latency and records the
+# call and the JSON payload size in STATS, so request counts and
+# latency-bound wall times behave like the real service.
+#
+# batch.Export.table.toCloudStorage() and data.getTaskStatus() form a local
+# task service for batch_export: the bucket is a local directory, and tasks
+# are kept in TASK_REGISTRY so a poller in another process can resume them.
+#
+#   import sys, fake_ee
+#   fake_ee.configure(latency=0.1)
+#   sys.modules["ee"] = fake_ee
+
+import os, csv, json, math, time, uuid, zlib, threading, datetime
+import numpy as np
+
+from district_geometry import contains
+
+LATENCY    = 0.0   # seconds per getInfo()
+JITTER     = 0.0   # extra uniform random latency, seconds
+ERROR_RATE = 0.0   # share of getInfo() calls failing with a retryable quota error
+TASK_SECONDS    = 0.0  # time a batch task takes to complete
+TASK_ERROR_RATE = 0.0  # share of batch tasks ending FAILED
+TASK_REGISTRY   = os.environ.get("FAKE_EE_TASKS", "fake_ee_tasks.json")
+DEG_M   = 111320.0
+
+STATS = {"getinfo": 0, "errors": 0, "payload_bytes": 0, "latency_s": 0.0}
+_lock = threading.Lock()
+
+
+def configure(latency=0.0, jitter=0.0, error_rate=0.0, task_seconds=0.0, task_error_rate=0.0):
+    global LATENCY, JITTER, ERROR_RATE, TASK_SECONDS, TASK_ERROR_RATE
+    LATENCY, JITTER, ERROR_RATE = latency, jitter, error_rate
+    TASK_SECONDS, TASK_ERROR_RATE = task_seconds, task_error_rate
+
+
+def reset_stats():
+    with _lock:
+        STATS.update(getinfo=0, errors=0, payload_bytes=0, latency_s=0.0)
+
+
+def Initialize(credentials=None, *args, **kwargs):
+    return None
+
+
+class ServiceAccountCredentials:
+    def __init__(self, email=None, key_file=None, key_data=None):
+        self.email = email
+
+
+class EEException(Exception):
+    pass
+
+
+# ------------------ Values ------------------
+def _unwrap(x):
+    if isinstance(x, Value):
+        return _unwrap(x.value)
+    if isinstance(x, (list, tuple)):
+        return [_unwrap(v) for v in x]
+    if isinstance(x, dict):
+        return {k: _unwrap(v) for k, v in x.items()}
+    return x
+
+
+def _info(x):
+    x = _unwrap(x)
+    if isinstance(x, (Feature, FeatureCollection, Geometry, Image)):
+        return x._info()
+    if isinstance(x, list):
+        return [_info(v) for v in x]
+    if isinstance(x, dict):
+        return {k: _info(v) for k, v in x.items()}
+    if isinstance(x, (np.floating, float)):
+        return None if math.isnan(x) else float(x)
+    if isinstance(x, np.integer):
+        return int(x)
+    return x
+
+
+class ComputedObject:
+    def getInfo(self):
+        delay = LATENCY + (JITTER * float(np.random.random()) if JITTER else 0.0)
+        if delay:
+            time.sleep(delay)
+        if ERROR_RATE and np.random.random() < ERROR_RATE:
+            with _lock:
+                STATS["getinfo"] += 1
+                STATS["errors"] += 1
+                STATS["latency_s"] += delay
+            raise EEException("Too many concurrent aggregations (429)")
+        result = _info(self)
+        size = len(json.dumps(result, default=str))
+        with _lock:
+            STATS["getinfo"] += 1
+            STATS["payload_bytes"] += size
+            STATS["latency_s"] += delay
+        return result
+
+
+class Value(ComputedObject):
+    """Any server-side scalar, list, dictionary or date."""
+
+    def __init__(self, value):
+        self.value = _unwrap(value)
+
+    def get(self, key, default=None):
+        v = self.value
+        if isinstance(v, dict):
+            return Value(v.get(_unwrap(key), default))
+        return _wrap(v[int(_unwrap(key))])
+
+    def size(self):
+        return Value(len(self.value))
+
+    def map(self, fn):
+        return Value([_unwrap(fn(_wrap(v))) for v in self.value])
+
+    def keys(self):
+        return Value(list(self.value))
+
+    def gt(self, x):
+        return Value(self.value > _unwrap(x))
+
+    def lt(self, x):
+        return Value(self.value < _unwrap(x))
+
+    def eq(self, x):
+        return Value(self.value == _unwrap(x))
+
+    def add(self, x):
+        return Value(self.value + _unwrap(x))
+
+    def subtract(self, x):
+        return Value(self.value - _unwrap(x))
+
+    def multiply(self, x):
+        return Value(self.value * _unwrap(x))
+
+    def divide(self, x):
+        return Value(self.value / _unwrap(x))
+
+    # Dates are kept as ms since the epoch
+    def millis(self):
+        return Value(self.value)
+
+    def format(self, fmt=None):
+        d = datetime.datetime.fromtimestamp(self.value / 1000, tz=datetime.timezone.utc)
+        return Value(d.strftime("%Y-%m-%d" if fmt in (None, "YYYY-MM-dd") else "%Y-%m-%dT%H:%M:%S"))
+
+
+def _wrap(v):
+    return v if isinstance(v, (ComputedObject, Image, Geometry)) else Value(v)
+
+
+def _ms(d):
+    d = _unwrap(d)
+    if isinstance(d, (int, float, np.integer, np.floating)):
+        return int(d)
+    t = datetime.datetime.fromisoformat(str(d)[:19])
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=datetime.timezone.utc)
+    return int(t.timestamp() * 1000)
+
+
+def Number(x):
+    return Value(x)
+
+
+def String(x):
+    return Value(x)
+
+
+def Dictionary(x=None):
+    return Value(x or {})
+
+
+def Date(x):
+    return Value(_ms(x))
+
+
+class _ListFactory:
+    def __call__(self, x):
+        return Value(list(_unwrap(x)) if not isinstance(x, Value) else x.value)
+
+    def sequence(self, start, end, step=1):
+        return Value(list(np.arange(_unwrap(start), _unwrap(end) + 1, _unwrap(step)).tolist()))
+
+
+List = _ListFactory()
+
+
+class Algorithms:
+    @staticmethod
+    def If(cond, a, b):
+        return a if _unwrap(cond) else b
+
+
+# ------------------ Geometry ------------------
+class Geometry(ComputedObject):
+    def __init__(self, geojson, *args, **kwargs):
+        self.geojson = geojson.geojson if isinstance(geojson, Geometry) else _unwrap(geojson)
+
+    @staticmethod
+    def Point(coords, *args, **kwargs):
+        return Geometry({"type": "Point", "coordinates": list(coords)})
+
+    @staticmethod
+    def Rectangle(coords, *args, **kwargs):
+        x0, y0, x1, y1 = coords
+        return Geometry({"type": "Polygon",
+                         "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]})
+
+    def buffer(self, distance, *args, **kwargs):
+        return self
+
+    def simplify(self, max_error=None, *args, **kwargs):
+        return self
+
+    def bounds(self):
+        pts = np.array([p for ring in _rings(self.geojson) for p in ring], dtype=float)
+        return pts[:, 0].min(), pts[:, 1].min(), pts[:, 0].max(), pts[:, 1].max()
+
+    def _info(self):
+        return self.geojson
+
+
+def _rings(geojson):
+    t = geojson["type"]
+    if t == "Polygon":
+        return [geojson["coordinates"][0]]
+    if t == "MultiPolygon":
+        return [p[0] for p in geojson["coordinates"]]
+    if t == "GeometryCollection":
+        return [r for g in geojson["geometries"] for r in _rings(g)]
+    if t == "Point":
+        return [[geojson["coordinates"]]]
+    return []
+
+
+_pixel_cache = {}
+
+
+def _pixels(geom, scale):
+    """Pixel centres (lon, lat) of a `scale`-metre grid that fall inside `geom`."""
+    key = (json.dumps(geom.geojson, sort_keys=True), round(float(scale), 3))
+    hit = _pixel_cache.get(key)
+    if hit is not None:
+        return hit
+    step = float(scale) / DEG_M
+    x0, y0, x1, y1 = geom.bounds()
+    lon, lat = np.meshgrid(np.arange(np.floor(x0 / step) * step + step / 2, x1, step),
+                           np.arange(np.floor(y0 / step) * step + step / 2, y1, step))
+    lon, lat = lon.ravel(), lat.ravel()
+    if geom.geojson["type"] != "Point":
+        keep = contains(geom.geojson, lon, lat)
+        lon, lat = lon[keep], lat[keep]
+    if lon.size == 0:  # region smaller than one pixel: use its centre
+        lon, lat = np.array([(x0 + x1) / 2]), np.array([(y0 + y1) / 2])
+    with _lock:
+        _pixel_cache[key] = (lon, lat)
+    return lon, lat
+
+
+# ------------------ Synthetic rasters ------------------
+def _seed(name):
+    return zlib.crc32(name.encode()) % 1000 / 1000.0
+
+
+def _field(name, lo, hi, t_ms=None, period_days=365.25):
+    """Smooth deterministic field in [lo, hi], optionally varying with time."""
+    a, b = 3 + 4 * _seed(name), 2 + 5 * _seed(name[::-1])
+    phase = 0.0
+    if t_ms is not None:
+        phase = 2 * math.pi * (t_ms / 86400000.0) / period_days
+    mid, amp = (lo + hi) / 2, (hi - lo) / 2
+
+    def f(lon, lat):
+        lon = np.asarray(lon, float)
+        lat = np.asarray(lat, float)
+        s = 0.6 * np.sin(a * lon + phase) * np.cos(b * lat) + 0.4 * np.sin(phase + a * lat)
+        return mid + amp * s
+    return f
+
+
+# Band ranges (lo, hi) of the datasets the scripts read
+BAND_RANGES = {
+    "sm_surface": (0.05, 0.45), "elevation": (300, 900), "precipitation": (0, 40),
+    "NDVI": (1000, 8000), "EVI": (800, 6000), "ET": (0, 400),
+    "LST_Day_1km": (13000, 16000), "Emis_31": (240, 255), "Emis_32": (240, 255),
+    "sur_refl_b01": (200, 3000), "sur_refl_b02": (1000, 4000), "sur_refl_b03": (100, 2000),
+    "NDSI_Snow_Cover": (0, 0),
+    "Swnet_tavg": (0, 300), "Lwnet_tavg": (-120, -40), "Qle_tavg": (0, 200), "Qh_tavg": (-20, 200),
+    "Evap_tavg": (0, 5e-5), "AvgSurfT_inst": (285, 320), "RootMoist_inst": (50, 400),
+    "Tveg_tavg": (0, 100),
+}
+
+# collection id -> (time step in hours, bands)
+CATALOG = {
+    "NASA/SMAP/SPL4SMGP/007":          (3, ["sm_surface"]),
+    "NASA/GLDAS/V021/NOAH/G025/T3H":   (3, ["Swnet_tavg", "Lwnet_tavg", "Qle_tavg", "Qh_tavg", "Evap_tavg",
+                                            "AvgSurfT_inst", "RootMoist_inst", "Tveg_tavg"]),
+    "UCSB-CHG/CHIRPS/DAILY":           (24, ["precipitation"]),
+    "MODIS/061/MOD11A1":               (24, ["LST_Day_1km", "Emis_31", "Emis_32"]),
+    "MODIS/061/MOD13Q1":               (16 * 24, ["NDVI", "EVI"]),
+    "MODIS/061/MOD16A2":               (8 * 24, ["ET"]),
+    "MODIS/061/MOD09GA":               (24, ["sur_refl_b01", "sur_refl_b02", "sur_refl_b03"]),
+    "MODIS/061/MOD10A1":               (24, ["NDSI_Snow_Cover"]),
+}
+
+
+def _band_fn(band, t_ms=None):
+    lo, hi = BAND_RANGES.get(band, (0.0, 1.0))
+    f = _field(band, lo, hi, t_ms)
+    if band == "precipitation":
+        return lambda lon, lat: np.maximum(f(lon, lat) - 15, 0)
+    return f
+
+
+def _synthetic_image(col_id, t_ms):
+    step, bands = CATALOG[col_id]
+    return Image._make({b: _band_fn(b, t_ms) for b in bands},
+                       {"system:time_start": t_ms, "system:index": str(t_ms)})
+
+
+# ------------------ Reducers & classifiers ------------------
+class Reducer:
+    def __init__(self, name, fn, outputs=None):
+        self.name, self.fn, self.outputs = name, fn, outputs
+
+    def setOutputs(self, outputs):
+        return Reducer(self.name, self.fn, _unwrap(outputs))
+
+    @staticmethod
+    def mean():
+        return Reducer("mean", lambda v: np.nanmean(v, axis=0) if len(v) else np.nan)
+
+    @staticmethod
+    def sum():
+        return Reducer("sum", lambda v: np.nansum(v, axis=0))
+
+    @staticmethod
+    def max():
+        return Reducer("max", lambda v: np.nanmax(v, axis=0) if len(v) else np.nan)
+
+    @staticmethod
+    def min():
+        return Reducer("min", lambda v: np.nanmin(v, axis=0) if len(v) else np.nan)
+
+    @staticmethod
+    def first():
+        return Reducer("first", lambda v: v[0] if len(v) else np.nan)
+
+    def _apply(self, v):
+        with np.errstate(all="ignore"):
+            import warnings
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                return self.fn(v)
+
+
+class _Classifier:
+    """Linear least-squares stand-in for a trained random forest."""
+
+    def __init__(self):
+        self.inputs, self.coef = [], None
+
+    def train(self, features, classProperty, inputProperties=None, *args, **kwargs):
+        feats = features.features
+        self.inputs = list(_unwrap(inputProperties) or
+                           [k for k in feats[0].props if k != classProperty] if feats else [])
+        rows = [[f.props.get(k) for k in self.inputs] + [f.props.get(classProperty)] for f in feats]
+        arr = np.array(rows, dtype=float) if rows else np.empty((0, len(self.inputs) + 1))
+        arr = arr[~np.isnan(arr).any(axis=1)]
+        if len(arr):
+            X = np.column_stack([arr[:, :-1], np.ones(len(arr))])
+            self.coef = np.linalg.lstsq(X, arr[:, -1], rcond=None)[0]
+        return self
+
+
+class Classifier:
+    @staticmethod
+    def smileRandomForest(numberOfTrees=10, minLeafPopulation=1, maxNodes=None, *args, **kwargs):
+        return _Classifier()
+
+
+# ------------------ Images ------------------
+class Image(ComputedObject):
+    def __init__(self, arg=None):
+        if isinstance(arg, Image):
+            self.bands, self.props = dict(arg.bands), dict(arg.props)
+        elif isinstance(arg, str):
+            if arg == "USGS/SRTMGL1_003":
+                self.bands, self.props = {"elevation": _band_fn("elevation")}, {}
+            else:
+                img = _synthetic_image(arg, _ms(datetime.date.today().isoformat()))
+                self.bands, self.props = img.bands, img.props
+        elif isinstance(arg, (int, float)):
+            self.bands, self.props = {"constant": lambda lon, lat: np.full(np.shape(lon), float(arg))}, {}
+        else:
+            self.bands, self.props = {}, {}
+
+    @classmethod
+    def _make(cls, bands, props=None):
+        img = cls()
+        img.bands, img.props = dict(bands), dict(props or {})
+        return img
+
+    @staticmethod
+    def cat(images):
+        bands, props = {}, {}
+        for im in _unwrap(images):
+            bands.update(im.bands)
+            props = props or dict(im.props)
+        return Image._make(bands, props)
+
+    def _info(self):
+        return {"type": "Image", "bands": [{"id": b} for b in self.bands], "properties": self.props}
+
+    # Band selection / renaming
+    def select(self, *bands):
+        names = _unwrap(bands[0]) if len(bands) == 1 and isinstance(_unwrap(bands[0]), list) else [_unwrap(b) for b in bands]
+        return Image._make({b: self.bands[b] for b in names}, self.props)
+
+    def rename(self, *names):
+        names = _unwrap(names[0]) if len(names) == 1 and isinstance(_unwrap(names[0]), list) else [_unwrap(n) for n in names]
+        return Image._make(dict(zip(names, self.bands.values())), self.props)
+
+    def bandNames(self):
+        return Value(list(self.bands))
+
+    def addBands(self, other, *args, **kwargs):
+        return Image._make({**self.bands, **other.bands}, self.props)
+
+    # Properties
+    def set(self, *args):
+        props = dict(self.props)
+        props.update(_unwrap(args[0]) if len(args) == 1 else {args[0]: _unwrap(args[1])})
+        return Image._make(self.bands, props)
+
+    def get(self, key):
+        return Value(self.props.get(_unwrap(key)))
+
+    def date(self):
+        return Value(self.props.get("system:time_start"))
+
+    # Pixel maths
+    def _map_bands(self, op):
+        return Image._make({b: (lambda f: lambda lon, lat: op(f(lon, lat)))(f) for b, f in self.bands.items()},
+                           self.props)
+
+    def multiply(self, x):
+        x = _unwrap(x); return self._map_bands(lambda v: v * x)
+
+    def divide(self, x):
+        x = _unwrap(x); return self._map_bands(lambda v: v / x)
+
+    def add(self, x):
+        x = _unwrap(x); return self._map_bands(lambda v: v + x)
+
+    def round(self):
+        return self._map_bands(np.round)
+
+    def classify(self, classifier, outputName="classification"):
+        c = classifier
+        fns = [self.bands[k] for k in c.inputs]
+
+        def f(lon, lat):
+            if c.coef is None:
+                return np.full(np.shape(lon), np.nan)
+            out = np.full(np.shape(lon), c.coef[-1], dtype=float)
+            for w, g in zip(c.coef[:-1], fns):
+                out += w * g(lon, lat)
+            return out
+        return Image._make({outputName: f}, self.props)
+
+    # Regions
+    def _values(self, lon, lat):
+        return {b: np.asarray(f(lon, lat), dtype=float) for b, f in self.bands.items()}
+
+    def reduceRegion(self, reducer=None, geometry=None, scale=None, bestEffort=False, maxPixels=None, **kwargs):
+        lon, lat = _pixels(Geometry(geometry), scale or 1000)
+        vals = self._values(lon, lat)
+        names = reducer.outputs or list(vals)
+        return Value({n: float(reducer._apply(v)) for n, v in zip(names, vals.values())})
+
+    def reduceRegions(self, collection=None, reducer=None, scale=None, **kwargs):
+        out = []
+        single = len(self.bands) == 1
+        for f in collection.features:
+            lon, lat = _pixels(f.geom, scale or 1000)
+            vals = self._values(lon, lat)
+            names = reducer.outputs or ([reducer.name] if single else list(vals))
+            stats = {n: float(reducer._apply(v)) for n, v in zip(names, vals.values())}
+            out.append(Feature(f.geom, {**f.props, **stats}))
+        return FeatureCollection(out)
+
+    def sample(self, region=None, scale=None, numPixels=None, seed=0, geometries=False, dropNulls=True,
+               **kwargs):
+        lon, lat = _pixels(Geometry(region), scale or 1000)
+        if numPixels and len(lon) > numPixels:
+            pick = np.random.default_rng(seed).choice(len(lon), size=int(numPixels), replace=False)
+            lon, lat = lon[pick], lat[pick]
+        vals = self._values(lon, lat)
+        cols = np.column_stack(list(vals.values())) if vals else np.empty((len(lon), 0))
+        if dropNulls and cols.size:
+            ok = ~np.isnan(cols).any(axis=1)
+            lon, lat, cols = lon[ok], lat[ok], cols[ok]
+        names = list(vals)
+        rows = np.where(np.isnan(cols), None, cols).tolist()
+        feats = []
+        for i, row in enumerate(rows):
+            g = Geometry({"type": "Point", "coordinates": [float(lon[i]), float(lat[i])]}) if geometries else None
+            feats.append(Feature._make(g, dict(zip(names, row))))
+        return FeatureCollection._make(feats)
+
+
+class Terrain:
+    @staticmethod
+    def slope(img):
+        f = next(iter(img.bands.values()))
+        h = 30.0 / DEG_M
+
+        def slope(lon, lat):
+            dzdx = (f(lon + h, lat) - f(lon - h, lat)) / 60.0
+            dzdy = (f(lon, lat + h) - f(lon, lat - h)) / 60.0
+            return np.degrees(np.arctan(np.hypot(dzdx, dzdy)))
+        return Image._make({"slope": slope}, img.props)
+
+
+# ------------------ Collections ------------------
+class Filter:
+    def __init__(self, test):
+        self.test = test
+
+    @staticmethod
+    def eq(name, value):
+        value = _unwrap(value)
+        return Filter(lambda p: p.get(name) == value)
+
+    @staticmethod
+    def inList(name, values):
+        values = set(_unwrap(values))
+        return Filter(lambda p: p.get(name) in values)
+
+    @staticmethod
+    def gt(name, value):
+        value = _unwrap(value)
+        return Filter(lambda p: p.get(name) is not None and p.get(name) > value)
+
+
+class ImageCollection(ComputedObject):
+    """A list of images, or a catalog id generated lazily once a date range is set."""
+
+    def __init__(self, arg=None, _window=None, _bands=None):
+        self.col_id, self.window, self.sel = None, _window, _bands
+        if isinstance(arg, ImageCollection):
+            self.col_id, self._imgs, self.window, self.sel = arg.col_id, arg._imgs, arg.window, arg.sel
+        elif isinstance(arg, str):
+            if arg not in CATALOG:
+                raise EEException(f"ImageCollection.load: unknown collection '{arg}'")
+            self.col_id, self._imgs = arg, None
+        else:
+            self._imgs = [Image(i) if not isinstance(i, Image) else i for i in _unwrap(arg or [])]
+
+    @staticmethod
+    def fromImages(images):
+        return ImageCollection(_unwrap(images))
+
+    @property
+    def images(self):
+        if self._imgs is None:
+            if self.window is None:
+                raise EEException(f"{self.col_id}: filterDate() needed before the collection is used")
+            step = CATALOG[self.col_id][0] * 3600 * 1000
+            t0, t1 = self.window
+            first = -(-t0 // step) * step if self.col_id in ("MODIS/061/MOD13Q1", "MODIS/061/MOD16A2") else t0
+            self._imgs = [_synthetic_image(self.col_id, t) for t in range(int(first), int(t1), int(step))]
+            if self.sel:
+                self._imgs = [i.select(self.sel) for i in self._imgs]
+        return self._imgs
+
+    def _with(self, imgs):
+        return ImageCollection(imgs)
+
+    def filterDate(self, start, end=None):
+        t0 = _ms(start)
+        t1 = _ms(end) if end is not None else t0 + 86400000
+        if self._imgs is None:
+            lo, hi = self.window or (t0, t1)
+            return ImageCollection(self.col_id, _window=(max(lo, t0), min(hi, t1)), _bands=self.sel)
+        return self._with([i for i in self._imgs if t0 <= i.props.get("system:time_start", 0) < t1])
+
+    def select(self, *bands):
+        names = _unwrap(bands[0]) if len(bands) == 1 and isinstance(_unwrap(bands[0]), list) else [_unwrap(b) for b in bands]
+        if self._imgs is None:
+            return ImageCollection(self.col_id, _window=self.window, _bands=names)
+        return self._with([i.select(names) for i in self._imgs])
+
+    def filter(self, flt):
+        return self._with([i for i in self.images if flt.test(i.props)])
+
+    def map(self, fn, *args, **kwargs):
+        out = [_unwrap(fn(i)) for i in self.images]
+        if all(isinstance(o, Image) for o in out):
+            return self._with(out)
+        return FeatureCollection(out)
+
+    def first(self):
+        return self.images[0] if self.images else Image()
+
+    def size(self):
+        return Value(len(self.images))
+
+    def aggregate_array(self, prop):
+        return Value([i.props.get(prop) for i in self.images])
+
+    def toList(self, count, offset=0):
+        return Value(self.images[int(_unwrap(offset)):int(_unwrap(offset)) + int(_unwrap(count))])
+
+    def toBands(self):
+        bands = {}
+        for k, i in enumerate(self.images):
+            for b, f in i.bands.items():
+                bands[f"{i.props.get('system:index', k)}_{b}"] = f
+        return Image._make(bands)
+
+    def reduce(self, reducer, *args, **kwargs):
+        imgs = self.images
+        names = list(imgs[0].bands) if imgs else list(self.sel or [])
+
+        def band(j):
+            def f(lon, lat):
+                if not imgs:
+                    return np.full(np.shape(lon), np.nan)
+                return reducer._apply(np.stack([list(i.bands.values())[j](lon, lat) for i in imgs]))
+            return f
+        return Image._make({f"{b}_{reducer.name}": band(j) for j, b in enumerate(names)})
+
+    def mean(self):
+        img = self.reduce(Reducer.mean())
+        return img.rename([b[:-len("_mean")] for b in img.bands])
+
+    def getRegion(self, geometry, scale=None, *args, **kwargs):
+        lon, lat = _pixels(Geometry(geometry), scale or 1000)
+        imgs = self.images
+        names = list(imgs[0].bands) if imgs else []
+        rows = [["id", "longitude", "latitude", "time"] + names]
+        for i in imgs:
+            vals = np.column_stack([f(lon, lat) for f in i.bands.values()])
+            t = i.props.get("system:time_start")
+            for k in range(len(lon)):
+                rows.append([i.props.get("system:index", "0"), float(lon[k]), float(lat[k]), t]
+                            + [None if np.isnan(v) else float(v) for v in vals[k]])
+        return Value(rows)
+
+    def _info(self):
+        return {"type": "ImageCollection", "features": [i._info() for i in self.images]}
+
+
+class Feature(ComputedObject):
+    def __init__(self, geom=None, props=None):
+        if isinstance(geom, Feature):
+            self.geom, self.props = geom.geom, dict(geom.props)
+            return
+        self.geom = Geometry(geom) if geom is not None and not isinstance(geom, Geometry) else geom
+        self.props = _unwrap(props or {})
+
+    @classmethod
+    def _make(cls, geom, props):
+        f = cls.__new__(cls)
+        f.geom, f.props = geom, props
+        return f
+
+    def set(self, *args):
+        props = dict(self.props)
+        props.update(_unwrap(args[0]) if len(args) == 1 else {args[0]: _unwrap(args[1])})
+        return Feature._make(self.geom, props)
+
+    def get(self, key):
+        return Value(self.props.get(_unwrap(key)))
+
+    def geometry(self):
+        return self.geom
+
+    def setGeometry(self, geom=None):
+        return Feature._make(geom, self.props)
+
+    def _info(self):
+        return {"type": "Feature", "geometry": self.geom._info() if self.geom is not None else None,
+                "properties": {k: _info(v) for k, v in self.props.items()}}
+
+
+# Synthetic GAUL level-2 boxes for the Marathwada districts (centre lon, lat)
+GAUL_CENTRES = {
+    "Aurangabad": (75.34, 19.88), "Bid": (75.76, 18.99), "Hingoli": (77.15, 19.72),
+    "Jalna": (75.88, 19.84), "Latur": (76.56, 18.40), "Osmanabad": (76.04, 18.18),
+    "Parbhani": (76.77, 19.27), "Nanded": (77.32, 19.15),
+}
+GAUL_HALF = 0.25
+
+
+def _gaul():
+    feats = []
+    for name, (x, y) in GAUL_CENTRES.items():
+        g = Geometry.Rectangle([x - GAUL_HALF, y - GAUL_HALF, x + GAUL_HALF, y + GAUL_HALF])
+        feats.append(Feature(g, {"ADM0_NAME": "India", "ADM1_NAME": "Maharashtra", "ADM2_NAME": name}))
+    return feats
+
+
+class FeatureCollection(ComputedObject):
+    def __init__(self, arg=None):
+        if isinstance(arg, FeatureCollection):
+            self.features = list(arg.features)
+        elif isinstance(arg, str):
+            self.features = _gaul() if arg.startswith("FAO/GAUL") else []
+        else:
+            self.features = [f if isinstance(f, (Feature, FeatureCollection)) else Feature(f)
+                             for f in _unwrap(arg or [])]
+
+    @classmethod
+    def _make(cls, features):
+        fc = cls.__new__(cls)
+        fc.features = features
+        return fc
+
+    def filter(self, flt):
+        return FeatureCollection._make([f for f in self.features if flt.test(f.props)])
+
+    def map(self, fn, *args, **kwargs):
+        return FeatureCollection._make([_unwrap(fn(f)) for f in self.features])
+
+    def flatten(self):
+        out = []
+        for f in self.features:
+            out.extend(f.features if isinstance(f, FeatureCollection) else [f])
+        return FeatureCollection(out)
+
+    def size(self):
+        return Value(len(self.features))
+
+    def first(self):
+        return self.features[0]
+
+    def toList(self, count, offset=0):
+        off = int(_unwrap(offset))
+        return Value(self.features[off:off + int(_unwrap(count))])
+
+    def aggregate_array(self, prop):
+        return Value([f.props.get(prop) for f in self.features])
+
+    def geometry(self):
+        polys = []
+        for f in self.features:
+            g = f.geom.geojson
+            polys.extend([g["coordinates"]] if g["type"] == "Polygon" else g["coordinates"])
+        return Geometry({"type": "MultiPolygon", "coordinates": polys})
+
+    def reduceToImage(self, properties, reducer):
+        prop = _unwrap(properties)[0]
+        feats = list(self.features)
+
+        def f(lon, lat):
+            lon = np.asarray(lon, float)
+            out = np.full(lon.shape, np.nan)
+            free = np.ones(lon.shape, bool)
+            for ft in feats:
+                hit = free & contains(ft.geom.geojson, lon, lat).reshape(lon.shape)
+                out[hit] = ft.props.get(prop)
+                free &= ~hit
+            return out
+        return Image._make({reducer.name: f})
+
+    def _info(self):
+        return {"type": "FeatureCollection", "features": [f._info() for f in self.features]}
+
+
+# ------------------ Batch tasks ------------------
+def _registry():
+    try:
+        with open(TASK_REGISTRY) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_registry(tasks):
+    with open(TASK_REGISTRY + ".tmp", "w") as f:
+        json.dump(tasks, f, indent=1)
+    os.replace(TASK_REGISTRY + ".tmp", TASK_REGISTRY)
+
+
+def _write_table(path, features, selectors):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    cols = list(selectors) if selectors else (["system:index"] + sorted({k for f in features for k in f["properties"]}))
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(cols)
+        for i, ft in enumerate(features):
+            p = dict(ft["properties"], **{"system:index": str(i)})
+            w.writerow(["" if p.get(c) is None else p.get(c) for c in cols])
+
+
+class Task:
+    """Export task: the table is computed on start() and published when the task completes."""
+
+    def __init__(self, collection, config):
+        self.collection, self.config, self.id = collection, config, None
+
+    def start(self):
+        cfg = self.config
+        self.id = uuid.uuid4().hex[:24].upper()
+        dest = os.path.join(cfg["bucket"], cfg["fileNamePrefix"] + ".csv")
+        staged = os.path.join(cfg["bucket"], ".staging", self.id + ".csv")
+        _write_table(staged, _info(self.collection)["features"], cfg.get("selectors"))
+        now = time.time()
+        with _lock:
+            tasks = _registry()
+            tasks[self.id] = {"description": cfg["description"], "created": now,
+                              "done_at": now + TASK_SECONDS, "staged": staged, "dest": dest,
+                              "fail": bool(TASK_ERROR_RATE and np.random.random() < TASK_ERROR_RATE),
+                              "state": "READY"}
+            _save_registry(tasks)
+
+    def status(self):
+        return getTaskStatus([self.id])[0]
+
+
+def getTaskStatus(task_ids):
+    ids = [task_ids] if isinstance(task_ids, str) else list(task_ids)
+    now, out = time.time(), []
+    with _lock:
+        tasks = _registry()
+        for tid in ids:
+            t = tasks.get(tid)
+            if t is None:
+                out.append({"id": tid, "state": "UNKNOWN"})
+                continue
+            if t["state"] in ("READY", "RUNNING"):
+                if now >= t["done_at"]:
+                    if t["fail"]:
+                        t["state"], t["error_message"] = "FAILED", "Computation timed out."
+                    else:
+                        os.makedirs(os.path.dirname(t["dest"]), exist_ok=True)
+                        os.replace(t["staged"], t["dest"])
+                        t["state"] = "COMPLETED"
+                elif now >= (t["created"] + t["done_at"]) / 2:
+                    t["state"] = "RUNNING"
+            st = {"id": tid, "state": t["state"], "description": t["description"],
+                  "creation_timestamp_ms": int(t["created"] * 1000)}
+            if t["state"] == "COMPLETED":
+                st["destination_uris"] = [t["dest"]]
+            if t.get("error_message"):
+                st["error_message"] = t["error_message"]
+            out.append(st)
+        _save_registry(tasks)
+    return out
+
+
+class _TableExport:
+    @staticmethod
+    def toCloudStorage(collection, description="myExportTableTask", bucket=None, fileNamePrefix=None,
+                       fileFormat="CSV", selectors=None, **kwargs):
+        return Task(collection, {"description": description, "bucket": bucket,
+                                 "fileNamePrefix": fileNamePrefix or description,
+                                 "fileFormat": fileFormat, "selectors": selectors})
+
+
+class batch:
+    Task = Task
+
+    class Export:
+        table = _TableExport
+
+
+class data:
+    getTaskStatus = staticmethod(getTaskStatus)
@@ -1,51 +1,24 @@
-import ee
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 import pandas as pd
 import datetime
-from dateutil.relativedelta import relativedelta
-import tempfile, os, json
-
-# ------------------ Earth Engine Authentication ------------------
-st.write("🔑 Starting Earth Engine authentication...")
-if "ee_credentials" not in st.secrets:
-    st.error("Missing 'ee_credentials' in secrets. Please add your service account JSON.")
-    st.stop()
-raw = st.secrets["ee_credentials"]["json"]
-key_data = json.dumps(raw) if isinstance(raw, dict) else raw
-creds = json.loads(key_data)
-with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-    f.write(key_data)
-    path = f.name
-try:
-    ee.Initialize(ee.ServiceAccountCredentials(creds['client_email'], path))
-    st.success("✅ Earth Engine initialized successfully.")
-except Exception as e:
-    st.error(f"Earth Engine initialization error: {e}")
-    st.stop()
-finally:
-    os.remove(path)
-
-# ------------------ Auto-refresh at midnight ------------------
-now = datetime.datetime.now()
-midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
-ms_until_midnight = int((midnight - now).total_seconds() * 1000)
-st.write(f"⏰ Auto-refresh in {ms_until_midnight//1000} seconds (at next midnight)")
-st_autorefresh(interval=ms_until_midnight, limit=1, key="autoRefresh")
-
-# ------------------ Hard-coded Districts ------------------
-DISTRICTS = ['Aurangabad','Bid','Hingoli','Jalna','Latur','Osmanabad','Parbhani','Nanded']
-
-# ------------------ Load GAUL boundaries ------------------
-gaul = ee.FeatureCollection("FAO/GAUL/2015/level2") \
-    .filter(ee.Filter.eq('ADM0_NAME', 'India')) \
-    .filter(ee.Filter.eq('ADM1_NAME', 'Maharashtra'))
-
-# ------------------ Date Range ------------------
-today = datetime.date.today()
-start_date = (today - relativedelta(months=12)).strftime("%Y-%m-%d")
-end_date   = today.strftime("%Y-%m-%d")
-st.write(f"**Data range:** {start_date} to {end_date}")
+from obs_cache import ObservationCache
+from ee_executor import get_executor, ee_date_str
+from ee_session import init_ee, district_geoms, district_fc
+from columnar import ColumnarRecords, categorize, download_buttons
+from compositing import composite
+from run_config import parse_args
+from streaming import export_cached
+import instrument
+
+# EE client, initialized by main() once per process and shared across reruns (ee_session)
+ee = None
+
+# ------------------ Districts & Date Range ------------------
+# --start/--end/--district (see run_config); default: last 12 months, all districts
+ARGS = parse_args()
+DISTRICTS = ARGS.districts
+start_date, end_date = ARGS.start, ARGS.end
 
 # ------------------ GLDAS Collection & Variables ------------------
 collection_id = 'NASA/GLDAS/V021/NOAH/G025/T3H'
@@ -59,46 +32,153 @@ collections = {
     'RootZoneSoilMoisture':  ['RootMoist_inst'],
     'Transpiration':         ['Tveg_tavg']
 }
-st.write(f"• Collection: {collection_id}")
-st.write(f"• Variables: {list(collections.keys())}")
+# Server-side compositing of the 3-hourly images: one image per day (the
+# forecaster's step); reducer may also be a {band: reducer} dict
+composite_cfg = {'cadence': 'daily', 'reducer': 'mean'}
+CACHE_NAME = f"gldas_{composite_cfg['cadence']}"
+
+def gldas_collection(start=None, end=None):
+    bands = [b for bands in collections.values() for b in bands]
+    return composite(collection_id, start or start_date, end or end_date, bands, **composite_cfg)
 
 # ------------------ Fetch GLDAS Data ------------------
-def get_gldas_data(districts):
-    records = []
-    col = ee.ImageCollection(collection_id).filterDate(start_date, end_date)
-    total_images = col.size().getInfo()
+def gldas_records():
+    # Wide layout: one row per (image, district), one float32 column per variable
+    return ColumnarRecords(['date', 'district'], list(collections))
+
+def finish_gldas(rec, wide):
+    df = rec.to_frame()
+    if wide:
+        df['date'] = pd.to_datetime(df['date'])
+        return df.sort_values(['district','date'], kind='stable')
+    df = df.melt(id_vars=['date', 'district'], var_name='variable', value_name='value')
+    df = categorize(df[['date', 'variable', 'district', 'value']], ['variable'])
+    df['date'] = pd.to_datetime(df['date'])
+    return df.sort_values(['district','variable','date'], kind='stable')
+
+def get_gldas_data_batched(districts, start=None, end=None, wide=False):
+    bands = [b for bands in collections.values() for b in bands]
+    col = gldas_collection(start, end)
+    with instrument.stage("geometry"):
+        fc = district_fc(tuple(districts))
+
+    # One reduceRegions per image over all districts, flattened into a single table
+    def reduce_image(img):
+        date = img.date().format('YYYY-MM-dd')
+        stats = img.reduceRegions(collection=fc, reducer=ee.Reducer.mean(), scale=27830)
+        if len(bands) == 1:
+            stats = stats.map(lambda f: f.set(bands[0], f.get('mean')))
+        return stats.map(lambda f: f.setGeometry(None).set('date', date))
+
+    table = col.map(reduce_image).flatten()
+    st.write("🔄 Reducing all images × districts server-side…")
+    with instrument.stage("ee_fetch") as s:
+        feats = get_executor().fetch_features(table)
+        s.rows += len(feats)
+    st.write(f"  • Retrieved {len(feats)} image/district rows")
+
+    with instrument.stage("frame"):
+        rec = gldas_records()
+        for f in feats:
+            props = f['properties']
+            rec.append(date=props['date'], district=props['district'],
+                       **{var: props.get(band_list[0]) for var, band_list in collections.items()})
+        return finish_gldas(rec, wide)
+
+def get_gldas_data(districts, start=None, end=None, batched=True, wide=False):
+    if batched:
+        return get_gldas_data_batched(districts, start, end, wide)
+    rec = gldas_records()
+    ex = get_executor()
+    col = gldas_collection(start, end)
+    times = ex.get_info(col.aggregate_array('system:time_start'))
+    total_images = len(times)
     img_list = col.toList(total_images)
+    with instrument.stage("geometry"):
+        geoms = district_geoms(tuple(districts))
 
-    # Loop over each image
-    for idx in range(total_images):
+    def reduce_district(task):
+        idx, d = task
         img = ee.Image(img_list.get(idx))
-        date_str = img.date().format('YYYY-MM-dd').getInfo()
-        st.write(f"🔄 Image {idx+1} of {total_images}: {date_str}")
-        for d in districts:
+        geom = geoms[d]
+        return img.select(*[b for bands in collections.values() for b in bands]) \
+                  .reduceRegion(ee.Reducer.mean(), geom, scale=27830, bestEffort=True) \
+                  .getInfo() or {}
+
+    # Every image × district request goes through the shared executor; results stay in order
+    tasks = [(idx, d) for idx in range(total_images) for d in districts]
+    with instrument.stage("ee_fetch") as s:
+        for (idx, d), props in zip(tasks, ex.imap(reduce_district, tasks)):
+            date_str = ee_date_str(times[idx])
+            if d == districts[0]:
+                st.write(f"🔄 Image {idx+1} of {total_images}: {date_str}")
             st.write(f"  • District {d}")
-            geom = gaul.filter(ee.Filter.eq('ADM2_NAME', d)).geometry().buffer(5000)
-            props = img.select(*[b for bands in collections.values() for b in bands]) \
-                       .reduceRegion(ee.Reducer.mean(), geom, scale=27830, bestEffort=True) \
-                       .getInfo() or {}
-            for var, band_list in collections.items():
-                records.append({
-                    'date':     date_str,
-                    'variable': var,
-                    'district': d,
-                    'value':    props.get(band_list[0])
-                })
-
-    df = pd.DataFrame(records)
+            rec.append(date=date_str, district=d,
+                       **{var: props.get(band_list[0]) for var, band_list in collections.items()})
+        s.rows += len(tasks)
+
+    with instrument.stage("frame"):
+        return finish_gldas(rec, wide)
+
+# ------------------ Cached Fetch ------------------
+def fetch_gldas(ds, start, end):
+    # Only dates missing from the local cache are requested from EE
+    st.write(f"🔄 Fetching {start} to {end} for {len(ds)} district(s)")
+    return get_gldas_data(ds, start, end).rename(columns={'variable': 'band'})
+
+def gldas_output(df):
+    df = df.rename(columns={'band': 'variable'})[['date', 'variable', 'district', 'value']]
+    df = categorize(df, ['variable', 'district'])
     df['date'] = pd.to_datetime(df['date'])
-    return df.sort_values(['district','variable','date'])
+    return df.sort_values(['district','variable','date'], kind='stable')
+
+# The refresh is memoized per argument set, so widget reruns and download
+# clicks do not send the trailing-day query to EE again; the rows are read
+# back from the Parquet cache (see refresh_chirps in chirps_export)
+@st.cache_data(show_spinner=False)
+def refresh_gldas(districts, start, end):
+    ObservationCache().fill(CACHE_NAME, list(districts), start, end, fetch_gldas)
+
+def load_gldas_data(districts):
+    refresh_gldas(tuple(districts), start_date, end_date)
+    return gldas_output(ObservationCache().load(CACHE_NAME, start_date, end_date, list(districts)))
 
 # ------------------ Main ------------------
-st.write("🚀 Fetching GLDAS data by district...")
-df = get_gldas_data(DISTRICTS)
-st.write("✅ Fetch complete.")
+def main():
+    global ee
+    # ------------------ Earth Engine Authentication ------------------
+    with instrument.stage("ee_init"):
+        ee = init_ee()
+    st.success("✅ Earth Engine initialized successfully.")
+
+    # ------------------ Auto-refresh at midnight ------------------
+    now = datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+    ms_until_midnight = int((midnight - now).total_seconds() * 1000)
+    st.write(f"⏰ Auto-refresh in {ms_until_midnight//1000} seconds (at next midnight)")
+    st_autorefresh(interval=ms_until_midnight, limit=1, key="autoRefresh")
+
+    st.write(f"**Data range:** {start_date} to {end_date}")
+    st.write(f"• Collection: {collection_id} ({composite_cfg['cadence']} {composite_cfg['reducer']} composites)")
+    st.write(f"• Variables: {list(collections.keys())}")
+
+    st.write("🚀 Fetching GLDAS data by district...")
+    if ARGS.stream:
+        # Bounded memory: one month in flight, results go straight to exports/
+        st.write("### GLDAS Time Series by District")
+        export_cached(CACHE_NAME, DISTRICTS, start_date, end_date, fetch_gldas, gldas_output, 'gldas_by_district')
+        st.write("✅ Fetch complete.")
+    else:
+        with instrument.stage("cache") as s:
+            df = load_gldas_data(DISTRICTS)
+            s.rows += len(df)
+        st.write("✅ Fetch complete.")
 
-st.write("### GLDAS Time Series by District")
-st.dataframe(df)
+        st.write("### GLDAS Time Series by District")
+        with instrument.stage("render"):
+            st.dataframe(df)
+            download_buttons(df, 'gldas_by_district')
 
-csv = df.to_csv(index=False).encode('utf-8')
-st.download_button("Download CSV", data=csv, file_name='gldas_by_district.csv')
\ No newline at end of file
+if __name__ == "__main__":
+    with instrument.run("gldas_export"):
+        main()
\ No newline at end of file
@@ -0,0 +1,282 @@
+# instrument.py
+#
+# Per-stage run metrics for the Streamlit scripts.
+#
+# Each script starts a Tracer and wraps its phases in named stages
+# (`with instrument.stage("fetch") as s: ...`). The shared EE executor reports
+# every request attempt to the current tracer, so each stage gets its getInfo()
+# count, failed attempts, retries, payload bytes and p50/p95 latency without
+# touching the request code. Stages also record wall time, the rows they
+# produced and their peak RSS. Stages may nest: calls are charged to the
+# innermost open stage and an outer stage's wall time includes its inner ones.
+#
+# finish() shows the table in the sidebar and writes <script>.prom (Prometheus
+# text format, for node_exporter's textfile collector) and <script>.json to
+# METRICS_DIR. Scripts wrap their body in `with instrument.run(script):` so the
+# files are also written when the script raises or calls st.stop().
+#
+# The current tracer is a context variable. Streamlit runs each session's script
+# in its own thread, so concurrent sessions record into separate tracers; the EE
+# executor runs its workers in the submitting thread's context. Per-stage peak
+# RSS is different: the clear_refs reset below is process-wide, so stage peaks
+# are only meaningful for headless runs with one script per process (cron,
+# benchmark.py). Under a shared Streamlit server they mix all sessions.
+
+import os, json, time, resource, threading, contextvars
+from contextlib import contextmanager
+
+import numpy as np
+
+METRICS_DIR = os.environ.get("SM_METRICS_DIR", "metrics")
+PREFIX      = "sm"
+OTHER       = "other"  # stage for calls made outside any stage
+
+
+# ------------------ Memory ------------------
+_peak_lock = threading.Lock()
+_peak_seen = 0  # process peak RSS (bytes) before the last high-water reset
+
+
+def _hwm():
+    """Peak RSS since the last reset, in bytes."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # KB on Linux
+
+
+def _reset_hwm():
+    # Linux: writing 5 to clear_refs resets VmHWM to the current RSS, so each
+    # stage sees its own peak. Elsewhere the peak stays process-wide.
+    global _peak_seen
+    with _peak_lock:
+        _peak_seen = max(_peak_seen, _hwm())
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+
+def peak_rss_mb():
+    """Process-lifetime peak RSS in MB (unaffected by the per-stage resets)."""
+    with _peak_lock:
+        return max(_peak_seen, _hwm()) / 2**20
+
+
+def payload_size(obj):
+    """Approximate size in bytes of a getInfo() result, as compact JSON."""
+    try:
+        return len(json.dumps(obj, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _num(v):
+    return str(v) if isinstance(v, (int, np.integer)) else repr(round(float(v), 6))
+
+
+# ------------------ Stages ------------------
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.wall_s = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.payload_bytes = 0
+        self.latencies = []
+        self.rows = 0
+        self.peak_rss = 0
+
+    def quantile(self, q):
+        return float(np.quantile(self.latencies, q)) if self.latencies else None
+
+    def summary(self):
+        p50, p95 = self.quantile(0.5), self.quantile(0.95)
+        return {
+            "stage": self.name,
+            "wall_s": round(self.wall_s, 3),
+            "ee_calls": self.calls,
+            "ee_errors": self.errors,
+            "ee_retries": self.retries,
+            "payload_kb": round(self.payload_bytes / 1024, 1),
+            "p50_ms": None if p50 is None else round(p50 * 1000, 1),
+            "p95_ms": None if p95 is None else round(p95 * 1000, 1),
+            "rows": self.rows,
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+        }
+
+
+class Tracer:
+    def __init__(self, script):
+        self.script = script
+        self.started = time.time()
+        self.stages = {}
+        self._open = []
+        self._lock = threading.Lock()
+
+    def _get(self, name):
+        if name not in self.stages:
+            self.stages[name] = Stage(name)
+        return self.stages[name]
+
+    def _fold_rss(self):
+        rss = _hwm()
+        for s in self._open:
+            s.peak_rss = max(s.peak_rss, rss)
+
+    @contextmanager
+    def stage(self, name):
+        with self._lock:
+            s = self._get(name)
+            self._fold_rss()
+            self._open.append(s)
+        _reset_hwm()
+        t0 = time.perf_counter()
+        try:
+            yield s
+        finally:
+            with self._lock:
+                s.wall_s += time.perf_counter() - t0
+                self._fold_rss()
+                self._open.remove(s)
+
+    def _current(self):
+        return self._open[-1] if self._open else self._get(OTHER)
+
+    # Hooks called by the EE executor (any thread)
+    def call(self, seconds, payload=0, ok=True):
+        with self._lock:
+            s = self._current()
+            s.calls += 1
+            s.latencies.append(seconds)
+            s.payload_bytes += payload
+            if not ok:
+                s.errors += 1
+
+    def retry(self):
+        with self._lock:
+            self._current().retries += 1
+
+    def add_rows(self, n):
+        with self._lock:
+            self._current().rows += int(n)
+
+    # ------------------ Output ------------------
+    def summary(self):
+        return [s.summary() for s in self.stages.values()]
+
+    def to_json(self):
+        return {"script": self.script, "started": self.started,
+                "finished": time.time(), "peak_rss_mb": round(peak_rss_mb(), 1),
+                "stages": self.summary()}
+
+    def to_prometheus(self):
+        lab = lambda s, **kw: "{" + ",".join(f'{k}="{v}"' for k, v in
+                                             dict(script=self.script, stage=s.name, **kw).items()) + "}"
+        out = []
+
+        def metric(name, kind, help_, samples):
+            out.append(f"# HELP {PREFIX}_{name} {help_}")
+            out.append(f"# TYPE {PREFIX}_{name} {kind}")
+            out.extend(f"{PREFIX}_{name}{labels} {_num(value)}" for labels, value in samples)
+
+        stages = list(self.stages.values())
+        metric("stage_wall_seconds", "gauge", "Wall time of the stage in the last run.",
+               [(lab(s), s.wall_s) for s in stages])
+        metric("stage_ee_calls", "gauge", "Earth Engine request attempts.",
+               [(lab(s), s.calls) for s in stages])
+        metric("stage_ee_errors", "gauge", "Earth Engine request attempts that failed.",
+               [(lab(s), s.errors) for s in stages])
+        metric("stage_ee_retries", "gauge", "Earth Engine requests retried after a quota error.",
+               [(lab(s), s.retries) for s in stages])
+        metric("stage_ee_payload_bytes", "gauge", "Approximate JSON bytes returned by Earth Engine.",
+               [(lab(s), s.payload_bytes) for s in stages])
+        metric("stage_ee_latency_seconds", "summary", "Earth Engine request latency.",
+               [(lab(s, quantile=q), s.quantile(q)) for s in stages for q in (0.5, 0.95) if s.latencies])
+        for s in stages:
+            out.append(f"{PREFIX}_stage_ee_latency_seconds_sum{lab(s)} {_num(sum(s.latencies))}")
+            out.append(f"{PREFIX}_stage_ee_latency_seconds_count{lab(s)} {len(s.latencies)}")
+        metric("stage_rows", "gauge", "Rows produced by the stage.",
+               [(lab(s), s.rows) for s in stages])
+        metric("stage_peak_rss_bytes", "gauge", "Peak resident memory while the stage ran.",
+               [(lab(s), s.peak_rss) for s in stages])
+        metric("run_last_timestamp_seconds", "gauge", "End of the last completed run.",
+               [(f'{{script="{self.script}"}}', time.time())])
+        return "\n".join(out) + "\n"
+
+    def write(self, root=None):
+        root = root or METRICS_DIR
+        os.makedirs(root, exist_ok=True)
+        paths = []
+        for ext, text in (("prom", self.to_prometheus()),
+                          ("json", json.dumps(self.to_json(), indent=1))):
+            path = os.path.join(root, f"{self.script}.{ext}")
+            with open(path + ".tmp", "w") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+            paths.append(path)
+        return paths
+
+    def sidebar(self):
+        import streamlit as st
+        import pandas as pd
+        st.sidebar.subheader("⏱️ Run metrics")
+        st.sidebar.dataframe(pd.DataFrame(self.summary()).set_index("stage"))
+        st.sidebar.caption(f"Process peak RSS {peak_rss_mb():.0f} MB · "
+                           f"written to {METRICS_DIR}/{self.script}.prom")
+
+
+# ------------------ Current tracer ------------------
+_current = contextvars.ContextVar("instrument_tracer", default=None)
+
+
+def start(script):
+    """Begin a new run (each Streamlit rerun starts from empty stages)."""
+    t = Tracer(script)
+    _current.set(t)
+    return t
+
+
+def tracer():
+    t = _current.get()
+    if t is None:
+        t = start("unnamed")
+    return t
+
+
+def stage(name):
+    return tracer().stage(name)
+
+
+def add_rows(n):
+    tracer().add_rows(n)
+
+
+def finish(sidebar=True):
+    """Write the metrics files and (under Streamlit) show the sidebar panel."""
+    t = tracer()
+    paths = t.write()
+    if sidebar:
+        t.sidebar()
+    return paths
+
+
+@contextmanager
+def run(script, sidebar=True):
+    """
+    start() a run and finish() it however the body ends. After an error or
+    st.stop() only the files are written; the sidebar is left alone.
+    """
+    t = start(script)
+    try:
+        yield t
+    except BaseException:
+        finish(sidebar=False)
+        raise
+    finish(sidebar)
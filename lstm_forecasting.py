@@ -4,91 +4,201 @@ import os
 import streamlit as st
 import pandas as pd
 import numpy as np
-from tensorflow.keras.models import Sequential, load_model
-from tensorflow.keras.layers import LSTM, Dense, Dropout
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.losses import MeanSquaredError
 from datetime import timedelta
+from backtest import rolling_origin_backtest, summarize, forecast_paths, split_series
+from lstm_incremental import fit_incremental, last_trained, mark_trained
+from lstm_numpy import load_engine
+import lstm_global
+from run_config import make_parser
+import instrument
+
+# TensorFlow is imported inside the training functions only: pages that just
+# validate and forecast run on the NumPy engine and never pay for the import.
 
 WINDOW_SIZE    = 7
 FORECAST_DAYS  = 30
+HOLDOUT_DAYS   = 2 * FORECAST_DAYS  # recent days kept out of training for validation
 MODEL_FILE     = "lstm_model.h5"
-LAST_TRAINED   = "last_trained_date.txt"
+DIRECT_FILE    = "lstm_direct.h5"
 SERIES_CSV     = "sm_series.csv"
+FORECAST_CSV   = "sm_forecast.csv"
 
-st.title("4️⃣ LSTM Forecasting of Soil Moisture")
+# --district/--start/--end narrow the series; --train forces a retraining run.
+# Dates default to the whole file rather than the exporters' 12-month window.
+_parser = make_parser("LSTM soil-moisture forecasting")
+_parser.add_argument("--train", action="store_true", help="retrain even without new data")
+ARGS, _ = _parser.parse_known_args()
 
 def load_series():
     if not os.path.exists(SERIES_CSV):
         st.error(f"{SERIES_CSV} not found — run rf_downscaling.py first."); st.stop()
     df = pd.read_csv(SERIES_CSV, parse_dates=["ds"])
+    if "district" in df.columns and ARGS.district:
+        names = [d.strip() for n in ARGS.district for d in n.split(",")]
+        df = df[df.district.isin(names)]
+    if ARGS.start:
+        df = df[df.ds >= ARGS.start]
+    if ARGS.end:
+        df = df[df.ds < ARGS.end]
     if df.empty:
-        st.error(f"{SERIES_CSV} is empty."); st.stop()
+        st.error(f"{SERIES_CSV} has no rows for the selected districts/dates."); st.stop()
     return df
 
+def build_model(n_out=1):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import LSTM, Dense, Dropout
+    # n_out=1: one-step model rolled forward; n_out=FORECAST_DAYS: direct multi-horizon
+    m = Sequential([
+        LSTM(50, activation="relu", return_sequences=True, input_shape=(WINDOW_SIZE,1)),
+        LSTM(25, activation="relu"),
+        Dropout(0.2),
+        Dense(n_out)
+    ])
+    m.compile(optimizer="adam", loss="mse")
+    return m
+
+def load_keras(path):
+    from tensorflow.keras.models import load_model
+    from tensorflow.keras.optimizers import Adam
+    from tensorflow.keras.losses import MeanSquaredError
+    m = load_model(path, custom_objects={"mse":MeanSquaredError()})
+    m.compile(optimizer=Adam(), loss="mse")
+    return m
+
+@st.cache_resource(show_spinner=False)
+def _engine(path, mtime):
+    # one NumPy engine per model file version, kept across reruns
+    return load_engine(path)
+
+def cached_engine(path):
+    return _engine(path, os.path.getmtime(path))
+
+def train_cutoff(df):
+    # The models train up to here; the last HOLDOUT_DAYS are only backtested
+    return df.ds.max() - timedelta(days=HOLDOUT_DAYS)
+
+def needs_training(df):
+    return (train_cutoff(df) > last_trained()
+            or not os.path.exists(MODEL_FILE) or not os.path.exists(DIRECT_FILE))
+
 def train_model(df):
-    if os.path.exists(MODEL_FILE):
-        m = load_model(MODEL_FILE, custom_objects={"mse":MeanSquaredError()})
-        m.compile(optimizer=Adam(), loss="mse")
-    else:
-        m = Sequential([
-            LSTM(50, activation="relu", return_sequences=True, input_shape=(WINDOW_SIZE,1)),
-            LSTM(25, activation="relu"),
-            Dropout(0.2),
-            Dense(1)
-        ])
-        m.compile(optimizer="adam", loss="mse")
-
-    last = pd.to_datetime("1900-01-01")
-    if os.path.exists(LAST_TRAINED):
-        try: last = pd.to_datetime(open(LAST_TRAINED).read().strip())
-        except: pass
-
-    new_data = df[df.ds > last]
-    if not new_data.empty and len(df) > WINDOW_SIZE:
-        start_idx = max(0, new_data.index[0] - WINDOW_SIZE)
-        tr = df.iloc[start_idx:]
-        X, y = [], []
-        for j in range(len(tr) - WINDOW_SIZE):
-            X.append(tr.y.values[j:j+WINDOW_SIZE])
-            y.append(tr.y.values[j+WINDOW_SIZE])
-        X = np.array(X).reshape(-1, WINDOW_SIZE, 1)
-        y = np.array(y)
-        with st.spinner("Training LSTM…"):
-            m.fit(X, y, epochs=100, batch_size=16, verbose=0)
-        open(LAST_TRAINED, "w").write(df.ds.iloc[-1].strftime("%Y-%m-%d"))
-
-    m.save(MODEL_FILE)
+    # Warm-start from the weights checkpoint and fine-tune on new + replayed
+    # windows with early stopping (see lstm_incremental)
+    with st.spinner("Training LSTM…"):
+        m, stats = fit_incremental(df, MODEL_FILE, 1, build_model, WINDOW_SIZE, load_keras)
+    st.write(f"One-step model: {stats['new_windows']} new / {stats['replayed']} replayed windows, "
+             f"{stats['epochs']} epoch(s)")
     return m
 
 def validate_model(m, df):
-    preds, acts = [], []
-    for i in range(WINDOW_SIZE, len(df)):
-        inp = df.y.values[i-WINDOW_SIZE:i].reshape(1, WINDOW_SIZE, 1)
-        p   = m.predict(inp, verbose=0)[0,0]
-        preds.append(p); acts.append(df.y.iloc[i])
-    mse = np.mean((np.array(acts) - np.array(preds))**2)
-    return {"RMSE": np.sqrt(mse), "MAE": np.mean(np.abs(np.array(acts) - np.array(preds)))}
+    # Rolling-origin backtest: all windows scored in batched predict calls,
+    # out to FORECAST_DAYS, per horizon and per district. Only origins after
+    # the training cutoff are scored, so the metrics are out of sample.
+    predict = lambda X: m.predict(X, batch_size=1024, verbose=0)
+    per_district = rolling_origin_backtest(predict, df, WINDOW_SIZE, FORECAST_DAYS,
+                                           since=last_trained())
+    per_horizon  = summarize(per_district)
+    h1 = per_horizon.iloc[0] if len(per_horizon) else {"RMSE": np.nan, "MAE": np.nan}
+    metrics = {"RMSE": float(h1["RMSE"]), "MAE": float(h1["MAE"])}
+    return metrics, per_horizon, per_district
+
+def train_direct_model(df):
+    # One forward pass returns all FORECAST_DAYS values, so nothing is fed back
+    with st.spinner("Training direct multi-horizon LSTM…"):
+        m, stats = fit_incremental(df, DIRECT_FILE, FORECAST_DAYS, build_model, WINDOW_SIZE)
+    st.write(f"Direct model: {stats['new_windows']} new / {stats['replayed']} replayed windows, "
+             f"{stats['epochs']} epoch(s)")
+    return m
 
 def generate_forecast(m, df):
-    buf = list(df.y.values[-WINDOW_SIZE:])
-    last_date = df.ds.iloc[-1]
-    fut = []
-    pbar = st.progress(0)
-    for k in range(FORECAST_DAYS):
-        inp = np.array(buf[-WINDOW_SIZE:]).reshape(1, WINDOW_SIZE, 1)
-        p   = m.predict(inp, verbose=0)[0,0]
-        fut.append({"ds": last_date + timedelta(days=k+1), "y_pred": p})
-        buf.append(p)
-        pbar.progress((k+1)/FORECAST_DAYS)
-    return pd.DataFrame(fut)
-
-df_series = load_series()
-st.subheader("Historical series"); st.line_chart(df_series.set_index("ds")["y"])
-
-model   = train_model(df_series)
-metrics = validate_model(model, df_series)
-st.subheader("Validation metrics"); st.write(metrics)
-
-df_fc = generate_forecast(model, df_series)
-st.subheader(f"{FORECAST_DAYS}-Day Forecast"); st.line_chart(df_fc.set_index("ds")["y_pred"]); st.dataframe(df_fc)
+    # Last window of every district stacked into one batch: a direct model
+    # needs one predict call, a one-step model FORECAST_DAYS batched calls
+    names, windows, last_dates = [], [], []
+    for name, g in split_series(df):
+        if len(g) < WINDOW_SIZE:
+            continue
+        names.append(name)
+        windows.append(g.y.values[-WINDOW_SIZE:])
+        last_dates.append(g.ds.iloc[-1])
+    if not windows:
+        return pd.DataFrame(columns=["ds", "y_pred"])
+
+    predict = lambda X: m.predict(X, batch_size=1024, verbose=0)
+    paths = forecast_paths(predict, np.array(windows, dtype=np.float32), FORECAST_DAYS)
+
+    fut = pd.DataFrame({
+        "district": np.repeat(names, FORECAST_DAYS),
+        "ds":       [d + timedelta(days=k+1) for d in last_dates for k in range(FORECAST_DAYS)],
+        "y_pred":   paths.ravel(),
+    })
+    return fut if "district" in df.columns else fut.drop(columns="district")
+
+def main():
+    st.title("4️⃣ LSTM Forecasting of Soil Moisture")
+    with instrument.stage("load") as s:
+        df_series = load_series()
+        s.rows += len(df_series)
+    st.subheader("Historical series"); st.line_chart(df_series.set_index("ds")["y"])
+
+    # Retrain (TensorFlow) only when new rows passed the holdout or a model file
+    # is missing; validation and forecasting always run on the NumPy inference engine
+    if ARGS.train or needs_training(df_series):
+        with instrument.stage("train"):
+            cutoff = train_cutoff(df_series)
+            df_train = df_series[df_series.ds <= cutoff]
+            train_model(df_train)
+            train_direct_model(df_train)
+            mark_trained(cutoff)
+    with instrument.stage("validate"):
+        model  = cached_engine(MODEL_FILE)
+        direct = cached_engine(DIRECT_FILE)
+        metrics, by_horizon, by_district = validate_model(model, df_series)
+        _, by_horizon_direct, _ = validate_model(direct, df_series)
+    by_horizon["RMSE_direct"] = by_horizon_direct["RMSE"].values
+    st.subheader("Validation metrics"); st.write(metrics)
+    st.subheader("Skill by forecast horizon")
+    st.line_chart(by_horizon.set_index("horizon")[["RMSE", "RMSE_direct", "RMSE_persistence"]])
+    st.dataframe(by_horizon)
+    if "district" in df_series.columns:
+        st.dataframe(by_district)
+
+    # Direct forecast, with the recursive one-step forecast kept for comparison
+    with instrument.stage("forecast") as s:
+        df_fc     = generate_forecast(direct, df_series)
+        df_fc_rec = generate_forecast(model, df_series)
+        df_fc["y_pred_recursive"] = df_fc_rec["y_pred"].values
+        s.rows += len(df_fc)
+    st.subheader(f"{FORECAST_DAYS}-Day Forecast")
+    if "district" in df_fc.columns:
+        st.line_chart(df_fc.pivot(index="ds", columns="district", values="y_pred"))
+    else:
+        st.line_chart(df_fc.set_index("ds")[["y_pred", "y_pred_recursive"]])
+    st.dataframe(df_fc)
+    df_fc.to_csv(FORECAST_CSV, index=False)
+
+    # Global mode: one model over all districts with a district embedding and the
+    # cached CHIRPS/GLDAS covariates, trained through a streaming tf.data pipeline
+    if "district" in df_series.columns and df_series.district.nunique() > 1:
+        st.subheader("Global multi-district model")
+        with instrument.stage("global") as s:
+            covs = lstm_global.load_covariates(str(df_series.ds.min().date()))
+            st.write(f"Covariates: {list(covs) or 'none'}")
+            # Trained from scratch, so only on --train runs (the pipeline passes
+            # it); the page itself only forecasts with the saved model
+            if ARGS.train and lstm_global.needs_training(df_series):
+                with st.spinner("Training global LSTM…"):
+                    lstm_global.train_global(df_series, covs)
+            trained = os.path.exists(lstm_global.GLOBAL_FILE) and os.path.exists(lstm_global.GLOBAL_META)
+            if trained:
+                df_fc_global = lstm_global.forecast_global(df_series, covs,
+                                                           model=cached_engine(lstm_global.GLOBAL_FILE))
+                s.rows += len(df_fc_global)
+        if trained:
+            st.line_chart(df_fc_global.pivot(index="ds", columns="district", values="y_pred"))
+            st.dataframe(df_fc_global)
+        else:
+            st.info("No global model yet: run `python lstm_forecasting.py --train` (or pipeline.py).")
+
+if __name__ == "__main__":
+    with instrument.run("lstm_forecasting"):
+        main()
@@ -0,0 +1,220 @@
+# lstm_global.py
+#
+# One global LSTM over all districts.
+#
+# Every district's daily series (plus optional exogenous covariates such as
+# CHIRPS precipitation and GLDAS evapotranspiration) is laid out in one flat,
+# standardized (rows × features) array. Only the int32 start offsets of the
+# valid windows are materialized; a tf.data pipeline shuffles those offsets and
+# slices each window lazily, then batches and prefetches. A learned district
+# embedding is concatenated to every time step so one model serves all
+# districts. Forecasts run on the NumPy engine (lstm_numpy); TensorFlow is
+# only imported to train.
+
+import os, json
+import numpy as np
+import pandas as pd
+
+from backtest import split_series
+
+WINDOW_SIZE   = 7
+FORECAST_DAYS = 30
+GLOBAL_FILE   = "lstm_global.h5"
+GLOBAL_META   = "lstm_global.json"
+EMBED_DIM     = 4
+VAL_DAYS      = 30
+RETRAIN_DAYS  = 30  # retrain from scratch once the model is this far behind the data
+
+
+# ------------------ Panel assembly ------------------
+def load_covariates(start=None, end=None, cache=None):
+    """
+    District-daily covariates from the observation cache, when present:
+    CHIRPS precipitation (mean over district pixels) and GLDAS
+    evapotranspiration from gldas_export.py's `gldas_daily` dataset, which
+    EE already composites to one daily mean per district.
+    """
+    from obs_cache import ObservationCache
+    cache = cache or ObservationCache()
+    start = start or "1900-01-01"
+    end = end or pd.Timestamp.today().strftime("%Y-%m-%d")
+    covs = {}
+    for name, dataset, band in [("precip", "chirps", "precip_mm"), ("evap", "gldas_daily", "Evapotranspiration")]:
+        df = cache.load(dataset, start, end)
+        df = df[df.band.astype(str) == band] if len(df) else df
+        if len(df):
+            covs[name] = (df.assign(district=df.district.astype(str))
+                            .groupby(["district", "date"], observed=True).value.mean()
+                            .rename_axis(["district", "ds"]).rename(name).reset_index())
+    return covs
+
+
+def build_panel(series, covariates=None):
+    """
+    Align `series` (district, ds, y) with the covariates on a daily grid per
+    district. Returns a dict with the flat feature array, per-district row
+    offsets, dates and the feature names (y first).
+    """
+    covariates = covariates or {}
+    names = ["y"] + list(covariates)
+    blocks, offsets, dates, districts = [], [0], [], []
+    for d, g in split_series(series):
+        g = g.set_index("ds")[["y"]].resample("D").mean().interpolate(limit_direction="both")
+        for name, cov in covariates.items():
+            c = cov[cov.district == d].set_index("ds")[name].resample("D").mean()
+            g[name] = c.reindex(g.index).ffill().fillna(0.0)
+        blocks.append(g[names].to_numpy(np.float32))
+        offsets.append(offsets[-1] + len(g))
+        dates.append(g.index)
+        districts.append(d)
+    data = np.concatenate(blocks) if blocks else np.empty((0, len(names)), np.float32)
+    return {"data": data, "offsets": np.array(offsets), "dates": dates,
+            "districts": districts, "features": names}
+
+
+def window_starts(panel, window, horizon, cutoff=None):
+    """
+    Start rows of all windows that stay inside one district, split into
+    (train, val) by whether the first target day falls after `cutoff`.
+    Returns (starts, district_ids) arrays for each part.
+    """
+    tr, va = ([], []), ([], [])
+    for i, (lo, hi) in enumerate(zip(panel["offsets"][:-1], panel["offsets"][1:])):
+        s = np.arange(lo, hi - window - horizon + 1, dtype=np.int32)
+        if cutoff is None:
+            is_val = np.zeros(len(s), bool)
+        else:
+            first_target = panel["dates"][i][s - lo + window]
+            is_val = first_target > cutoff
+        for part, mask in ((tr, ~is_val), (va, is_val)):
+            part[0].append(s[mask]); part[1].append(np.full(mask.sum(), i, np.int32))
+    cat = lambda p: (np.concatenate(p[0]) if p[0] else np.empty(0, np.int32),
+                     np.concatenate(p[1]) if p[1] else np.empty(0, np.int32))
+    return cat(tr), cat(va)
+
+
+def make_dataset(data, starts, district_ids, window, horizon, batch_size=64, shuffle=True):
+    """tf.data pipeline slicing ((window, district), target) lazily from `data`."""
+    import tensorflow as tf
+    data_t = tf.constant(data)
+
+    def slice_window(s, d):
+        x = data_t[s:s + window]
+        y = data_t[s + window:s + window + horizon, 0]
+        return {"seq": x, "district": d}, y
+
+    ds = tf.data.Dataset.from_tensor_slices((starts, district_ids))
+    if shuffle:
+        ds = ds.shuffle(min(len(starts), 10000), reshuffle_each_iteration=True)
+    return (ds.map(slice_window, num_parallel_calls=tf.data.AUTOTUNE)
+              .batch(batch_size)
+              .prefetch(tf.data.AUTOTUNE))
+
+
+# ------------------ Model ------------------
+def build_global_model(n_districts, n_features, n_out=1, window=WINDOW_SIZE, embed_dim=EMBED_DIM):
+    from tensorflow.keras import layers, Model
+    seq = layers.Input(shape=(window, n_features), name="seq")
+    dist = layers.Input(shape=(), dtype="int32", name="district")
+    emb = layers.Embedding(n_districts, embed_dim, name="district_embedding")(dist)
+    x = layers.Concatenate()([seq, layers.RepeatVector(window)(emb)])
+    x = layers.LSTM(50, activation="relu", return_sequences=True)(x)
+    x = layers.LSTM(25, activation="relu")(x)
+    x = layers.Dropout(0.2)(x)
+    out = layers.Dense(n_out)(x)
+    m = Model([seq, dist], out)
+    m.compile(optimizer="adam", loss="mse")
+    return m
+
+
+def _standardize(data, mean, std):
+    return (data - mean) / std
+
+
+def train_global(series, covariates=None, horizon=1, epochs=100, batch_size=64,
+                 val_days=VAL_DAYS, model_file=GLOBAL_FILE, meta_file=GLOBAL_META):
+    """Fit one model over every district and save it with its scaling metadata."""
+    import tensorflow as tf
+
+    panel = build_panel(series, covariates)
+    last = max(d[-1] for d in panel["dates"])
+    cutoff = last - pd.Timedelta(days=val_days + horizon) if val_days else None
+
+    # Scaling statistics from the training rows only, so the validation slice stays unseen
+    train_rows = np.concatenate([np.asarray(d <= cutoff) if cutoff is not None else np.ones(len(d), bool)
+                                 for d in panel["dates"]])
+    fit = panel["data"][train_rows] if train_rows.any() else panel["data"]
+    mean = fit.mean(axis=0)
+    std = fit.std(axis=0)
+    std[std == 0] = 1.0
+    data = _standardize(panel["data"], mean, std).astype(np.float32)
+    (tr_s, tr_d), (va_s, va_d) = window_starts(panel, WINDOW_SIZE, horizon, cutoff)
+
+    m = build_global_model(len(panel["districts"]), len(panel["features"]), horizon)
+    train_ds = make_dataset(data, tr_s, tr_d, WINDOW_SIZE, horizon, batch_size)
+    val_ds = make_dataset(data, va_s, va_d, WINDOW_SIZE, horizon, batch_size, shuffle=False) if len(va_s) else None
+    cbs = [tf.keras.callbacks.EarlyStopping(patience=10, restore_best_weights=True)] if val_ds else []
+    m.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=cbs, verbose=0)
+
+    m.save(model_file)
+    with open(meta_file, "w") as f:
+        json.dump({"districts": panel["districts"], "features": panel["features"],
+                   "mean": mean.tolist(), "std": std.tolist(),
+                   "window": WINDOW_SIZE, "horizon": horizon,
+                   "last_date": str(last.date())}, f, indent=1)
+    return m
+
+
+def forecast_global(series, covariates=None, model_file=GLOBAL_FILE, meta_file=GLOBAL_META,
+                    horizon=FORECAST_DAYS, model=None):
+    """
+    Forecast every district in one batched call per step. Covariates are held
+    at their last observed value when the model is rolled forward. `model` is
+    a loaded engine (e.g. cached by the page); by default the NumPy engine
+    for `model_file`.
+    """
+    from lstm_numpy import load_engine
+    with open(meta_file) as f:
+        meta = json.load(f)
+    m = model or load_engine(model_file)
+    mean, std = np.array(meta["mean"], np.float32), np.array(meta["std"], np.float32)
+    covariates = {k: (covariates or {})[k] for k in meta["features"][1:]}
+
+    panel = build_panel(series, covariates)
+    ids = {d: i for i, d in enumerate(meta["districts"])}
+    keep = [i for i, d in enumerate(panel["districts"]) if d in ids]
+    window = meta["window"]
+    X = np.stack([_standardize(panel["data"][panel["offsets"][i + 1] - window:panel["offsets"][i + 1]], mean, std)
+                  for i in keep]).astype(np.float32)
+    d_ids = np.array([ids[panel["districts"][i]] for i in keep], np.int32)
+
+    preds = []
+    while sum(p.shape[1] for p in preds) < horizon:
+        step = m.predict({"seq": X, "district": d_ids}, verbose=0).reshape(len(X), -1)
+        preds.append(step)
+        nxt = np.repeat(X[:, -1:, :], step.shape[1], axis=1)
+        nxt[:, :, 0] = step
+        X = np.concatenate([X, nxt], axis=1)[:, -window:]
+    paths = np.concatenate(preds, axis=1)[:, :horizon] * std[0] + mean[0]
+
+    last_dates = [panel["dates"][i][-1] for i in keep]
+    return pd.DataFrame({
+        "district": np.repeat([panel["districts"][i] for i in keep], horizon),
+        "ds": [d + pd.Timedelta(days=k + 1) for d in last_dates for k in range(horizon)],
+        "y_pred": paths.ravel(),
+    })
+
+
+def needs_training(series, model_file=GLOBAL_FILE, meta_file=GLOBAL_META, max_age_days=RETRAIN_DAYS):
+    """
+    True when the model is missing, a district is new to it, or the series
+    runs more than `max_age_days` past its last training day. Training is
+    from scratch, so new days alone do not trigger it every run; forecasts
+    always start from the latest window either way.
+    """
+    if not (os.path.exists(model_file) and os.path.exists(meta_file)):
+        return True
+    with open(meta_file) as f:
+        meta = json.load(f)
+    return bool(set(series.district.unique()) - set(meta["districts"])
+                or series.ds.max() > pd.Timestamp(meta["last_date"]) + pd.Timedelta(days=max_age_days))
@@ -0,0 +1,197 @@
+# lstm_incremental.py
+#
+# Bounded-cost incremental retraining for the LSTM forecasters.
+#
+# Instead of a fixed 100-epoch fit on the tail of the series, a model is
+# warm-started from its weights-only checkpoint and fine-tuned on the windows
+# that became complete since the last run, mixed with a sample from a
+# fixed-size reservoir of historical windows so older seasons are not
+# forgotten. Early stopping on a held-out slice and a hard epoch cap keep
+# each daily run to a predictable number of gradient steps. Training state
+# lives in a small JSON manifest that replaces last_trained_date.txt.
+
+import os, json
+import datetime
+import numpy as np
+import pandas as pd
+
+from backtest import make_windows, split_series
+
+MANIFEST_FILE   = "training_manifest.json"
+LEGACY_LAST     = "last_trained_date.txt"
+REPLAY_CAPACITY = 2048  # windows kept per model
+REPLAY_MIX      = 4     # replayed windows per new window (at least REPLAY_MIN)
+REPLAY_MIN      = 256
+MAX_EPOCHS      = 20    # incremental fine-tuning cap
+FULL_EPOCHS     = 100   # first fit from scratch
+PATIENCE        = 3
+VAL_FRAC        = 0.2
+BATCH_SIZE      = 16
+
+
+# ------------------ Manifest ------------------
+def read_manifest(path=MANIFEST_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    manifest = {"last_trained": None, "models": {}}
+    # Migrate the date from the old text file if it is still around
+    if os.path.exists(LEGACY_LAST):
+        try:
+            manifest["last_trained"] = str(pd.to_datetime(open(LEGACY_LAST).read().strip()).date())
+        except ValueError:
+            pass
+    return manifest
+
+
+def write_manifest(manifest, path=MANIFEST_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def last_trained(path=MANIFEST_FILE):
+    last = read_manifest(path).get("last_trained")
+    return pd.to_datetime(last) if last else pd.to_datetime("1900-01-01")
+
+
+def checkpoint_path(model_file):
+    return os.path.splitext(model_file)[0] + ".weights.h5"
+
+
+def replay_path(model_file):
+    return os.path.splitext(model_file)[0] + ".replay.npz"
+
+
+# ------------------ Replay buffer ------------------
+class ReplayBuffer:
+    """Fixed-size reservoir sample of (window, target) pairs, persisted as .npz."""
+
+    def __init__(self, path, window, horizon, capacity=REPLAY_CAPACITY, seed=0):
+        self.path = path
+        self.capacity = capacity
+        self.rng = np.random.default_rng(seed)
+        self.X = np.empty((0, window), np.float32)
+        self.Y = np.empty((0, horizon), np.float32)
+        self.seen = 0
+        if os.path.exists(path):
+            with np.load(path) as z:
+                if z["X"].shape[1] == window and z["Y"].shape[1] == horizon:
+                    self.X, self.Y, self.seen = z["X"], z["Y"], int(z["seen"])
+
+    def __len__(self):
+        return len(self.X)
+
+    def add(self, X, Y):
+        room = max(0, self.capacity - len(self.X))
+        self.X = np.concatenate([self.X, X[:room]])
+        self.Y = np.concatenate([self.Y, Y[:room]])
+        self.seen += min(room, len(X))
+        for x, y in zip(X[room:], Y[room:]):
+            # Classic reservoir sampling: every window seen so far is kept with equal probability
+            j = self.rng.integers(0, self.seen + 1)
+            if j < self.capacity:
+                self.X[j], self.Y[j] = x, y
+            self.seen += 1
+
+    def sample(self, k):
+        if len(self.X) == 0 or k <= 0:
+            return self.X[:0], self.Y[:0]
+        idx = self.rng.choice(len(self.X), size=min(k, len(self.X)), replace=False)
+        return self.X[idx], self.Y[idx]
+
+    def save(self):
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, X=self.X, Y=self.Y, seen=np.array(self.seen))
+        os.replace(tmp, self.path)
+
+
+# ------------------ Windows ------------------
+def windows_since(df, since, window, horizon, until=None):
+    """
+    All complete (window, horizon-target) pairs whose last target day is
+    after `since` (and not after `until`, if given).
+    """
+    Xs, Ys = [], []
+    for _, g in split_series(df):
+        X, Y = make_windows(g.y.values, window, horizon)
+        n = len(g) - window - horizon + 1
+        if n <= 0:
+            continue
+        last_target = g.ds.values[window + horizon - 1:]
+        keep = last_target > np.datetime64(since)
+        if until is not None:
+            keep &= last_target <= np.datetime64(until)
+        Xs.append(X[:n][keep]); Ys.append(Y[:n][keep])
+    if not Xs:
+        return np.empty((0, window), np.float32), np.empty((0, horizon), np.float32)
+    return np.concatenate(Xs), np.concatenate(Ys)
+
+
+# ------------------ Training ------------------
+def fit_incremental(df, model_file, horizon, build_fn, window, legacy_load_fn=None,
+                    manifest_path=MANIFEST_FILE):
+    """
+    Warm-start (or create) the model saved as `model_file`, fine-tune it on the
+    windows completed since the last run plus replayed history, and write the
+    weights checkpoint, the full .h5 and the replay buffer. Returns
+    (model, stats) where stats is recorded in the manifest.
+    """
+    import tensorflow as tf
+
+    manifest = read_manifest(manifest_path)
+    ckpt = checkpoint_path(model_file)
+    m = build_fn(horizon)
+    if os.path.exists(ckpt):
+        m.load_weights(ckpt)
+        warm = True
+    elif legacy_load_fn is not None and os.path.exists(model_file):
+        m = legacy_load_fn(model_file)
+        warm = True
+    else:
+        warm = False
+
+    since = last_trained(manifest_path) if warm else pd.to_datetime("1900-01-01")
+    X_new, Y_new = windows_since(df, since, window, horizon)
+    replay = ReplayBuffer(replay_path(model_file), window, horizon)
+    if warm and replay.seen == 0:
+        # First warm start (e.g. from the shipped .h5): seed the reservoir with
+        # the history the model was trained on, so fine-tuning replays it
+        replay.add(*windows_since(df, pd.to_datetime("1900-01-01"), window, horizon, until=since))
+        replay.save()
+
+    stats = {"trained_at": datetime.datetime.now().isoformat(timespec="seconds"),
+             "warm_start": warm, "new_windows": int(len(X_new)), "replayed": 0, "epochs": 0}
+    if len(X_new):
+        X_old, Y_old = replay.sample(max(REPLAY_MIN, REPLAY_MIX * len(X_new))) if warm else replay.sample(0)
+        X = np.concatenate([X_new, X_old])
+        Y = np.concatenate([Y_new, Y_old])
+        perm = np.random.default_rng(0).permutation(len(X))
+        X, Y = X[perm], Y[perm]
+        n_val = int(len(X) * VAL_FRAC) if len(X) >= 10 else 0
+        cbs = [tf.keras.callbacks.EarlyStopping(patience=PATIENCE, restore_best_weights=True)] if n_val else []
+        hist = m.fit(X[n_val:, :, None], Y[n_val:],
+                     validation_data=(X[:n_val, :, None], Y[:n_val]) if n_val else None,
+                     epochs=MAX_EPOCHS if warm else FULL_EPOCHS,
+                     batch_size=BATCH_SIZE, callbacks=cbs, verbose=0)
+        stats.update(replayed=int(len(X_old)), epochs=len(hist.history["loss"]),
+                     loss=float(hist.history["loss"][-1]))
+        if n_val:
+            stats["val_loss"] = float(min(hist.history["val_loss"]))
+        replay.add(X_new, Y_new)
+        replay.save()
+
+    m.save_weights(ckpt)
+    m.save(model_file)
+    manifest["models"][os.path.basename(model_file)] = dict(
+        stats, weights=os.path.basename(ckpt), replay=os.path.basename(replay.path),
+        replay_size=len(replay), horizon=horizon, window=window)
+    write_manifest(manifest, manifest_path)
+    return m, stats
+
+
+def mark_trained(last_date, manifest_path=MANIFEST_FILE):
+    manifest = read_manifest(manifest_path)
+    manifest["last_trained"] = str(pd.Timestamp(last_date).date())
+    write_manifest(manifest, manifest_path)
@@ -0,0 +1,154 @@
+# lstm_numpy.py
+#
+# Inference-only NumPy engine for the saved Keras forecasters.
+#
+# export_npz() reads the stacked LSTM + Dense weights straight out of a Keras
+# .h5 file with h5py (no TensorFlow import) and writes them to a compact .npz
+# together with the layer configuration and a hash of the source file.
+# NumpyLSTM then runs a vectorized forward pass over a whole batch of windows
+# and exposes the same `predict(X, batch_size=..., verbose=...)` call as a
+# Keras model, so validation and forecasting can use either one. The global
+# model's district embedding (Embedding -> RepeatVector -> Concatenate after
+# the sequence features) is supported too: predict() then takes the same
+# {"seq": ..., "district": ...} dict as the Keras model.
+
+import os, json, hashlib
+import numpy as np
+
+SUPPORTED = {"InputLayer", "LSTM", "Dropout", "Dense", "Embedding", "RepeatVector", "Concatenate"}
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def npz_path_for(h5_path):
+    return os.path.splitext(h5_path)[0] + ".npz"
+
+
+# ------------------ Export ------------------
+def export_npz(h5_path, npz_path=None):
+    """Write the weights and layer config of a Sequential LSTM/Dense model to .npz."""
+    import h5py
+
+    npz_path = npz_path or npz_path_for(h5_path)
+    with h5py.File(h5_path, "r") as f:
+        cfg = json.loads(f.attrs["model_config"])
+        mw = f["model_weights"] if "model_weights" in f else f
+        layers, arrays = [], {}
+        for layer in cfg["config"]["layers"]:
+            kind, conf = layer["class_name"], layer["config"]
+            if kind not in SUPPORTED:
+                raise ValueError(f"Unsupported layer for NumPy inference: {kind}")
+            if kind in ("InputLayer", "Dropout", "RepeatVector", "Concatenate"):
+                continue  # no weights; dropout is inactive at inference
+            g = mw[conf["name"]]
+            weights = [np.asarray(g[w], dtype=np.float32) for w in g.attrs["weight_names"]]
+            i = len(layers)
+            if kind == "Embedding":
+                # repeated over the window and appended to the sequence features
+                arrays["embedding"], = weights
+            elif kind == "LSTM":
+                arrays[f"l{i}_kernel"], arrays[f"l{i}_recurrent"], arrays[f"l{i}_bias"] = weights
+                layers.append({"kind": "lstm", "units": conf["units"],
+                               "activation": conf.get("activation", "tanh"),
+                               "recurrent_activation": conf.get("recurrent_activation", "sigmoid"),
+                               "return_sequences": conf.get("return_sequences", False)})
+            else:
+                arrays[f"l{i}_kernel"], arrays[f"l{i}_bias"] = weights
+                layers.append({"kind": "dense", "activation": conf.get("activation", "linear")})
+
+    tmp = npz_path + ".tmp.npz"
+    np.savez_compressed(tmp, layers=np.array(json.dumps(layers)),
+                        source_sha256=np.array(file_sha256(h5_path)), **arrays)
+    os.replace(tmp, npz_path)
+    return npz_path
+
+
+# ------------------ Forward pass ------------------
+ACTIVATIONS = {
+    "linear":       lambda x: x,
+    "relu":         lambda x: np.maximum(x, 0),
+    "tanh":         np.tanh,
+    "sigmoid":      lambda x: 1 / (1 + np.exp(-x)),
+    "hard_sigmoid": lambda x: np.clip(0.2 * x + 0.5, 0, 1),
+}
+
+
+def _lstm(x, W, U, b, act, rec_act, return_sequences):
+    # x: (n, t, d). Gate order in the fused Keras kernel is i, f, c, o.
+    n, t, _ = x.shape
+    units = U.shape[0]
+    h = np.zeros((n, units), np.float32)
+    c = np.zeros((n, units), np.float32)
+    xw = x @ W + b  # input projection for all steps at once: (n, t, 4u)
+    seq = np.empty((n, t, units), np.float32) if return_sequences else None
+    for k in range(t):
+        z = xw[:, k] + h @ U
+        i = rec_act(z[:, :units])
+        f = rec_act(z[:, units:2 * units])
+        g = act(z[:, 2 * units:3 * units])
+        o = rec_act(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * act(c)
+        if seq is not None:
+            seq[:, k] = h
+    return seq if return_sequences else h
+
+
+class NumpyLSTM:
+    def __init__(self, layers, arrays):
+        self.layers = layers
+        self.arrays = arrays
+
+    @classmethod
+    def load(cls, npz_path):
+        with np.load(npz_path) as z:
+            layers = json.loads(str(z["layers"]))
+            arrays = {k: z[k] for k in z.files if k.startswith("l") or k == "embedding"}
+        return cls(layers, arrays)
+
+    @property
+    def output_size(self):
+        last = len(self.layers) - 1
+        return self.arrays[f"l{last}_kernel"].shape[1]
+
+    def predict(self, X, batch_size=None, verbose=0):
+        if isinstance(X, dict):
+            out = np.asarray(X["seq"], dtype=np.float32)
+            emb = self.arrays["embedding"][np.asarray(X["district"], dtype=np.int64)]
+            out = np.concatenate([out, np.repeat(emb[:, None], out.shape[1], axis=1)], axis=-1)
+        else:
+            out = np.asarray(X, dtype=np.float32)
+        if out.ndim == 2:
+            out = out[..., None]
+        for i, spec in enumerate(self.layers):
+            W, b = self.arrays[f"l{i}_kernel"], self.arrays[f"l{i}_bias"]
+            act = ACTIVATIONS[spec["activation"]]
+            if spec["kind"] == "lstm":
+                out = _lstm(out, W, self.arrays[f"l{i}_recurrent"], b, act,
+                            ACTIVATIONS[spec["recurrent_activation"]], spec["return_sequences"])
+            else:
+                out = act(out @ W + b)
+        return out
+
+
+def is_fresh(h5_path, npz_path=None):
+    """True if the .npz exists and was exported from the current .h5 contents."""
+    npz_path = npz_path or npz_path_for(h5_path)
+    if not os.path.exists(npz_path):
+        return False
+    with np.load(npz_path) as z:
+        return "source_sha256" in z.files and str(z["source_sha256"]) == file_sha256(h5_path)
+
+
+def load_engine(h5_path):
+    """NumPy engine for `h5_path`, re-exporting the .npz when it is missing or stale."""
+    npz_path = npz_path_for(h5_path)
+    if not is_fresh(h5_path, npz_path):
+        export_npz(h5_path, npz_path)
+    return NumpyLSTM.load(npz_path)
@@ -1,119 +1,165 @@
-import ee
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
 import pandas as pd
 import datetime
-from dateutil.relativedelta import relativedelta
-import tempfile, os, json
-
-# ------------------ Earth Engine Authentication ------------------
-st.write("🔑 Starting Earth Engine authentication...")
-if "ee_credentials" not in st.secrets:
-    st.error("Missing 'ee_credentials' in secrets. Please add your service account JSON.")
-    st.stop()
-key_data = st.secrets["ee_credentials"]["json"]
-if isinstance(key_data, dict):
-    key_data = json.dumps(key_data)
-creds = json.loads(key_data)
-st.write("• Retrieved credentials from secrets.")
-with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-    f.write(key_data)
-    path = f.name
-try:
-    ee.Initialize(ee.ServiceAccountCredentials(creds['client_email'], path))
-    st.success("✅ Earth Engine initialized")
-except Exception as e:
-    st.error(f"EE init error: {e}")
-    st.stop()
-finally:
-    if os.path.exists(path):
-        os.remove(path)
-        st.write("• Temporary credentials file removed.")
+from obs_cache import ObservationCache
+from ee_executor import get_executor, ee_date_str
+from ee_session import init_ee, district_geoms
+from columnar import ColumnarRecords, categorize, download_buttons
+from compositing import composite, period_floor, CADENCES
+from run_config import parse_args
+from streaming import export_cached
+import instrument
+
+# EE client, initialized by main() once per process and shared across reruns (ee_session)
+ee = None
 
 # ------------------ Auto-refresh at midnight ------------------
-st.write("⏰ Configuring auto-refresh at next midnight...")
+# Also the lifetime of the memoized MODIS frame
 now = datetime.datetime.now()
 midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
 ms_until_midnight = int((midnight - now).total_seconds() * 1000)
-st.write(f"• Milliseconds until midnight: {ms_until_midnight}")
-st_autorefresh(interval=ms_until_midnight, limit=1, key="autoRefresh")
-
-# ------------------ Hard-coded Districts ------------------
-DISTRICTS = [
-    'Aurangabad', 'Bid', 'Hingoli', 'Jalna',
-    'Latur', 'Osmanabad', 'Parbhani', 'Nanded'
-]
-
-# ------------------ Load GAUL boundaries ------------------
-gaul = ee.FeatureCollection("FAO/GAUL/2015/level2") \
-         .filter(ee.Filter.eq('ADM0_NAME', 'India')) \
-         .filter(ee.Filter.eq('ADM1_NAME', 'Maharashtra'))
-
-# ------------------ Date Range ------------------
-today = datetime.date.today()
-start_date = (today - relativedelta(months=12)).strftime("%Y-%m-%d")
-end_date   = today.strftime("%Y-%m-%d")
-st.write(f"**Data range:** {start_date} to {end_date}")
+
+# ------------------ Districts & Date Range ------------------
+# --start/--end/--district (see run_config); default: last 12 months, all districts
+ARGS = parse_args()
+DISTRICTS = ARGS.districts
+start_date, end_date = ARGS.start, ARGS.end
 
 # ------------------ MODIS Collections & Bands ------------------
+# name: (collection, bands, server-side composite). Cadence is explicit rather
+# than each product's native step: daily products stay daily, the 8-/16-day
+# composites are put on dekads (maximum-value NDVI/EVI, mean ET)
 collections = {
-    'LST_Emissivity':    ('MODIS/061/MOD11A1', ['LST_Day_1km','Emis_31','Emis_32']),
-    'Vegetation':        ('MODIS/061/MOD13Q1', ['NDVI','EVI']),
-    'ET':                ('MODIS/061/MOD16A2', ['ET']),
-    'SurfaceReflectance':('MODIS/061/MOD09GA', ['sur_refl_b01','sur_refl_b02','sur_refl_b03']),
-    'SnowCover':         ('MODIS/061/MOD10A1', ['NDSI_Snow_Cover'])
+    'LST_Emissivity':    ('MODIS/061/MOD11A1', ['LST_Day_1km','Emis_31','Emis_32'],
+                          {'cadence': 'daily', 'reducer': 'mean'}),
+    'Vegetation':        ('MODIS/061/MOD13Q1', ['NDVI','EVI'],
+                          {'cadence': 'dekadal', 'reducer': 'max'}),
+    'ET':                ('MODIS/061/MOD16A2', ['ET'],
+                          {'cadence': 'dekadal', 'reducer': 'mean'}),
+    'SurfaceReflectance':('MODIS/061/MOD09GA', ['sur_refl_b01','sur_refl_b02','sur_refl_b03'],
+                          {'cadence': 'daily', 'reducer': 'mean'}),
+    'SnowCover':         ('MODIS/061/MOD10A1', ['NDSI_Snow_Cover'],
+                          {'cadence': 'daily', 'reducer': 'max'})
 }
-all_bands = [b for _,bl in collections.values() for b in bl]
+all_bands = [b for _,bl,_ in collections.values() for b in bl]
+CACHE_NAME = 'modis_composite'
+# Refreshes start on a boundary of the coarsest cadence, so no composite
+# period is split between two fetches, and reach LAG_DAYS back: MOD13Q1 and
+# MOD16A2 appear weeks after their dates, by which time the daily products
+# have already moved the cache's coverage past them
+COARSEST = max((cfg['cadence'] for _,_,cfg in collections.values()), key=CADENCES.index)
+LAG_DAYS = 30
 
-@st.cache_data(ttl=ms_until_midnight/1000, show_spinner=True)
-def get_modis_data(districts):
-    records = []
-    # Calculate total images across collections for progress
-    total_images = sum(
-        ee.ImageCollection(col_id)
-          .filterDate(start_date, end_date)
-          .size().getInfo()
-        for col_id,_ in collections.values()
-    )
+def modis_cache():
+    return ObservationCache(align=lambda d: period_floor(d, COARSEST), lag_days=LAG_DAYS)
+
+def fetch_modis_data(districts, start, end):
+    records = ColumnarRecords(['date','product','district'], all_bands)
+    ex = get_executor()
+    # Image timestamps per collection (also gives the totals for progress)
+    cols = {name: composite(col_id, start, end, bands, **cfg)
+            for name,(col_id,bands,cfg) in collections.items()}
+    times = dict(zip(collections, ex.get_info_all([
+        col.aggregate_array('system:time_start') for col in cols.values()
+    ])))
+    total_images = sum(len(t) for t in times.values())
+    with instrument.stage("geometry"):
+        geoms = district_geoms(tuple(districts))
     prog = st.progress(0)
     status = st.empty()
     img_counter = 0
 
-    for name,(col_id,bands) in collections.items():
-        status.write(f"🔄 Collection: {name}")
-        col = ee.ImageCollection(col_id).filterDate(start_date, end_date)
-        n_imgs = col.size().getInfo()
+    for name,(col_id,bands,cfg) in collections.items():
+        status.write(f"🔄 Collection: {name} ({cfg['cadence']} {cfg['reducer']})")
+        col = cols[name]
+        n_imgs = len(times[name])
         imgs = col.toList(n_imgs)
-        for i in range(n_imgs):
+
+        def reduce_district(task):
+            i, d = task
             img = ee.Image(imgs.get(i))
-            date = img.date().format('YYYY-MM-dd').getInfo()
-            status.write(f"  ▶ Image {i+1}/{n_imgs} (Date: {date})")
-
-            for d in districts:
-                geom = gaul.filter(ee.Filter.eq('ADM2_NAME', d)).geometry().buffer(5000)
-                stats = img.select(bands).reduceRegion(
-                    reducer=ee.Reducer.mean(), geometry=geom,
-                    scale=1000, bestEffort=True
-                ).getInfo()
-                rec = {'date': date, 'product': name, 'district': d}
-                for b in bands:
-                    rec[b] = stats.get(b)
-                records.append(rec)
-
-            img_counter += 1
-            prog.progress(img_counter / total_images)
+            geom = geoms[d]
+            return img.select(bands).reduceRegion(
+                reducer=ee.Reducer.mean(), geometry=geom,
+                scale=1000, bestEffort=True
+            ).getInfo()
+
+        # All image × district requests of a collection go through the shared executor
+        tasks = [(i, d) for i in range(n_imgs) for d in districts]
+        with instrument.stage("ee_fetch") as s:
+            for (i, d), stats in zip(tasks, ex.imap(reduce_district, tasks)):
+                date = ee_date_str(times[name][i])
+                if d == districts[0]:
+                    status.write(f"  ▶ Image {i+1}/{n_imgs} (Date: {date})")
+                records.append(date=date, product=name, district=d,
+                               **{b: stats.get(b) for b in bands})
+
+                if d == districts[-1]:
+                    img_counter += 1
+                    prog.progress(img_counter / total_images)
+            s.rows += len(tasks)
 
     if not records:
         return pd.DataFrame(columns=['date','product','district']+all_bands)
 
-    df = pd.DataFrame(records)
+    with instrument.stage("frame"):
+        df = records.to_frame()
+        df['date'] = pd.to_datetime(df['date'])
+        return df.sort_values(['product','date','district'])
+
+def fetch_modis_long(ds, start, end):
+    # Cached long-form rows: one (date, product, band, district) value each
+    wide = fetch_modis_data(ds, start, end)
+    long = wide.melt(id_vars=['date','product','district'], var_name='band', value_name='value')
+    own = {b: name for name, (_, bl, _) in collections.items() for b in bl}
+    return long[long['band'].map(own) == long['product']]
+
+@st.cache_data(ttl=ms_until_midnight/1000, show_spinner=True)
+def get_modis_data(districts):
+    return modis_wide(modis_cache().update(CACHE_NAME, districts, start_date, end_date, fetch_modis_long))
+
+def modis_wide(long):
+    if long.empty:
+        return pd.DataFrame(columns=['date','product','district']+all_bands)
+
+    df = (long.set_index(['date','product','district','band'])['value']
+              .unstack('band')
+              .reindex(columns=all_bands)
+              .reset_index())
+    df.columns.name = None
+    df = categorize(df, ['product','district'])
+    df[all_bands] = df[all_bands].astype('float32')
     df['date'] = pd.to_datetime(df['date'])
     return df.sort_values(['product','date','district'])
 
 # ------------------ Run & Display ------------------
-modis_df = get_modis_data(DISTRICTS)
-st.write("### MODIS per-district time series")
-st.dataframe(modis_df)
+def main():
+    global ee
+    # ------------------ Earth Engine Authentication ------------------
+    with instrument.stage("ee_init"):
+        ee = init_ee()
+    st.success("✅ Earth Engine initialized")
+
+    st.write("⏰ Configuring auto-refresh at next midnight...")
+    st.write(f"• Milliseconds until midnight: {ms_until_midnight}")
+    st_autorefresh(interval=ms_until_midnight, limit=1, key="autoRefresh")
+    st.write(f"**Data range:** {start_date} to {end_date}")
+
+    if ARGS.stream:
+        # Bounded memory: one month in flight, results go straight to exports/
+        st.write("### MODIS per-district time series")
+        export_cached(CACHE_NAME, DISTRICTS, start_date, end_date, fetch_modis_long, modis_wide, 'modis_by_district',
+                      cache=modis_cache())
+    else:
+        with instrument.stage("cache") as s:
+            modis_df = get_modis_data(DISTRICTS)
+            s.rows += len(modis_df)
+        st.write("### MODIS per-district time series")
+        with instrument.stage("render"):
+            st.dataframe(modis_df)
+            download_buttons(modis_df, 'modis_by_district')
 
-csv = modis_df.to_csv(index=False).encode('utf-8')
-st.download_button("Download CSV", data=csv, file_name="modis_by_district.csv")
\ No newline at end of file
+if __name__ == "__main__":
+    with instrument.run("modis_export"):
+        main()
\ No newline at end of file
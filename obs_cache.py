@@ -0,0 +1,210 @@
+# obs_cache.py
+#
+# Incremental on-disk cache of exporter observations.
+#
+# Rows are stored long-form, keyed by (dataset, band, district, date), as
+# Parquet partitioned by month:
+#
+#   obs_cache/<dataset>/month=YYYY-MM/part.parquet
+#   obs_cache/<dataset>/_coverage.json    {district: [first, last]}
+#
+# The coverage file records which date span has already been pulled from
+# Earth Engine for each district, so a refresh only asks EE for the dates
+# that are missing and merges them into the stored history.
+
+import os, json
+import pandas as pd
+
+CACHE_DIR = os.environ.get("SM_CACHE_DIR", "obs_cache")
+KEY_COLS  = ["band", "district", "date"]
+VALUE_COL = "value"
+
+
+def _to_date(d):
+    return pd.Timestamp(d).date()
+
+
+def _to_datetime(s):
+    # ColumnarRecords dates are an unordered categorical. When leading values
+    # repeat, pd.to_datetime caches them and returns a categorical, which has
+    # no max(). Convert the plain values instead.
+    return pd.Series(pd.to_datetime(s.to_numpy()), index=s.index)
+
+
+def _month_starts(start, end):
+    """Monthly periods touched by the half-open span [start, end)."""
+    m = pd.Timestamp(start).to_period("M")
+    last = (pd.Timestamp(end) - pd.Timedelta(days=1)).to_period("M")
+    while m <= last:
+        yield m
+        m += 1
+
+
+class ObservationCache:
+    """
+    `align(date)` (optional) maps a date to the start of the period it falls
+    in. Composited datasets stamp each row with its period start, so every
+    fetched span must begin on a period boundary; otherwise a refresh that
+    starts mid-period adds a second row for that period before the span.
+
+    Coverage is kept per district over all bands, so its end is set by the
+    freshest product. `lag_days` re-fetches that many days before it on every
+    refresh, for products published well after the date they carry (MODIS
+    8-/16-day composites next to daily products).
+    """
+
+    def __init__(self, root=CACHE_DIR, align=None, lag_days=0):
+        self.root = root
+        self.align = align
+        self.lag_days = lag_days
+
+    def _align(self, d):
+        return _to_date(self.align(pd.Timestamp(d))) if self.align else _to_date(d)
+
+    # ------------------ Paths ------------------
+    def _dataset_dir(self, dataset):
+        return os.path.join(self.root, dataset)
+
+    def _partition_path(self, dataset, month):
+        return os.path.join(self._dataset_dir(dataset), f"month={month}", "part.parquet")
+
+    def _coverage_path(self, dataset):
+        return os.path.join(self._dataset_dir(dataset), "_coverage.json")
+
+    # ------------------ Coverage ------------------
+    def coverage(self, dataset):
+        path = self._coverage_path(dataset)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return {d: (_to_date(lo), _to_date(hi)) for d, (lo, hi) in json.load(f).items()}
+
+    def _write_coverage(self, dataset, cov):
+        os.makedirs(self._dataset_dir(dataset), exist_ok=True)
+        tmp = self._coverage_path(dataset) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({d: [lo.isoformat(), hi.isoformat()] for d, (lo, hi) in sorted(cov.items())}, f, indent=1)
+        os.replace(tmp, self._coverage_path(dataset))
+
+    def missing_spans(self, dataset, districts, start, end):
+        """
+        Return {(span_start, span_end): [districts]} of half-open date spans
+        inside [start, end) that have not been fetched yet.
+        """
+        start, end = self._align(start), _to_date(end)
+        cov = self.coverage(dataset)
+        spans = {}
+        for d in districts:
+            if d not in cov:
+                todo = [(start, end)]
+            else:
+                lo, hi = cov[d]
+                todo = []
+                # Spans always run up to the covered range, so coverage stays contiguous
+                if start < lo:
+                    todo.append((start, lo))
+                if hi < end:
+                    since = max(lo, _to_date(pd.Timestamp(hi) - pd.Timedelta(days=self.lag_days)))
+                    todo.append((self._align(since), end))
+            for span in todo:
+                if span[0] < span[1]:
+                    spans.setdefault(span, []).append(d)
+        return spans
+
+    # ------------------ Read / write ------------------
+    def load(self, dataset, start, end, districts=None):
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        parts = []
+        for m in _month_starts(start, end):
+            path = self._partition_path(dataset, m)
+            if os.path.exists(path):
+                parts.append(pd.read_parquet(path))
+        if not parts:
+            return pd.DataFrame(columns=KEY_COLS + [VALUE_COL])
+        df = pd.concat(parts, ignore_index=True)
+        df = df[(df.date >= start) & (df.date < end)]
+        if districts is not None:
+            df = df[df.district.isin(list(districts))]
+        return df.reset_index(drop=True)
+
+    def merge(self, dataset, df, districts, start, end):
+        """
+        Replace the rows of `districts` inside [start, end) with `df` and
+        extend their coverage. Rows are replaced span-wise rather than
+        de-duplicated on the key, so sub-daily products that share a date
+        label (e.g. 3-hourly GLDAS) keep all of their rows.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        df = df.copy()
+        df["date"] = _to_datetime(df["date"])
+        districts = list(districts)
+
+        for m in _month_starts(start, end):
+            path = self._partition_path(dataset, m)
+            new = df[df.date.dt.to_period("M") == m]
+            if os.path.exists(path):
+                old = pd.read_parquet(path)
+                stale = old.district.isin(districts) & (old.date >= start) & (old.date < end)
+                new = pd.concat([old[~stale], new], ignore_index=True)
+            if new.empty:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            new.sort_values(KEY_COLS, kind="stable").to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+
+        # The last observed day may still be incomplete upstream (late CHIRPS
+        # days, partial 3-hourly GLDAS days), so coverage stops at it and the
+        # next refresh fetches it again.
+        cov = self.coverage(dataset)
+        for d in districts:
+            seen = df.date[df.district == d]
+            hi = _to_date(seen.max()) if not seen.empty else _to_date(start)
+            lo = _to_date(start)
+            if d in cov:
+                lo, hi = min(lo, cov[d][0]), max(hi, cov[d][1])
+            cov[d] = (lo, hi)
+        self._write_coverage(dataset, cov)
+
+    def update(self, dataset, districts, start, end, fetch):
+        """
+        Bring the cache up to date for [start, end) and return the cached rows.
+
+        `fetch(districts, start, end)` is called once per missing span and must
+        return a long DataFrame with at least the KEY_COLS and VALUE_COL columns
+        (extra columns such as lon/lat are stored as-is).
+        """
+        for (lo, hi), ds in sorted(self.missing_spans(dataset, districts, start, end).items()):
+            fetched = fetch(ds, lo.isoformat(), hi.isoformat())
+            self.merge(dataset, fetched, ds, lo, hi)
+        return self.load(dataset, start, end, districts)
+
+    # ------------------ Bounded-memory variants ------------------
+    def fill(self, dataset, districts, start, end, fetch, on_chunk=None):
+        """
+        Like update(), but every missing span is fetched and merged one month
+        at a time and nothing is returned, so memory is bounded by a month of
+        rows however long [start, end) is. Spans in front of the covered range
+        are walked backwards, others forwards, so coverage stays contiguous
+        after every month. `on_chunk(df)` sees each fetched month.
+        """
+        cov = self.coverage(dataset)
+        for (lo, hi), ds in sorted(self.missing_spans(dataset, districts, start, end).items()):
+            bounds = [pd.Timestamp(lo)] + [m.start_time for m in _month_starts(lo, hi)][1:] + [pd.Timestamp(hi)]
+            bounds = sorted({pd.Timestamp(self._align(b)) for b in bounds[:-1]} | {bounds[-1]})
+            pieces = list(zip(bounds[:-1], bounds[1:]))
+            if any(d in cov and cov[d][0] == hi for d in ds):
+                pieces.reverse()
+            for p0, p1 in pieces:
+                fetched = fetch(ds, p0.date().isoformat(), p1.date().isoformat())
+                self.merge(dataset, fetched, ds, p0, p1)
+                if on_chunk is not None and len(fetched):
+                    on_chunk(fetched)
+                del fetched
+
+    def iter_load(self, dataset, start, end, districts=None):
+        """Cached rows of [start, end), one month per DataFrame (empty months skipped)."""
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        for m in _month_starts(start, end):
+            df = self.load(dataset, max(start, m.start_time), min(end, (m + 1).start_time), districts)
+            if len(df):
+                yield df
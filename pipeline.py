@@ -0,0 +1,218 @@
+# pipeline.py
+#
+# Headless runner for the whole chain, for unattended (e.g. nightly) runs:
+#
+#   srtm ─┬─ modis  ─┐
+#         ├─ gldas  ─┼─ rf_downscaling ── lstm_forecasting
+#         └─ chirps ─┘
+#
+# Every stage is one of the Streamlit scripts run as a plain `python` process
+# (Streamlit calls are no-ops outside `streamlit run`). Stages hand over
+# artifacts through files: the observation cache, srtm_samples.csv /
+# static_grid/, sm_series.csv. Independent stages run in parallel. A stage is
+# skipped when its fingerprint (script source and the repo modules it imports,
+# run parameters and the content of its upstream artifacts) matches the last
+# successful run recorded in pipeline_state.json and its outputs still exist.
+#
+#   python pipeline.py --start 2024-05-01 --end 2025-05-01 --jobs 3
+#   python pipeline.py --only rf_downscaling lstm_forecasting --force
+
+import os, sys, ast, json, time, hashlib, argparse, datetime, subprocess
+
+from run_config import make_parser, parse_args, to_argv
+
+STATE_FILE = "pipeline_state.json"
+LOG_DIR    = "pipeline_logs"
+
+
+class Stage:
+    def __init__(self, script, deps=(), inputs=(), outputs=(), window=True, extra=()):
+        self.script = script
+        self.deps = list(deps)        # stages that must finish first
+        self.inputs = list(inputs)    # files read besides the upstream outputs
+        self.outputs = list(outputs)  # files/dirs this stage produces
+        self.window = window          # pass --start/--end (else only --district)
+        self.extra = list(extra)
+
+
+# srtm runs first on its own: it also builds district_geoms.geojson, which the
+# exporters would otherwise race to create
+STAGES = {
+    "srtm":             Stage("srtm_export.py",
+                              outputs=["srtm_samples.csv", "static_grid"]),
+    "modis":            Stage("modis_export.py", deps=["srtm"],
+                              outputs=["obs_cache/modis_composite"]),
+    "gldas":            Stage("gldas_export.py", deps=["srtm"],
+                              outputs=["obs_cache/gldas_daily"]),
+    "chirps":           Stage("chirps_export.py", deps=["srtm"],
+                              outputs=["obs_cache/chirps"]),
+    "rf_downscaling":   Stage("rf_downscaling.py", deps=["srtm", "modis", "gldas", "chirps"],
+                              inputs=["gldas_predictors.csv"],
+                              outputs=["sm_series.csv"]),
+    "lstm_forecasting": Stage("lstm_forecasting.py", deps=["rf_downscaling", "gldas", "chirps"],
+                              outputs=["sm_forecast.csv", "training_manifest.json"], window=False,
+                              extra=["--train"]),
+}
+
+
+# ------------------ Fingerprints ------------------
+def _hash_path(h, path):
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                p = os.path.join(root, name)
+                h.update(os.path.relpath(p, path).encode())
+                _hash_path(h, p)
+    elif os.path.exists(path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    else:
+        h.update(b"<missing>")
+
+
+def local_modules(script):
+    """Repo modules (.py next to `script`) it imports, directly or through each other."""
+    base = os.path.dirname(script)
+    seen, todo = set(), [script]
+    while todo:
+        try:
+            with open(todo.pop(), "rb") as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for n in names:
+                path = os.path.join(base, n.split(".")[0] + ".py")
+                if path != script and path not in seen and os.path.exists(path):
+                    seen.add(path)
+                    todo.append(path)
+    return sorted(seen)
+
+
+def fingerprint(name, argv, stages=STAGES):
+    s = stages[name]
+    h = hashlib.sha256()
+    h.update(json.dumps(argv).encode())
+    for path in [s.script] + local_modules(s.script) + s.inputs + [o for d in s.deps for o in stages[d].outputs]:
+        h.update(path.encode())
+        _hash_path(h, path)
+    return h.hexdigest()
+
+
+def read_state(path=STATE_FILE):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+
+def write_state(state, path=STATE_FILE):
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def stage_argv(stage, args, engine=None):
+    argv = to_argv(args) if stage.window else [a for d in args.districts for a in ("--district", d)]
+    if stage.script == "rf_downscaling.py" and engine:
+        argv += ["--engine", engine]
+    return argv + stage.extra
+
+
+# ------------------ Scheduler ------------------
+def run(selected, args, jobs=3, force=False, engine=None, dry_run=False, stages=STAGES, log=print):
+    """
+    Run `selected` stages in dependency order, up to `jobs` at a time.
+    Stages outside `selected` are treated as done. Returns {stage: status}.
+    """
+    state = read_state()
+    status = {n: "done" for n in stages if n not in selected}
+    running = {}
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    while len(status) < len(stages) or running:
+        # Start every stage whose dependencies have all finished
+        for name in stages:
+            if name in status or name in running:
+                continue
+            deps = [status.get(d) for d in stages[name].deps]
+            if any(d in ("failed", "blocked") for d in deps):
+                status[name] = "blocked"; log(f"[{name}] blocked by a failed dependency")
+                continue
+            if not all(d in ("done", "skipped", "ran") for d in deps) or len(running) >= jobs:
+                continue
+            s = stages[name]
+            argv = stage_argv(s, args, engine)
+            fp = fingerprint(name, argv, stages)
+            prev = state.get(name, {})
+            if not force and prev.get("fingerprint") == fp and all(os.path.exists(o) for o in s.outputs):
+                status[name] = "skipped"; log(f"[{name}] up to date")
+                continue
+            if dry_run:
+                status[name] = "ran"; log(f"[{name}] would run: {s.script} {' '.join(argv)}")
+                continue
+            logf = open(os.path.join(LOG_DIR, f"{name}.log"), "w")
+            proc = subprocess.Popen([sys.executable, s.script] + argv, stdout=logf, stderr=subprocess.STDOUT,
+                                    env=dict(os.environ, PYTHONUNBUFFERED="1"))
+            running[name] = (proc, logf, time.time())
+            log(f"[{name}] started (pid {proc.pid})")
+
+        if not running:
+            if len(status) < len(stages):
+                continue
+            break
+        time.sleep(0.5)
+        for name, (proc, logf, t0) in list(running.items()):
+            if proc.poll() is None:
+                continue
+            logf.close()
+            del running[name]
+            s = stages[name]
+            missing = [o for o in s.outputs if not os.path.exists(o)]
+            secs = round(time.time() - t0, 1)
+            if proc.returncode or missing:
+                status[name] = "failed"
+                log(f"[{name}] failed after {secs}s (exit {proc.returncode}"
+                    f"{', missing ' + ', '.join(missing) if missing else ''}); see {LOG_DIR}/{name}.log")
+                continue
+            status[name] = "ran"
+            # Fingerprint again now that upstream outputs are final
+            state[name] = {"fingerprint": fingerprint(name, stage_argv(s, args, engine), stages),
+                           "finished": datetime.datetime.now().isoformat(timespec="seconds"),
+                           "seconds": secs}
+            write_state(state)
+            log(f"[{name}] finished in {secs}s")
+    return status
+
+
+def _jobs(value):
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
+
+
+def main(argv=None):
+    parser = make_parser("Run the export → downscaling → forecasting pipeline headless.")
+    parser.add_argument("--only", nargs="+", choices=list(STAGES), help="run just these stages")
+    parser.add_argument("--jobs", type=_jobs, default=3, help="stages run in parallel (default 3)")
+    parser.add_argument("--force", action="store_true", help="ignore up-to-date checks")
+    parser.add_argument("--engine", choices=["ee", "batch", "local"], help="downscaling engine for rf_downscaling")
+    parser.add_argument("--dry-run", action="store_true", help="print what would run")
+    args = parse_args(parser, argv)
+    status = run(args.only or list(STAGES), args, jobs=args.jobs, force=args.force,
+                 engine=args.engine, dry_run=args.dry_run)
+    print(json.dumps(status, indent=1))
+    return 1 if any(v in ("failed", "blocked") for v in status.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# regrid.py
+#
+# Vectorized spatial join between the point sets the exporters produce.
+#
+# CHIRPS (5 km), SMAP (9 km), the 500 m SRTM/NDVI grid and GLDAS (0.25°)
+# each come as pixel-centre lon/lat points. A source is indexed once:
+# points on a regular lattice get a GridIndex (coordinate -> cell by
+# arithmetic), anything else a KD-tree. Every target pixel is then mapped to
+# its nearest source point, or to its four surrounding points with bilinear
+# weights, in one pass, and all of a source's columns (bands or dates) are
+# gathered with the same indices. District-level series such as the MODIS
+# means are joined through each pixel's district. align() assembles the
+# result into one aligned feature matrix (rf_local uses it for the GLDAS
+# fields and district_series() for the MODIS NDVI means).
+
+import numpy as np
+import pandas as pd
+
+LATTICE_TOL = 1e-3   # allowed offset from the lattice, in cells
+CHUNK       = 65536  # target pixels gathered per block
+
+
+def _spacing(v):
+    d = np.diff(np.unique(np.round(v, 9)))
+    d = d[d > 1e-9]
+    return float(np.median(d)) if len(d) else None
+
+
+# ------------------ Indexes ------------------
+class GridIndex:
+    """
+    Source points on a regular lat/lon lattice; lookups are O(1) per target.
+    The lattice need not be full: nearest() falls back to a KD-tree for
+    targets whose cell has no point (sparse samples, outside the lattice).
+    """
+
+    def __init__(self, lon, lat, res):
+        self.res = res
+        self.lon, self.lat = lon, lat
+        self._tree = None
+        self.lon0, self.lat0 = lon.min(), lat.max()
+        col = np.rint((lon - self.lon0) / res).astype(np.int64)
+        row = np.rint((self.lat0 - lat) / res).astype(np.int64)
+        self.shape = (int(row.max()) + 1, int(col.max()) + 1)
+        self.cell = np.full(self.shape, -1, np.int64)  # cell -> source point
+        self.cell[row, col] = np.arange(len(lon))
+
+    @classmethod
+    def fit(cls, lon, lat, tol=LATTICE_TOL):
+        """GridIndex if the points sit on one lattice, else None."""
+        res = _spacing(lon) or _spacing(lat)
+        if not res:
+            return None
+        for v, v0 in ((lon, lon.min()), (lat, lat.max())):
+            f = np.abs(v - v0) / res
+            if np.abs(f - np.rint(f)).max() > tol:
+                return None
+        return cls(lon, lat, res)
+
+    def _lookup(self, r, c):
+        ok = (r >= 0) & (r < self.shape[0]) & (c >= 0) & (c < self.shape[1])
+        out = np.full(r.shape, -1, np.int64)
+        out[ok] = self.cell[r[ok], c[ok]]
+        return out
+
+    def nearest(self, lon, lat, max_dist=None):
+        fx = (lon - self.lon0) / self.res
+        fy = (self.lat0 - lat) / self.res
+        idx = self._lookup(np.rint(fy).astype(np.int64), np.rint(fx).astype(np.int64))
+        if max_dist is not None:
+            dx = (fx - np.rint(fx)) * self.res
+            dy = (fy - np.rint(fy)) * self.res
+            idx[np.hypot(dx, dy) > max_dist] = -1
+        # An occupied cell holds the nearest point; empty cells need a search
+        miss = idx < 0
+        if miss.any():
+            if self._tree is None:
+                self._tree = TreeIndex(self.lon, self.lat)
+            idx[miss] = self._tree.nearest(lon[miss], lat[miss], max_dist)
+        return idx
+
+    def bilinear(self, lon, lat):
+        """(idx, w), both (n, 4): the surrounding points and their weights."""
+        fx = (lon - self.lon0) / self.res
+        fy = (self.lat0 - lat) / self.res
+        c0, r0 = np.floor(fx).astype(np.int64), np.floor(fy).astype(np.int64)
+        tx, ty = fx - c0, fy - r0
+        idx = np.stack([self._lookup(r0, c0), self._lookup(r0, c0 + 1),
+                        self._lookup(r0 + 1, c0), self._lookup(r0 + 1, c0 + 1)], axis=1)
+        w = np.stack([(1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty], axis=1)
+        return idx, w
+
+
+class TreeIndex:
+    """Scattered source points; nearest neighbours from a KD-tree."""
+
+    def __init__(self, lon, lat):
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(np.column_stack([lon, lat]))
+
+    def nearest(self, lon, lat, max_dist=None):
+        d, idx = self.tree.query(np.column_stack([lon, lat]), k=1,
+                                 distance_upper_bound=np.inf if max_dist is None else max_dist)
+        idx = idx.astype(np.int64)
+        idx[~np.isfinite(d)] = -1
+        return idx
+
+    def bilinear(self, lon, lat):
+        # Off-lattice there are no cells; inverse-distance weights over the 4
+        # nearest points (fewer when the source has fewer)
+        n = self.tree.n
+        d, idx = self.tree.query(np.column_stack([lon, lat]), k=min(4, n))
+        d, idx = d.reshape(len(d), -1), idx.reshape(len(idx), -1).astype(np.int64)
+        idx[idx >= n] = -1
+        w = 1 / np.maximum(d, 1e-12)
+        return idx, w / w.sum(axis=1, keepdims=True)
+
+
+def build_index(lon, lat):
+    lon = np.asarray(lon, np.float64)
+    lat = np.asarray(lat, np.float64)
+    return GridIndex.fit(lon, lat) or TreeIndex(lon, lat)
+
+
+def gather(values, idx, w=None):
+    """
+    Pull rows of `values` (points × columns) for every target. With weights,
+    missing neighbours (index -1 or NaN values) are dropped and the remaining
+    weights renormalized. Returns (targets × columns) float32.
+    """
+    values = np.asarray(values, np.float32)
+    out = np.full((len(idx), values.shape[1]), np.nan, np.float32)
+    for i in range(0, len(idx), CHUNK):
+        ix = idx[i:i + CHUNK]
+        if w is None:
+            ok = ix >= 0
+            out[i:i + CHUNK][ok] = values[ix[ok]]
+            continue
+        v = values[np.where(ix >= 0, ix, 0)]                      # (n, 4, cols)
+        wk = np.where(ix >= 0, w[i:i + CHUNK], 0)[..., None] * ~np.isnan(v)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[i:i + CHUNK] = np.nansum(v * wk, axis=1) / wk.sum(axis=1)
+    return out
+
+
+# ------------------ Sources ------------------
+class PointSource:
+    """
+    Values on a set of source points: `values` is (points × columns), where
+    columns are bands for a static source or dates for a time series.
+    """
+
+    def __init__(self, name, lon, lat, values, columns):
+        self.name = name
+        self.lon = np.asarray(lon, np.float64)
+        self.lat = np.asarray(lat, np.float64)
+        self.values = np.asarray(values, np.float32)
+        self.columns = pd.Index(columns)
+        self.index = build_index(self.lon, self.lat)
+
+    @classmethod
+    def from_frame(cls, name, df, cols=None):
+        """Static source from a (lon, lat, band...) frame, e.g. gldas_predictors.csv."""
+        cols = cols or [c for c in df.columns if c not in ("lon", "lat", "district")]
+        return cls(name, df.lon.values, df.lat.values, df[cols].to_numpy(np.float32), cols)
+
+    @classmethod
+    def from_long(cls, name, df, value="value", dates=None):
+        """
+        Time-series source from long rows (date, lon, lat, value), e.g. the
+        CHIRPS or SMAP pixel samples: pivoted to (points × dates) once.
+        """
+        df = df.dropna(subset=[value])
+        pts, p = np.unique(df[["lon", "lat"]].to_numpy(np.float64), axis=0, return_inverse=True)
+        days = pd.DatetimeIndex(pd.to_datetime(df["date"]))
+        cols = pd.DatetimeIndex(dates) if dates is not None else days.unique().sort_values()
+        d = cols.get_indexer(days)
+        ok = d >= 0
+        grid = np.full((len(pts), len(cols)), np.nan, np.float32)
+        grid[p.ravel()[ok], d[ok]] = df[value].to_numpy(np.float32)[ok]
+        return cls(name, pts[:, 0], pts[:, 1], grid, cols)
+
+    def sample(self, lon, lat, method="nearest", max_dist=None):
+        """(targets × columns) values at lon/lat."""
+        lon = np.asarray(lon, np.float64)
+        lat = np.asarray(lat, np.float64)
+        if method == "bilinear":
+            return gather(self.values, *self.index.bilinear(lon, lat))
+        if method != "nearest":
+            raise ValueError(f"Unknown method: {method}")
+        return gather(self.values, self.index.nearest(lon, lat, max_dist))
+
+
+def district_series(df, value="value", dates=None):
+    """(districts × dates) matrix from long (district, date, value) rows, e.g. MODIS means."""
+    t = (df.assign(district=df.district.astype(str), date=pd.to_datetime(df["date"]))
+           .pivot_table(index="district", columns="date", values=value, aggfunc="mean"))
+    if dates is not None:
+        t = t.reindex(columns=pd.DatetimeIndex(dates))
+    return t
+
+
+# ------------------ Aligned feature matrix ------------------
+def align(pixels, static=(), temporal=(), district=(), dates=None, method="nearest"):
+    """
+    Align every source onto the target `pixels` (lon, lat[, district]).
+
+    `static` are PointSource objects with band columns, `temporal` PointSource
+    objects with date columns, `district` (name, district_series frame) pairs.
+    `method` is "nearest", "bilinear" or a {source name: method} dict.
+    Returns a dict: "pixels", "static" (pixels × bands frame), "dates" and
+    "temporal" {name: (dates × pixels) float32}.
+    """
+    how = (lambda s: method.get(s, "nearest")) if isinstance(method, dict) else (lambda s: method)
+    lon, lat = pixels.lon.to_numpy(np.float64), pixels.lat.to_numpy(np.float64)
+
+    feats = pd.DataFrame(index=pixels.index)
+    for src in static:
+        vals = src.sample(lon, lat, how(src.name))
+        for j, c in enumerate(src.columns):
+            feats[c] = vals[:, j]
+
+    if dates is None:
+        cols = [s.columns for s in temporal] + [t.columns for _, t in district]
+        dates = pd.DatetimeIndex(cols[0]) if cols else pd.DatetimeIndex([])
+        for c in cols[1:]:
+            dates = dates.union(c)
+    dates = pd.DatetimeIndex(dates)
+
+    series = {}
+    for src in temporal:
+        j = pd.DatetimeIndex(src.columns).get_indexer(dates)
+        vals = np.full((len(dates), len(pixels)), np.nan, np.float32)
+        vals[j >= 0] = src.sample(lon, lat, how(src.name))[:, j[j >= 0]].T
+        series[src.name] = vals
+    for name, table in district:
+        t = table.reindex(columns=dates)
+        rows = t.index.get_indexer(pixels.district.astype(str))
+        vals = np.full((len(dates), len(pixels)), np.nan, np.float32)
+        vals[:, rows >= 0] = t.to_numpy(np.float32)[rows[rows >= 0]].T
+        series[name] = vals
+    return {"pixels": pixels, "static": feats, "dates": dates, "temporal": series}
+
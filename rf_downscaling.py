@@ -1,22 +1,20 @@
-import ee
 import streamlit as st
 import pandas as pd
-import datetime
-from dateutil.relativedelta import relativedelta
-import tempfile, os, json
-
-# 1️⃣ EE init
-def init_ee():
-    raw = st.secrets["ee_credentials"]["json"]
-    key_data = json.dumps(raw) if isinstance(raw, dict) else raw
-    creds = json.loads(key_data)
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as tf:
-        tf.write(key_data)
-        key_path = tf.name
-    try:
-        ee.Initialize(ee.ServiceAccountCredentials(creds["client_email"], key_path))
-    finally:
-        os.remove(key_path)
+import numpy as np
+import os
+from ee_executor import get_executor, ee_date_str
+from ee_session import init_ee, district_geoms as session_geoms
+from columnar import ColumnarRecords, download_buttons
+from obs_cache import ObservationCache
+from batch_export import BatchExport, MAX_ATTEMPTS, month_shards
+from static_grid import static_stack
+import rf_local
+from run_config import make_parser, parse_args
+import instrument
+
+# 1️⃣ EE init: ee_session.init_ee() (once per process), called from main() below.
+# Code that imports this module instead of running the page sets `ee` itself.
+ee = None
 
 # 2️⃣ Parameters
 SMAP_COLL    = "NASA/SMAP/SPL4SMGP/007"
@@ -25,85 +23,289 @@ SMAP_SCALE   = 1000
 RF_TREES     = 50
 RF_MIN_SAMP  = 3
 RF_MAX_NODES = 5
-WINDOW_MO    = 12
 BUFFER_M     = 5000
+SMAP_NATIVE_M = 9000  # SMAP L4 grid spacing, used when caching pixel samples
+SERIES_CSV   = "sm_series.csv"  # daily district series read by lstm_forecasting
+
+# --start/--end/--district (see run_config), plus the engine for headless runs
+_parser = make_parser("RF downscaling of SMAP to 500 m")
+_parser.add_argument("--engine", choices=["ee", "batch", "local"], default="ee")
+_parser.add_argument("--regional", action="store_true")
+ARGS = parse_args(_parser)
 
 # 3️⃣ Build static predictor stack: Elev, Slope, 12-mo mean NDVI
 def get_static_stack():
-    elev  = ee.Image("USGS/SRTMGL1_003").select("elevation").rename("elev")
-    slope = ee.Terrain.slope(elev).rename("slope")
-    ndvi  = (ee.ImageCollection("MODIS/061/MOD13Q1")
-               .filterDate(*date_window())
-               .select("NDVI")
-               .map(lambda i: i.multiply(0.0001))
-               .mean()
-               .rename("ndvi"))
-    return elev.addBands(slope).addBands(ndvi)
+    return static_stack(*date_window())
 
 # Date window helper
 def date_window():
-    end   = datetime.date.today().strftime("%Y-%m-%d")
-    start = (datetime.date.today() - relativedelta(months=WINDOW_MO)).strftime("%Y-%m-%d")
-    return start, end
+    return ARGS.start, ARGS.end
 
-# 4️⃣ Load GAUL districts
+# 4️⃣ Load GAUL districts (buffered & simplified, from the local geometry store)
 def get_districts(names):
-    gaul = (ee.FeatureCollection("FAO/GAUL/2015/level2")
-             .filter(ee.Filter.eq("ADM0_NAME","India"))
-             .filter(ee.Filter.eq("ADM1_NAME","Maharashtra")))
-    return {d: gaul.filter(ee.Filter.eq("ADM2_NAME", d)).geometry().buffer(BUFFER_M)
-            for d in names}
-
-# 5️⃣ Downscaling loop
-def downscale(district_geoms):
+    return session_geoms(tuple(names), buffer_m=BUFFER_M)
+
+# 5️⃣ Downscaling
+def downscale(district_geoms, batched=True, regional=False):
+    if batched:
+        return downscale_batched(district_geoms, regional)
+    return downscale_loop(district_geoms)
+
+# 5a. Batched: every per-date RF is trained and applied server-side, mapped over
+#     the SMAP collection, and the whole series comes back as one paginated table
+def smap_table(district_geoms, start, end, regional=False):
+    """FeatureCollection of (district, date, sm500m), one row per SMAP image and district."""
+    static  = get_static_stack()
+    smap_ic = (ee.ImageCollection(SMAP_COLL)
+                 .filterDate(start, end)
+                 .select(SMAP_BAND))
+    names   = list(district_geoms)
+    fc      = ee.FeatureCollection([
+        ee.Feature(geom, {"district": name, "district_id": i})
+        for i, (name, geom) in enumerate(district_geoms.items())
+    ])
+    # Regional mode: district index raster used as an extra covariate
+    dist_img   = fc.reduceToImage(["district_id"], ee.Reducer.first()).rename("district_id")
+    predictors = static.addBands(dist_img) if regional else static
+
+    def per_image(img):
+        date  = img.date().format("YYYY-MM-dd")
+        label = img.select(SMAP_BAND).multiply(1000).round().rename("sm_int")
+        stack = predictors.addBands(label)
+
+        if regional:
+            # one RF over the whole region, all districts reduced with reduceRegions
+            samp = stack.sample(region=fc.geometry(), scale=SMAP_SCALE,
+                                numPixels=2000 * len(names), seed=42)
+            rf   = (ee.Classifier.smileRandomForest(RF_TREES, RF_MIN_SAMP, RF_MAX_NODES)
+                      .train(features=samp, classProperty="sm_int",
+                             inputProperties=predictors.bandNames()))
+            pred = predictors.classify(rf).divide(1000).rename("sm500m")
+            stats = pred.reduceRegions(collection=fc, reducer=ee.Reducer.mean().setOutputs(["sm500m"]),
+                                       scale=500)
+        else:
+            # one RF per district, as in the loop below, but evaluated server-side
+            def per_district(f):
+                geom = f.geometry()
+                samp = stack.sample(region=geom, scale=SMAP_SCALE, numPixels=2000, seed=42)
+                rf   = (ee.Classifier.smileRandomForest(RF_TREES, RF_MIN_SAMP, RF_MAX_NODES)
+                          .train(features=samp, classProperty="sm_int",
+                                 inputProperties=static.bandNames()))
+                pred = static.classify(rf).divide(1000).rename("sm500m")
+                mean = pred.reduceRegion(ee.Reducer.mean(), geometry=geom,
+                                         scale=500, bestEffort=True).get("sm500m")
+                return f.set("sm500m", mean)
+            stats = fc.map(per_district)
+
+        return stats.map(lambda f: f.setGeometry(None).set("date", date))
+
+    return smap_ic.map(per_image).flatten()
+
+def downscale_batched(district_geoms, regional=False):
+    table = smap_table(district_geoms, *date_window(), regional)
+    st.write("Downscaling all dates × districts server-side…")
+    with instrument.stage("ee_fetch") as s:
+        feats = get_executor().fetch_features(table)
+        s.rows += len(feats)
+
+    with instrument.stage("frame"):
+        records = ColumnarRecords(["district", "date"], ["sm500m"])
+        for f in feats:
+            p = f["properties"]
+            records.append(district=p["district"], date=p["date"], sm500m=p.get("sm500m"))
+        return records.to_frame()
+
+# 5b. Per (timestamp, district) loop
+def downscale_loop(district_geoms):
     static = get_static_stack()
     smap_ic = (ee.ImageCollection(SMAP_COLL)
                  .filterDate(*date_window())
                  .select(SMAP_BAND))
-    times   = smap_ic.aggregate_array("system:time_start").getInfo()
-    records = []
+    ex      = get_executor()
+    times   = ex.get_info(smap_ic.aggregate_array("system:time_start"))
+    records = ColumnarRecords(["district", "date"], ["sm500m"])
 
-    prog = st.progress(0)
-    for idx, ts in enumerate(times):
-        date_str = ee.Date(ts).format("YYYY-MM-dd").getInfo()
+    def downscale_district(task):
+        ts, name = task
+        geom      = district_geoms[name]
         img       = ee.Image(smap_ic.filter(ee.Filter.eq("system:time_start", ts)).first())
         label     = img.select(SMAP_BAND).multiply(1000).round().rename("sm_int")
         stack     = static.addBands(label)
 
-        for name, geom in district_geoms.items():
-            # sample training pixels inside district
-            samp = stack.sample(region=geom, scale=SMAP_SCALE, numPixels=2000, seed=42)
-            rf   = (ee.Classifier.smileRandomForest(RF_TREES, RF_MIN_SAMP, RF_MAX_NODES)
-                      .train(features=samp, classProperty="sm_int",
-                             inputProperties=static.bandNames()))
-            pred = static.classify(rf).divide(1000).rename("sm500m")
+        # sample training pixels inside district
+        samp = stack.sample(region=geom, scale=SMAP_SCALE, numPixels=2000, seed=42)
+        rf   = (ee.Classifier.smileRandomForest(RF_TREES, RF_MIN_SAMP, RF_MAX_NODES)
+                  .train(features=samp, classProperty="sm_int",
+                         inputProperties=static.bandNames()))
+        pred = static.classify(rf).divide(1000).rename("sm500m")
+
+        # district-mean downscaled SM
+        return pred.reduceRegion(
+                   ee.Reducer.mean(), geometry=geom,
+                   scale=500, bestEffort=True
+               ).get("sm500m").getInfo()
+
+    # (timestamp, district) jobs run concurrently through the shared executor
+    names = list(district_geoms)
+    tasks = [(ts, name) for ts in times for name in names]
+    prog = st.progress(0)
+    with instrument.stage("ee_fetch") as s:
+        for i, ((ts, name), mean_sm) in enumerate(zip(tasks, ex.imap(downscale_district, tasks))):
+            records.append(
+                district=name,
+                date=ee_date_str(ts),
+                sm500m=mean_sm
+            )
+            if name == names[-1]:
+                prog.progress((i // len(names) + 1)/len(times))
+        s.rows += len(tasks)
+
+    return records.to_frame()
+
+# 5c. Local engine: cache SMAP daily-mean pixel samples, then train/predict offline
+def fetch_smap_samples(districts, start, end):
+    """
+    One stacked image of daily means per month, sampled at the native SMAP
+    grid for each district. Long-form rows for the observation cache.
+    """
+    smap_ic = ee.ImageCollection(SMAP_COLL).select(SMAP_BAND)
+    # Only days that have SMAP scenes: an empty day (latency at the end of the
+    # window, gaps) would be a band-less image and break the rename below
+    times   = get_executor().get_info(smap_ic.filterDate(start, end).aggregate_array("system:time_start"))
+    days    = pd.DatetimeIndex(sorted({ee_date_str(t) for t in times}))
+    months  = [list(g) for _, g in pd.Series(days).groupby(days.to_period("M"))]
+    geoms   = get_districts(districts)
+    rec     = ColumnarRecords(["district", "date", "band"],
+                              {"lon": np.float64, "lat": np.float64, "value": np.float32})
+
+    def sample_month(task):
+        month, d = task
+        stack = ee.ImageCollection([
+            smap_ic.filterDate(day.strftime("%Y-%m-%d"), (day + pd.Timedelta(days=1)).strftime("%Y-%m-%d")).mean()
+            for day in month
+        ]).toBands().rename([f"d{i}" for i in range(len(month))])
+        return stack.sample(region=geoms[d], scale=SMAP_NATIVE_M,
+                            geometries=True, dropNulls=False).getInfo()["features"]
 
-            # district-mean downscaled SM
-            mean_sm = pred.reduceRegion(
-                         ee.Reducer.mean(), geometry=geom,
-                         scale=500, bestEffort=True
-                      ).get("sm500m").getInfo()
+    tasks = [(month, d) for month in months for d in districts]
+    with instrument.stage("ee_fetch") as s:
+        for (month, d), pts in zip(tasks, get_executor().imap(sample_month, tasks)):
+            if not pts:
+                continue
+            names = [f"d{i}" for i in range(len(month))]
+            xy    = np.array([f["geometry"]["coordinates"] for f in pts], dtype=np.float64)
+            vals  = np.array([[f["properties"].get(b) for b in names] for f in pts], dtype=np.float32)
+            rec.extend(district=d,
+                       date=np.tile(np.array([day.strftime("%Y-%m-%d") for day in month]), len(pts)),
+                       lon=np.repeat(xy[:, 0], len(month)),
+                       lat=np.repeat(xy[:, 1], len(month)),
+                       band=SMAP_BAND,
+                       value=vals.ravel())
+            s.rows += vals.size
+    return rec.to_frame(["district", "date", "lon", "lat", "band", "value"])
 
-            records.append({
-                "district": name,
-                "date":     date_str,
-                "sm500m":   mean_sm
-            })
+# 5e. Batch engine: the same table as 5a, exported month by month with
+#     Export.table tasks instead of getInfo(), for windows past the interactive limits
+def downscale_batch(district_geoms, regional=False):
+    start, end = date_window()
+    job = BatchExport("sm500m", ["district", "date", "sm500m"],
+                      params={"districts": list(district_geoms), "regional": regional,
+                              "buffer_m": BUFFER_M, "smap": SMAP_COLL})
+    status = st.empty()
 
-        prog.progress((idx+1)/len(times))
+    def show(counts):
+        status.write("Export tasks: " + ", ".join(f"{n} {s.lower()}" for s, n in sorted(counts.items())))
 
-    return pd.DataFrame.from_records(records)
+    st.write(f"Exporting {start} to {end} as monthly batch tasks (state in {job.state_path})…")
+    with instrument.stage("ee_batch") as s:
+        df = job.run(ee, start, end, lambda a, b: smap_table(district_geoms, a, b, regional),
+                     on_progress=show)
+        s.rows += len(df)
+    failed = job.failed(month_shards(start, end))
+    if failed:
+        st.warning(f"{len(failed)} month(s) failed after {MAX_ATTEMPTS} attempts: "
+                   + ", ".join(f"{sh['start']} ({sh.get('error')})" for sh in failed))
+
+    with instrument.stage("frame"):
+        records = ColumnarRecords(["district", "date"], ["sm500m"])
+        if len(df):
+            records.extend(district=df["district"].astype(str).to_numpy(),
+                           date=df["date"].astype(str).to_numpy(),
+                           sm500m=pd.to_numeric(df["sm500m"], errors="coerce").to_numpy())
+        return records.to_frame()
+
+def downscale_local(names):
+    start, end = date_window()
+    cache = ObservationCache()
+    with instrument.stage("cache"):
+        cache.update("smap", names, start, end, fetch_smap_samples)
+    with instrument.stage("frame"):
+        grid = rf_local.load_static_grid(ndvi=rf_local.cached_ndvi(start, end, cache), districts=names)
+        smap = rf_local.cached_smap(start, end, cache, names)
+    with instrument.stage("rf_local") as s:
+        df, maps = rf_local.downscale_local(grid, smap, return_maps=True)
+        s.rows += len(df)
+    with instrument.stage("maps"):
+        rf_local.write_maps(maps, grid, rf_local.date_context(smap).index)
+    return df
+
+# 5d. Daily series for the forecaster: SMAP images are 3-hourly, so the
+#     per-image means are averaged per day and merged into the existing file
+def write_series(df, path=SERIES_CSV):
+    new = (df.dropna(subset=["sm500m"])
+             .assign(ds=pd.to_datetime(df["date"]).dt.normalize(), district=df["district"].astype(str))
+             .groupby(["district", "ds"], as_index=False).sm500m.mean()
+             .rename(columns={"sm500m": "y"}))
+    if os.path.exists(path):
+        old = pd.read_csv(path, parse_dates=["ds"])
+        new = pd.concat([old, new]).drop_duplicates(["district", "ds"], keep="last")
+    new = new.sort_values(["district", "ds"])[["ds", "y", "district"]]
+    new.to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return new
+
+# Memoized per (engine, dates, districts, regional), so a rerun from a widget
+# or download click does not repeat the downscale. The geometries follow from
+# the names and are left out of the key.
+@st.cache_data(show_spinner=False)
+def run_engine(engine, start, end, names, regional, _district_geoms):
+    if engine == "ee":
+        return downscale(_district_geoms, regional=regional)
+    if engine == "batch":
+        # monthly Export.table tasks; rerunning resumes the same tasks
+        return downscale_batch(_district_geoms, regional=regional)
+    # needs srtm_samples.csv and gldas_predictors.csv; only new SMAP days are fetched
+    return downscale_local(list(names))
 
 # 6️⃣ Streamlit UI
-st.title("RF Downscaling via GAUL Districts")
-init_ee()
-DIST_NAMES = ['Aurangabad','Bid','Hingoli','Jalna','Latur','Osmanabad','Parbhani','Nanded']
-districts  = get_districts(DIST_NAMES)
-
-st.write(f"Processing {len(DIST_NAMES)} districts over last {WINDOW_MO} months…")
-df_series = downscale(districts)
-
-st.success("Downscaling complete!")
-st.dataframe(df_series)
-csv = df_series.to_csv(index=False).encode("utf-8")
-st.download_button("Download results as CSV", data=csv, file_name="sm_downscaled.csv")
+def main():
+    st.title("RF Downscaling via GAUL Districts")
+    global ee
+    with instrument.stage("ee_init"):
+        ee = init_ee()
+    DIST_NAMES = ARGS.districts
+    with instrument.stage("geometry"):
+        districts = get_districts(DIST_NAMES)
+
+    engines    = {"ee": "Earth Engine", "batch": "Earth Engine batch export", "local": "Local (scikit-learn)"}
+    engine     = st.radio("Engine", list(engines), horizontal=True, format_func=engines.get,
+                          index=list(engines).index(ARGS.engine))
+    regional   = st.checkbox("One regional RF per date (district as covariate)", value=ARGS.regional)
+
+    st.write(f"Processing {len(DIST_NAMES)} districts from {ARGS.start} to {ARGS.end}…")
+    with instrument.stage("downscale") as s:
+        df_series = run_engine(engine, ARGS.start, ARGS.end, tuple(DIST_NAMES), regional, districts)
+        s.rows += len(df_series)
+
+    st.success("Downscaling complete!")
+    st.dataframe(df_series)
+    with instrument.stage("write") as s:
+        series = write_series(df_series)
+        s.rows += len(series)
+    st.write(f"▶ {SERIES_CSV} ({len(series)} district-days)")
+    with instrument.stage("render"):
+        download_buttons(df_series, "sm_downscaled", "Download results")
+
+if __name__ == "__main__":
+    with instrument.run("rf_downscaling"):
+        main()
@@ -0,0 +1,202 @@
+# rf_local.py
+#
+# Offline scikit-learn engine for downscaling SMAP to the 500 m grid.
+#
+# Inputs are all local: SMAP pixel samples from the observation cache, the
+# 500 m static predictors from the memory-mapped static_grid/ store (or
+# srtm_samples.csv when it has not been built), the GLDAS fields
+# in gldas_predictors.csv joined by nearest neighbour, and optionally the
+# district-mean NDVI from the MODIS cache. One RandomForestRegressor is fit
+# over all dates, with the regional mean SMAP and the season as date-varying
+# covariates, using `n_jobs` cores. It then predicts every 500 m pixel for
+# every date in vectorized batches. District means are taken locally with
+# the stored district polygons, so the result has the same schema as
+# rf_downscaling.downscale(). The full-resolution maps are kept too:
+#
+#   sm500m_maps/maps.npy     (dates, pixels) float32, one row per date
+#   sm500m_maps/lon.npy      (pixels,) pixel centres
+#   sm500m_maps/lat.npy
+#   sm500m_maps/maps.json    {dates, districts, built}
+
+import os, json
+import datetime
+import numpy as np
+import pandas as pd
+
+from district_geometry import DISTRICTS, assign_district
+from static_grid import GRID_DIR, load_grid
+from regrid import PointSource, align, district_series
+
+RF_TREES      = 50
+RF_MIN_SAMP   = 3
+RF_MAX_NODES  = None   # EE used maxNodes=5; unlimited leaves suit regression better
+N_PER_DATE    = 2000   # training pixels sampled per date
+BATCH_ROWS    = 1_000_000
+SRTM_CSV      = "srtm_samples.csv"
+GLDAS_CSV     = "gldas_predictors.csv"
+MAPS_DIR      = os.environ.get("SM_MAPS_DIR", "sm500m_maps")
+
+
+# ------------------ Static grid ------------------
+def load_static_grid(srtm_csv=SRTM_CSV, gldas_csv=GLDAS_CSV, ndvi=None, districts=DISTRICTS,
+                     grid_dir=GRID_DIR):
+    """
+    500 m pixels (lon, lat, district, elev, slope[, ndvi], GLDAS fields).
+    Pixels come from the static grid store when present, otherwise from
+    `srtm_csv`. `ndvi` is an optional {district: mean NDVI} mapping used
+    only when the pixels carry no NDVI band of their own.
+    """
+    store = load_grid(grid_dir)
+    if store is not None:
+        grid = store.to_frame()
+    else:
+        grid = pd.read_csv(srtm_csv).drop_duplicates(["lon", "lat"]).reset_index(drop=True)
+    grid["district"] = assign_district(grid.lon.values, grid.lat.values, districts)
+    grid = grid[grid.district.notna()].reset_index(drop=True)
+    if gldas_csv:
+        gl = PointSource.from_frame("gldas", pd.read_csv(gldas_csv))
+        grid = pd.concat([grid, align(grid, static=[gl])["static"]], axis=1)
+    if ndvi and "ndvi" not in grid.columns:
+        grid["ndvi"] = grid.district.map(ndvi).astype(np.float32)
+    return grid
+
+
+def cached_ndvi(start, end, cache=None):
+    """{district: mean NDVI} from the MODIS cache (MOD13Q1 scale factor applied)."""
+    from obs_cache import ObservationCache
+    df = (cache or ObservationCache()).load("modis_composite", start, end)
+    df = df[df.band.astype(str) == "NDVI"] if len(df) else df
+    if df.empty:
+        return {}
+    return district_series(df).mean(axis=1).mul(0.0001).to_dict()
+
+
+def feature_columns(grid):
+    return [c for c in grid.columns if c not in ("district",)]
+
+
+# ------------------ SMAP samples ------------------
+def cached_smap(start, end, cache=None, districts=None):
+    """SMAP pixel samples (date, lon, lat, sm) from the observation cache, one row per pixel-day."""
+    from obs_cache import ObservationCache
+    df = (cache or ObservationCache()).load("smap", start, end, districts)
+    if df.empty:
+        return pd.DataFrame(columns=["date", "lon", "lat", "sm"])
+    df = df.dropna(subset=["value"]).drop_duplicates(["date", "lon", "lat"])
+    return df.rename(columns={"value": "sm"})[["date", "lon", "lat", "sm"]].reset_index(drop=True)
+
+
+def date_context(smap):
+    """Per-date covariates: regional mean SMAP and the season (day-of-year sin/cos)."""
+    ctx = smap.groupby("date").sm.mean().rename("sm_region").to_frame()
+    doy = pd.DatetimeIndex(ctx.index).dayofyear.values
+    ctx["doy_sin"] = np.sin(2 * np.pi * doy / 365.25).astype(np.float32)
+    ctx["doy_cos"] = np.cos(2 * np.pi * doy / 365.25).astype(np.float32)
+    return ctx
+
+
+def build_training_set(grid, smap, n_per_date=N_PER_DATE, seed=42):
+    """
+    Label sampled 500 m pixels of every date with the SMAP value of their
+    nearest coarse sample (as the EE code does by sampling the coarse band at
+    fine scale). Returns X (rows × features), y and the feature names.
+    """
+    rng = np.random.default_rng(seed)
+    static_cols = feature_columns(grid)
+    static = grid[static_cols].to_numpy(np.float32)
+    ctx = date_context(smap)
+    C = ctx.to_numpy(np.float32)
+    # SMAP pivoted to (points × dates) once; each fine pixel mapped to its coarse point once
+    src = PointSource.from_long("sm", smap, value="sm", dates=pd.to_datetime(ctx.index))
+    idx = src.index.nearest(grid.lon.values, grid.lat.values)
+    Xs, ys = [], []
+    for j in range(len(ctx)):
+        pick = rng.choice(len(grid), size=min(n_per_date, len(grid)), replace=False)
+        pick = pick[idx[pick] >= 0]
+        y = src.values[idx[pick], j]
+        ok = ~np.isnan(y)
+        Xs.append(np.hstack([static[pick[ok]], np.broadcast_to(C[j], (ok.sum(), C.shape[1]))]))
+        ys.append(y[ok])
+    return np.vstack(Xs), np.concatenate(ys), static_cols + list(ctx.columns)
+
+
+def fit(X, y, n_jobs=-1, trees=RF_TREES, min_samples_leaf=RF_MIN_SAMP, max_leaf_nodes=RF_MAX_NODES,
+        seed=42):
+    from sklearn.ensemble import RandomForestRegressor
+    rf = RandomForestRegressor(n_estimators=trees, min_samples_leaf=min_samples_leaf,
+                               max_leaf_nodes=max_leaf_nodes, n_jobs=n_jobs, random_state=seed)
+    return rf.fit(X, y)
+
+
+def predict_grid(rf, grid, ctx, batch_rows=BATCH_ROWS):
+    """
+    Predict every pixel for every date in `ctx`. Returns a (dates × pixels)
+    float32 array; rows are assembled by broadcasting the static block against
+    each date's covariates, `batch_rows` at a time.
+    """
+    static = grid[feature_columns(grid)].to_numpy(np.float32)
+    P = len(static)
+    C = ctx.to_numpy(np.float32)
+    out = np.empty((len(C), P), np.float32)
+    per_batch = max(1, batch_rows // max(P, 1))
+    for i in range(0, len(C), per_batch):
+        c = C[i:i + per_batch]
+        X = np.concatenate([np.broadcast_to(static, (len(c), P, static.shape[1])),
+                            np.broadcast_to(c[:, None, :], (len(c), P, c.shape[1]))], axis=2)
+        out[i:i + len(c)] = rf.predict(X.reshape(-1, X.shape[2])).reshape(len(c), P)
+    return out
+
+
+def downscale_local(grid, smap, n_jobs=-1, return_maps=False):
+    """
+    Fit on `smap` (date, lon, lat, sm) and predict the 500 m grid for every
+    date. Returns the district-mean series (district, date, sm500m) and,
+    with return_maps=True, also the (dates × pixels) prediction array.
+    """
+    X, y, _ = build_training_set(grid, smap)
+    rf = fit(X, y, n_jobs=n_jobs)
+    ctx = date_context(smap)
+    maps = predict_grid(rf, grid, ctx)
+
+    codes, names = pd.factorize(grid.district)
+    counts = np.bincount(codes, minlength=len(names))
+    frames = []
+    for k, d in enumerate(names):
+        frames.append(pd.DataFrame({"district": d, "date": ctx.index,
+                                    "sm500m": maps[:, codes == k].sum(axis=1) / counts[k]}))
+    series = pd.concat(frames, ignore_index=True)
+    series["date"] = pd.to_datetime(series["date"]).dt.strftime("%Y-%m-%d")
+    return (series, maps) if return_maps else series
+
+
+# ------------------ 500 m maps ------------------
+def write_maps(maps, grid, dates, root=MAPS_DIR):
+    """
+    Save the (dates × pixels) predictions with the pixel coordinates to
+    `root`, replacing the previous run. maps.npy is written to a temporary
+    file first and can be opened with mmap_mode="r".
+    """
+    os.makedirs(root, exist_ok=True)
+    tmp = os.path.join(root, "maps.tmp.npy")
+    np.save(tmp, np.asarray(maps, np.float32))
+    os.replace(tmp, os.path.join(root, "maps.npy"))
+    for c in ("lon", "lat"):
+        np.save(os.path.join(root, f"{c}.tmp.npy"), grid[c].to_numpy(np.float64))
+        os.replace(os.path.join(root, f"{c}.tmp.npy"), os.path.join(root, f"{c}.npy"))
+    meta = {"dates": [str(d)[:10] for d in dates],
+            "districts": sorted(grid.district.astype(str).unique()),
+            "built": datetime.datetime.now().isoformat(timespec="seconds")}
+    with open(os.path.join(root, "maps.json.tmp"), "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(os.path.join(root, "maps.json.tmp"), os.path.join(root, "maps.json"))
+    return meta
+
+
+def load_maps(root=MAPS_DIR):
+    """(maps, lon, lat, meta) from `root` with maps memory-mapped, or None when absent."""
+    if not os.path.exists(os.path.join(root, "maps.json")):
+        return None
+    with open(os.path.join(root, "maps.json")) as f:
+        meta = json.load(f)
+    maps = np.load(os.path.join(root, "maps.npy"), mmap_mode="r")
+    return maps, np.load(os.path.join(root, "lon.npy")), np.load(os.path.join(root, "lat.npy")), meta
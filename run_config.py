@@ -0,0 +1,52 @@
+# run_config.py
+#
+# Run parameters shared by every stage: date range and districts.
+#
+# Each script reads them from its own command line, so the same flags work
+# for `python gldas_export.py --start ...`, for
+# `streamlit run gldas_export.py -- --start ...` and for pipeline.py. Unset
+# flags fall back to SM_START / SM_END / SM_DISTRICTS, then to the last
+# WINDOW_MO months over all districts. --stream (SM_STREAM=1) switches the
+# exporters to bounded-memory chunked output.
+
+import os, argparse
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from district_geometry import DISTRICTS
+
+WINDOW_MO = 12
+
+
+def make_parser(description=None):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--start", default=os.environ.get("SM_START"),
+                   help=f"first date, YYYY-MM-DD (default: {WINDOW_MO} months before --end)")
+    p.add_argument("--end", default=os.environ.get("SM_END"),
+                   help="end date, exclusive (default: today)")
+    p.add_argument("--district", action="append", default=None,
+                   help="district name; repeat or comma-separate (default: all)")
+    p.add_argument("--stream", action="store_true", default=os.environ.get("SM_STREAM") == "1",
+                   help="bounded-memory export: write month chunks to exports/ (see streaming)")
+    return p
+
+
+def parse_args(parser=None, argv=None):
+    """Parse known flags (others, e.g. Streamlit's, are ignored) and fill in defaults."""
+    args, _ = (parser or make_parser()).parse_known_args(argv)
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp.today().normalize()
+    start = pd.Timestamp(args.start) if args.start else end - relativedelta(months=WINDOW_MO)
+    args.start, args.end = start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+    names = args.district or ([os.environ["SM_DISTRICTS"]] if os.environ.get("SM_DISTRICTS") else [])
+    args.districts = [d.strip() for n in names for d in n.split(",") if d.strip()] or list(DISTRICTS)
+    return args
+
+
+def to_argv(args):
+    """Command-line form of parsed args, for passing them on to a stage."""
+    argv = ["--start", args.start, "--end", args.end]
+    for d in args.districts:
+        argv += ["--district", d]
+    if getattr(args, "stream", False):
+        argv.append("--stream")
+    return argv
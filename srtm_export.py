@@ -1,59 +1,68 @@
 # srtm_export.py
 
-import ee
 import streamlit as st
-import json, tempfile, os
 import pandas as pd
+from dateutil.relativedelta import relativedelta
+from ee_executor import get_executor
+from ee_session import init_ee, district_geoms
+from columnar import write_outputs
+from static_grid import static_stack, build_grid
+from run_config import parse_args
+import instrument
 
-st.title("1️⃣ SRTM Export (per-district, all pixels)")
+NDVI_MONTHS = 12  # window of the mean NDVI band, as in rf_downscaling
 
-def init_ee():
-    if "ee_credentials" not in st.secrets:
-        st.error("Missing ee_credentials"); st.stop()
-    raw = st.secrets["ee_credentials"]["json"]
-    key_data = json.dumps(raw) if isinstance(raw, dict) else raw.strip()
-    creds = json.loads(key_data)
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as tf:
-        tf.write(key_data); key_path = tf.name
-    try:
-        ee.Initialize(ee.ServiceAccountCredentials(creds["client_email"], key_path))
-        st.success("✅ EE initialized")
-    finally:
-        os.remove(key_path)
+st.title("1️⃣ SRTM Export (per-district, all pixels)")
 
 def main():
-    init_ee()
-    DISTRICTS = ['Aurangabad','Bid','Hingoli','Jalna','Latur','Osmanabad','Parbhani','Nanded']
-    gaul = ee.FeatureCollection("FAO/GAUL/2015/level2")\
-             .filter(ee.Filter.eq('ADM0_NAME','India'))\
-             .filter(ee.Filter.eq('ADM1_NAME','Maharashtra'))
+    args = parse_args()
+    with instrument.stage("ee_init"):
+        ee = init_ee()
+    st.success("✅ EE initialized")
+    DISTRICTS = args.districts
+    with instrument.stage("geometry"):
+        geoms = district_geoms(tuple(DISTRICTS))
 
-    elev  = ee.Image('USGS/SRTMGL1_003').select('elevation').rename('elev')
-    slope = ee.Terrain.slope(elev).rename('slope')
-    stack = elev.addBands(slope)
+    end   = pd.Timestamp(args.end).date()
+    start = end - relativedelta(months=NDVI_MONTHS)
+    stack = static_stack(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
 
     all_rows = []
     header = None
 
-    for d in DISTRICTS:
-        st.info(f"Sampling SRTM in {d}…")
-        region_i = gaul.filter(ee.Filter.eq('ADM2_NAME', d)).geometry().buffer(5000)
-        arr = ee.ImageCollection([stack]).getRegion(region_i, 500).getInfo()
-        if len(arr) < 2:
-            st.warning(f"No pixels in {d}")
-            continue
-        if header is None:
-            header = arr[0]
-        all_rows += arr[1:]
+    def sample_district(d):
+        region_i = geoms[d]
+        return ee.ImageCollection([stack]).getRegion(region_i, 500).getInfo()
+
+    st.info(f"Sampling SRTM in {len(DISTRICTS)} districts…")
+    with instrument.stage("ee_fetch") as s:
+        for d, arr in zip(DISTRICTS, get_executor().imap(sample_district, DISTRICTS)):
+            st.info(f"Sampled SRTM in {d}")
+            if len(arr) < 2:
+                st.warning(f"No pixels in {d}")
+                continue
+            if header is None:
+                header = arr[0]
+            all_rows += arr[1:]
+        s.rows += len(all_rows)
 
     if not all_rows:
         st.error("No SRTM pixels found."); st.stop()
 
-    df = pd.DataFrame(all_rows, columns=header)[['longitude','latitude','elev','slope']]
-    df = df.rename(columns={'longitude':'lon','latitude':'lat'})
-    df.to_csv('srtm_samples.csv', index=False)
-    st.success(f"▶ srtm_samples.csv ({len(df)} rows)")  
+    with instrument.stage("frame"):
+        df = pd.DataFrame(all_rows, columns=header)[['longitude','latitude','elev','slope','ndvi']]
+        df = df.rename(columns={'longitude':'lon','latitude':'lat'})
+        df[['elev','slope','ndvi']] = df[['elev','slope','ndvi']].astype('float32')
+    with instrument.stage("write") as s:
+        paths = write_outputs(df, 'srtm_samples')
+        st.success(f"▶ {', '.join(paths)} ({len(df)} rows)")
+
+        # Same pixels as a memory-mapped lat/lon grid for the downstream scripts
+        meta = build_grid(df, scale_m=500, ndvi_window=[str(start), str(end)])
+        s.rows += len(df)
+    st.success(f"▶ static_grid/ ({meta['ny']}×{meta['nx']} grid, {meta['res']:.5f}° spacing)")
     st.dataframe(df.head())
 
-if __name__=='__main__':
-    main()
+if __name__ == "__main__":
+    with instrument.run("srtm_export"):
+        main()
@@ -0,0 +1,141 @@
+# static_grid.py
+#
+# Memory-mapped store of the static predictors (elev, slope, 12-month mean NDVI).
+#
+# srtm_export.py samples the predictors once on a regular lat/lon grid and
+# writes each band as a 2-D float32 .npy plus a small JSON header:
+#
+#   static_grid/grid.json      {lon0, lat0, res, nx, ny, bands, ...}
+#   static_grid/<band>.npy     (ny, nx) float32, NaN outside the districts
+#
+# Row 0 is the northernmost row and (lon0, lat0) is the centre of its
+# westernmost pixel, so a coordinate maps to (row, col) with two
+# multiplications. StaticGrid opens the bands with mmap_mode="r": nothing is
+# read until a pixel is touched and every consumer shares the page cache.
+
+import os, json
+import datetime
+import numpy as np
+import pandas as pd
+
+GRID_DIR = os.environ.get("SM_STATIC_DIR", "static_grid")
+BANDS    = ["elev", "slope", "ndvi"]
+
+
+# ------------------ EE predictor stack ------------------
+def static_stack(start, end):
+    """Elev, slope and mean NDVI over [start, end) as one EE image (shared by all scripts)."""
+    import ee
+    elev  = ee.Image("USGS/SRTMGL1_003").select("elevation").rename("elev")
+    slope = ee.Terrain.slope(elev).rename("slope")
+    ndvi  = (ee.ImageCollection("MODIS/061/MOD13Q1")
+               .filterDate(start, end)
+               .select("NDVI")
+               .map(lambda i: i.multiply(0.0001))
+               .mean()
+               .rename("ndvi"))
+    return elev.addBands(slope).addBands(ndvi)
+
+
+# ------------------ Build ------------------
+def _spacing(v):
+    d = np.diff(np.unique(np.round(v, 9)))
+    d = d[d > 1e-9]
+    return float(np.median(d)) if len(d) else None
+
+
+def build_grid(df, root=GRID_DIR, bands=None, res=None, **info):
+    """
+    Rasterize pixel-centre samples (lon, lat, band columns) onto a regular
+    grid and write it to `root`. The spacing is inferred from the samples
+    unless `res` (degrees) is given. Extra keyword args go into grid.json.
+    """
+    bands = [b for b in (bands or BANDS) if b in df.columns]
+    lon = df["lon"].to_numpy(np.float64)
+    lat = df["lat"].to_numpy(np.float64)
+    res = res or _spacing(lon) or _spacing(lat)
+    lon0, lat0 = lon.min(), lat.max()
+    col = np.rint((lon - lon0) / res).astype(np.int64)
+    row = np.rint((lat0 - lat) / res).astype(np.int64)
+    nx, ny = int(col.max()) + 1, int(row.max()) + 1
+
+    os.makedirs(root, exist_ok=True)
+    for b in bands:
+        tmp = os.path.join(root, f"{b}.tmp.npy")
+        arr = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(ny, nx))
+        arr[:] = np.nan
+        arr[row, col] = df[b].to_numpy(np.float32)
+        arr.flush()
+        del arr
+        os.replace(tmp, os.path.join(root, f"{b}.npy"))
+
+    meta = {"lon0": lon0, "lat0": lat0, "res": res, "nx": nx, "ny": ny, "bands": bands,
+            "built": datetime.datetime.now().isoformat(timespec="seconds"), **info}
+    with open(os.path.join(root, "grid.json.tmp"), "w") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(os.path.join(root, "grid.json.tmp"), os.path.join(root, "grid.json"))
+    return meta
+
+
+# ------------------ Load ------------------
+class StaticGrid:
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.arrays = arrays
+        self.lon0, self.lat0, self.res = meta["lon0"], meta["lat0"], meta["res"]
+        self.shape = (meta["ny"], meta["nx"])
+
+    @classmethod
+    def load(cls, root=GRID_DIR):
+        with open(os.path.join(root, "grid.json")) as f:
+            meta = json.load(f)
+        arrays = {b: np.load(os.path.join(root, f"{b}.npy"), mmap_mode="r") for b in meta["bands"]}
+        return cls(meta, arrays)
+
+    @property
+    def bands(self):
+        return list(self.arrays)
+
+    def __getitem__(self, band):
+        return self.arrays[band]
+
+    def index(self, lon, lat):
+        """(row, col) of the pixels containing lon/lat; -1 where outside the grid."""
+        col = np.rint((np.asarray(lon, np.float64) - self.lon0) / self.res).astype(np.int64)
+        row = np.rint((self.lat0 - np.asarray(lat, np.float64)) / self.res).astype(np.int64)
+        out = (row < 0) | (row >= self.shape[0]) | (col < 0) | (col >= self.shape[1])
+        row[out] = -1; col[out] = -1
+        return row, col
+
+    def coords(self, row, col):
+        return self.lon0 + np.asarray(col) * self.res, self.lat0 - np.asarray(row) * self.res
+
+    def sample(self, lon, lat, bands=None):
+        """Band values at lon/lat as a DataFrame (NaN outside the grid)."""
+        row, col = self.index(lon, lat)
+        ok = row >= 0
+        out = {}
+        for b in bands or self.bands:
+            v = np.full(len(row), np.nan, np.float32)
+            v[ok] = self.arrays[b][row[ok], col[ok]]
+            out[b] = v
+        return pd.DataFrame(out)
+
+    def valid(self, band=None):
+        return ~np.isnan(self.arrays[band or self.bands[0]])
+
+    def to_frame(self, bands=None):
+        """Valid pixels as (lon, lat, bands...), the same layout as srtm_samples.csv."""
+        row, col = np.nonzero(self.valid())
+        lon, lat = self.coords(row, col)
+        df = pd.DataFrame({"lon": lon, "lat": lat})
+        for b in bands or self.bands:
+            df[b] = self.arrays[b][row, col]
+        return df
+
+
+def load_grid(root=GRID_DIR):
+    """StaticGrid for `root`, or None when the store has not been built yet."""
+    if not os.path.exists(os.path.join(root, "grid.json")):
+        return None
+    return StaticGrid.load(root)
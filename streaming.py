@@ -0,0 +1,186 @@
+# streaming.py
+#
+# Bounded-memory export: results go to disk chunk by chunk instead of being
+# collected into one DataFrame and encoded again for the download button.
+#
+# ChunkWriter appends each chunk to <basename>.parquet (one row group per
+# chunk), .csv and/or .arrow under EXPORT_DIR as it arrives; the files are
+# renamed into place when complete. RollingPreview keeps only the last rows
+# on screen, and file_download_buttons() hands Streamlit a callable that reads
+# the finished file when clicked, so nothing is encoded in memory during the run. With the
+# exporters' --stream flag, peak memory is set by one month of rows, not by the
+# length of the date window.
+
+import os
+import pandas as pd
+
+from columnar import FORMATS
+
+EXPORT_DIR   = os.environ.get("SM_EXPORT_DIR", "exports")
+PREVIEW_ROWS = 200
+
+
+def _arrow_schema(table):
+    # Categoricals get a fixed int32 dictionary index, so chunks whose
+    # categories differ still share one schema
+    import pyarrow as pa
+    fields = []
+    for f in table.schema:
+        t = f.type
+        if pa.types.is_dictionary(t):
+            t = pa.dictionary(pa.int32(), t.value_type)
+        fields.append(pa.field(f.name, t))
+    return pa.schema(fields)
+
+
+class ChunkWriter:
+    """Append DataFrame chunks to one file per format; close() publishes them."""
+
+    def __init__(self, basename, formats=("parquet", "csv"), root=None):
+        root = root or EXPORT_DIR
+        os.makedirs(root, exist_ok=True)
+        self.paths = {fmt: os.path.join(root, basename + FORMATS[fmt][1]) for fmt in formats}
+        self.rows = 0
+        self.columns = None
+        self._schema = None
+        self._writers = {}
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(publish=exc_type is None)
+
+    def write(self, df):
+        if not len(df):
+            return
+        if self.columns is None:
+            self.columns = list(df.columns)
+        df = df[self.columns]
+        for fmt, path in self.paths.items():
+            getattr(self, f"_write_{fmt}")(df, path + ".part")
+        self.rows += len(df)
+
+    def _table(self, df):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._schema is None:
+            self._schema = _arrow_schema(table)
+        return table.cast(self._schema)
+
+    def _write_parquet(self, df, path):
+        import pyarrow.parquet as pq
+        table = self._table(df)
+        if "parquet" not in self._writers:
+            self._writers["parquet"] = pq.ParquetWriter(path, table.schema)
+        self._writers["parquet"].write_table(table)
+
+    def _write_arrow(self, df, path):
+        import pyarrow as pa
+        table = self._table(df)
+        if "arrow" not in self._writers:
+            self._files["arrow"] = pa.OSFile(path, "wb")
+            self._writers["arrow"] = pa.ipc.new_file(self._files["arrow"], table.schema)
+        self._writers["arrow"].write_table(table)
+
+    def _write_csv(self, df, path):
+        first = "csv" not in self._files
+        if first:
+            self._files["csv"] = open(path, "w", newline="")
+        df.to_csv(self._files["csv"], header=first, index=False)
+
+    def close(self, publish=True):
+        """Finish every file; on success move them into place and return their paths."""
+        for w in self._writers.values():
+            w.close()
+        for f in self._files.values():
+            f.close()
+        self._writers, self._files = {}, {}
+        done = []
+        for fmt, path in self.paths.items():
+            if not os.path.exists(path + ".part"):
+                continue
+            if publish:
+                os.replace(path + ".part", path)
+                done.append(path)
+            else:
+                os.remove(path + ".part")
+        return done
+
+
+class RollingPreview:
+    """The last `n` rows seen so far, redrawn in one placeholder."""
+
+    def __init__(self, n=PREVIEW_ROWS, transform=None, label="Fetched"):
+        import streamlit as st
+        self.n = n
+        self.caption = st.empty()
+        self.table = st.empty()
+        self.reset(label, transform)
+
+    def reset(self, label, transform=None):
+        """Start counting again, e.g. when moving from fetching to writing."""
+        self.label, self.transform, self.rows, self.tail = label, transform, 0, None
+
+    def add(self, df):
+        if self.transform is not None:
+            df = self.transform(df)
+        self.rows += len(df)
+        part = df.tail(self.n)
+        self.tail = part if self.tail is None else pd.concat([self.tail, part], ignore_index=True).tail(self.n)
+        self.caption.caption(f"{self.label}: {self.rows:,} rows so far · showing the last {len(self.tail)}")
+        self.table.dataframe(self.tail)
+
+
+def stream_export(chunks, basename, formats=("parquet", "csv"), preview=None):
+    """Write an iterable of DataFrames to disk; returns (paths, rows)."""
+    with ChunkWriter(basename, formats) as w:
+        for df in chunks:
+            w.write(df)
+            if preview is not None:
+                preview.add(df)
+    return [p for p in w.paths.values() if os.path.exists(p)], w.rows
+
+
+def _reader(path):
+    def read():
+        with open(path, "rb") as f:
+            return f.read()
+    return read
+
+
+def file_download_buttons(paths, label="Download"):
+    """Download buttons that read the exported files only when clicked, without a rerun."""
+    import streamlit as st
+    by_ext = {ext: fmt for fmt, (_, ext, _, _) in FORMATS.items()}
+    for path in paths:
+        name, ext, mime, _ = FORMATS[by_ext[os.path.splitext(path)[1]]]
+        size_mb = os.path.getsize(path) / 2**20
+        st.download_button(f"{label} ({name}, {size_mb:.1f} MB)", data=_reader(path),
+                           file_name=os.path.basename(path), mime=mime, key=f"file-{path}",
+                           on_click="ignore")
+
+
+def export_cached(dataset, districts, start, end, fetch, transform, basename,
+                  label="Download", cache=None):
+    """
+    The --stream path of an exporter: fill the observation cache a month at a
+    time (previewing what arrives), then pass the cached months through
+    `transform` into the export files and offer them for download.
+    Returns (paths, rows).
+    """
+    import instrument
+    from obs_cache import ObservationCache
+    cache = cache or ObservationCache()
+    preview = RollingPreview(transform=transform)
+    with instrument.stage("cache") as s:
+        cache.fill(dataset, list(districts), start, end, fetch, on_chunk=preview.add)
+        s.rows += preview.rows
+    preview.reset("Written")  # stream_export shows the chunks already transformed
+    with instrument.stage("write") as s:
+        months = cache.iter_load(dataset, start, end, list(districts))
+        paths, rows = stream_export(map(transform, months), basename, preview=preview)
+        s.rows += rows
+    file_download_buttons(paths, label)
+    return paths, rows
@@ -0,0 +1,4 @@
+# Tests import the flat top-level modules of the repository
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from backtest import rolling_origin_backtest
+
+
+def _series(n=40):
+    return pd.DataFrame({"ds": pd.date_range("2024-01-01", periods=n), "y": np.arange(n, dtype=float)})
+
+
+def _n(res):
+    return int(res.n.iloc[0])
+
+
+def test_first_origin_zero_is_not_unset():
+    df = _series()
+    last = lambda X: X[:, -1]
+    # origin 0 is clamped to the first complete window, same as the default
+    assert _n(rolling_origin_backtest(last, df, 7, 1, first_origin=0)) == 40 - 7
+    assert _n(rolling_origin_backtest(last, df, 7, 1, first_origin=20)) == 40 - 20
+
+
+def test_since_scores_only_targets_after_the_cutoff():
+    df = _series()
+    seen = []
+    def predict(X):
+        seen.append(X[:, -1, 0].copy())
+        return X[:, -1]
+    res = rolling_origin_backtest(predict, df, 7, 3, since=df.ds[29])
+    # first targets at days 30..39; the last ones are NaN-padded past the end
+    assert res.n.tolist() == [10, 9, 8]
+    assert seen[0].min() == 29
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pytest
+
+import fake_ee
+from batch_export import BatchExport, MAX_ATTEMPTS, month_shards
+
+COLUMNS = ["district", "date", "sm500m"]
+
+
+@pytest.fixture
+def ee(tmp_path, monkeypatch):
+    np.random.seed(0)
+    monkeypatch.setattr(fake_ee, "TASK_REGISTRY", str(tmp_path / "tasks.json"))
+    yield fake_ee
+    fake_ee.configure()
+
+
+def table():
+    """build() giving one row per shard, recording the shards it was asked for."""
+    calls = []
+
+    def build(start, end):
+        calls.append((start, end))
+        return fake_ee.FeatureCollection([fake_ee.Feature(None, {"district": "A", "date": start, "sm500m": 0.3})])
+    build.calls = calls
+    return build
+
+
+def export(tmp_path):
+    return BatchExport("sm", COLUMNS, {"districts": ["A"]}, bucket=str(tmp_path / "bucket"),
+                       root=str(tmp_path / "state"))
+
+
+def tasks(tmp_path):
+    with open(tmp_path / "tasks.json") as f:
+        return json.load(f)
+
+
+def test_failed_task_is_resubmitted_at_most_max_attempts(ee, tmp_path):
+    ee.configure(task_error_rate=1.0)
+    job, build = export(tmp_path), table()
+    df = job.run(ee, "2024-01-01", "2024-03-01", build, poll_s=0)
+    shards = month_shards("2024-01-01", "2024-03-01")
+    assert df.empty
+    assert [sh["attempts"] for sh in job.failed(shards)] == [MAX_ATTEMPTS] * 2
+    assert len(tasks(tmp_path)) == 2 * MAX_ATTEMPTS
+    assert len(build.calls) == 2 * MAX_ATTEMPTS
+
+    # A transient failure: the retry succeeds
+    job = export(tmp_path)
+    ee.configure(task_error_rate=1.0)
+    job.run(ee, "2024-03-01", "2024-04-01", build, wait=False)
+    assert job.progress([("2024-03-01", "2024-04-01")]) == {"RETRY": 1}
+    ee.configure()
+    df = job.run(ee, "2024-03-01", "2024-04-01", build, poll_s=0)
+    sh = job.state["shards"]["2024-03-01_2024-04-01"]
+    assert (sh["state"], sh["attempts"]) == ("DONE", 2)
+    assert df.date.tolist() == ["2024-03-01"]
+
+
+def test_second_export_reuses_running_tasks(ee, tmp_path):
+    ee.configure(task_seconds=0.2)
+    first = export(tmp_path)
+    first.run(ee, "2024-01-01", "2024-03-01", table(), wait=False)
+    ids = {k: sh["task_id"] for k, sh in first.state["shards"].items()}
+    assert len(ids) == 2 and len(tasks(tmp_path)) == 2
+
+    # e.g. the page was closed and the cron job picks the window up
+    build = table()
+    second = export(tmp_path)
+    df = second.run(ee, "2024-01-01", "2024-03-01", build, poll_s=0.05)
+    assert build.calls == []
+    assert {k: sh["task_id"] for k, sh in second.state["shards"].items()} == ids
+    assert len(tasks(tmp_path)) == 2
+    assert df.date.tolist() == ["2024-01-01", "2024-02-01"]
+
+
+def test_downloaded_months_are_skipped(ee, tmp_path):
+    export(tmp_path).run(ee, "2024-01-01", "2024-03-01", table(), poll_s=0)
+    assert len(tasks(tmp_path)) == 2
+
+    build = table()
+    job = export(tmp_path)
+    df = job.run(ee, "2024-01-01", "2024-04-01", build, poll_s=0)
+    assert build.calls == [("2024-03-01", "2024-04-01")]
+    assert len(tasks(tmp_path)) == 3
+    assert df.date.tolist() == ["2024-01-01", "2024-02-01", "2024-03-01"]
+    assert job.progress() == {"DONE": 3}
+
+    # a different district set has its own state file
+    other = BatchExport("sm", COLUMNS, {"districts": ["B"]}, bucket=str(tmp_path / "bucket"),
+                        root=str(tmp_path / "state"))
+    assert other.state_path != job.state_path and other.progress() == {}
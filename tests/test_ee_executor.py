@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import fake_ee
+from ee_executor import EEExecutor, RateLimiter
+
+
+@pytest.fixture
+def ee():
+    np.random.seed(0)
+    fake_ee.reset_stats()
+    yield fake_ee
+    fake_ee.configure()
+    fake_ee.reset_stats()
+
+
+class Clock:
+    """Manual clock whose sleep() just advances time and records the delay."""
+
+    def __init__(self):
+        self.t = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.t
+
+    def sleep(self, s):
+        self.sleeps.append(s)
+        self.t += s
+
+
+def test_quota_errors_are_retried_and_results_keep_input_order(ee):
+    ee.configure(jitter=0.005, error_rate=0.3)
+    clock = Clock()
+    ex = EEExecutor(max_workers=4, rate_per_sec=0, max_retries=20, sleep=clock.sleep, clock=clock)
+    items = list(range(40))
+    assert list(ex.imap(lambda i: ee.Number(i).getInfo(), items)) == items
+    assert ex.retries == ee.STATS["errors"] > 0
+    assert ee.STATS["getinfo"] == len(items) + ex.retries
+    ex.shutdown()
+
+
+def test_backoff_doubles_and_gives_up_after_max_retries(ee):
+    ee.configure(error_rate=1.0)
+    clock = Clock()
+    ex = EEExecutor(max_workers=1, rate_per_sec=0, max_retries=4, backoff_base=1.0,
+                    backoff_max=5.0, sleep=clock.sleep, clock=clock)
+    with pytest.raises(fake_ee.EEException):
+        ex.get_info(ee.Number(1))
+    assert ee.STATS["getinfo"] == 5 and ex.retries == 4
+    # Full jitter on the upper half: delay k lies in [d/2, d], d = min(max, base * 2^k)
+    for k, s in enumerate(clock.sleeps):
+        d = min(5.0, 2.0 ** k)
+        assert d / 2 <= s <= d
+    ex.shutdown()
+
+
+def test_other_errors_are_not_retried(ee):
+    ex = EEExecutor(max_workers=1, rate_per_sec=0, sleep=Clock().sleep)
+    calls = []
+
+    def bad():
+        calls.append(1)
+        raise ValueError("Image.select: band 'x' not found")
+
+    with pytest.raises(ValueError):
+        ex.call(bad)
+    assert len(calls) == 1 and ex.retries == 0
+    ex.shutdown()
+
+
+def test_rate_limiter_allows_a_burst_then_paces_calls():
+    clock = Clock()
+    limiter = RateLimiter(10, clock=clock, sleep=clock.sleep)
+    for _ in range(10):
+        limiter.acquire()
+    assert clock.t == 0
+    for _ in range(5):
+        limiter.acquire()
+    assert clock.t == pytest.approx(0.5)
@@ -0,0 +1,40 @@
+import json
+import threading
+
+import pytest
+
+import instrument
+from ee_executor import EEExecutor
+
+
+def test_tracer_per_thread_and_executor_workers(tmp_path, monkeypatch):
+    ex = EEExecutor(max_workers=4, rate_per_sec=0)
+    seen = {}
+
+    def session(name, n):
+        with instrument.run(name, sidebar=False) as t:
+            with instrument.stage("fetch"):
+                ex.map(lambda i: i, range(n))
+            seen[name] = t
+
+    monkeypatch.setattr(instrument, "METRICS_DIR", str(tmp_path))
+    threads = [threading.Thread(target=session, args=(f"s{n}", n)) for n in (3, 5)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    # Calls made on the pool's threads land in the submitting session's tracer
+    assert seen["s3"].stages["fetch"].calls == 3
+    assert seen["s5"].stages["fetch"].calls == 5
+    ex.shutdown()
+
+
+def test_run_writes_metrics_when_the_script_raises(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrument, "METRICS_DIR", str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with instrument.run("failing"):
+            with instrument.stage("load") as s:
+                s.rows += 7
+                raise RuntimeError("boom")
+    stages = json.load(open(tmp_path / "failing.json"))["stages"]
+    assert stages == [dict(stages[0], stage="load", rows=7)]
@@ -0,0 +1,24 @@
+import json
+
+import pandas as pd
+
+import lstm_global
+
+
+def _series(days, districts=("A", "B")):
+    ds = pd.date_range("2024-01-01", periods=days)
+    return pd.DataFrame([{"district": d, "ds": t, "y": 0.2} for d in districts for t in ds])
+
+
+def test_needs_training_only_for_missing_new_or_stale_models(tmp_path):
+    model, meta = tmp_path / "global.h5", tmp_path / "global.json"
+    check = lambda s: lstm_global.needs_training(s, model_file=str(model), meta_file=str(meta))
+    assert check(_series(60))
+
+    model.write_bytes(b"")
+    meta.write_text(json.dumps({"districts": ["A", "B"], "last_date": "2024-02-29"}))
+    assert not check(_series(60))
+    # New days within RETRAIN_DAYS reuse the saved model
+    assert not check(_series(60 + lstm_global.RETRAIN_DAYS))
+    assert check(_series(61 + lstm_global.RETRAIN_DAYS))
+    assert check(_series(60, ("A", "B", "C")))
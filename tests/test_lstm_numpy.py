@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import lstm_numpy
+
+tf = pytest.importorskip("tensorflow")
+
+
+def _check(model, inputs, path):
+    model.save(path)
+    engine = lstm_numpy.load_engine(str(path))
+    np.testing.assert_allclose(engine.predict(inputs), model.predict(inputs, verbose=0), atol=1e-5)
+    assert lstm_numpy.is_fresh(str(path))
+
+
+def test_sequential_lstm_matches_keras(tmp_path):
+    from tensorflow.keras import Sequential, layers
+    m = Sequential([
+        layers.Input(shape=(7, 1)),
+        layers.LSTM(16, activation="relu", return_sequences=True),
+        layers.LSTM(8, activation="relu"),
+        layers.Dropout(0.2),
+        layers.Dense(3),
+    ])
+    X = np.random.default_rng(0).random((32, 7, 1), dtype=np.float32)
+    _check(m, X, tmp_path / "seq.h5")
+
+
+def test_global_model_with_embedding_matches_keras(tmp_path):
+    import lstm_global
+    m = lstm_global.build_global_model(n_districts=3, n_features=2, n_out=1)
+    rng = np.random.default_rng(1)
+    inputs = {"seq": rng.random((10, lstm_global.WINDOW_SIZE, 2), dtype=np.float32),
+              "district": rng.integers(0, 3, 10).astype(np.int32)}
+    _check(m, inputs, tmp_path / "global.h5")
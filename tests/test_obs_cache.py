@@ -0,0 +1,94 @@
+import datetime
+
+import pandas as pd
+
+from obs_cache import ObservationCache
+from compositing import period_floor, periods
+
+
+def daily(band, value=1.0):
+    """fetch() giving one row per district and day of [start, end)."""
+    calls = []
+
+    def fetch(districts, start, end):
+        calls.append((tuple(districts), start, end))
+        days = pd.date_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), freq="D")
+        return pd.DataFrame([{"band": band, "district": d, "date": t, "value": value}
+                             for d in districts for t in days])
+    fetch.calls = calls
+    return fetch
+
+
+def test_merge_missing_spans_round_trip(tmp_path):
+    cache = ObservationCache(str(tmp_path))
+    fetch = daily("sm")
+
+    df = cache.update("ds", ["A", "B"], "2024-05-20", "2024-06-10", fetch)
+    assert len(df) == 2 * 21
+    assert fetch.calls == [(("A", "B"), "2024-05-20", "2024-06-10")]
+    # Last observed day is fetched again next time
+    assert cache.coverage("ds") == {d: (datetime.date(2024, 5, 20), datetime.date(2024, 6, 9)) for d in "AB"}
+
+    # Wider window: only the spans around the covered range are requested
+    assert cache.missing_spans("ds", ["A", "B", "C"], "2024-05-15", "2024-06-12") == {
+        (datetime.date(2024, 5, 15), datetime.date(2024, 5, 20)): ["A", "B"],
+        (datetime.date(2024, 6, 9), datetime.date(2024, 6, 12)): ["A", "B"],
+        (datetime.date(2024, 5, 15), datetime.date(2024, 6, 12)): ["C"],
+    }
+    df = cache.update("ds", ["A", "B", "C"], "2024-05-15", "2024-06-12", fetch)
+    assert len(fetch.calls) == 4
+    assert len(df) == 3 * 28
+    assert not df.duplicated(["band", "district", "date"]).any()
+    assert cache.load("ds", "2024-05-31", "2024-06-02", ["B"]).date.tolist() == \
+        [pd.Timestamp("2024-05-31"), pd.Timestamp("2024-06-01")]
+
+    # Inside the covered range nothing is fetched; the same window again only
+    # re-fetches the last (possibly partial) day
+    assert cache.missing_spans("ds", ["A"], "2024-05-15", "2024-06-10") == {}
+    assert cache.missing_spans("ds", ["A"], "2024-05-15", "2024-06-12") == {
+        (datetime.date(2024, 6, 11), datetime.date(2024, 6, 12)): ["A"]}
+
+
+def test_aligned_refresh_keeps_one_row_per_period(tmp_path):
+    def fetch(districts, start, end):
+        return pd.DataFrame([{"band": "NDVI", "district": d, "date": t0, "value": 1.0}
+                             for d in districts for t0, _ in periods(start, end, "dekadal")])
+
+    cache = ObservationCache(str(tmp_path), align=lambda d: period_floor(d, "dekadal"))
+    cache.update("ndvi", ["A"], "2024-06-01", "2024-06-05", fetch)
+    df = cache.update("ndvi", ["A"], "2024-06-01", "2024-06-09", fetch)
+    assert df.date.tolist() == [pd.Timestamp("2024-06-01")]
+
+
+def test_lag_refetches_late_products(tmp_path):
+    published = {"late": False}
+
+    def fetch(districts, start, end):
+        rows = daily("LST")(districts, start, end)
+        if published["late"] and pd.Timestamp(start) <= pd.Timestamp("2024-06-01") < pd.Timestamp(end):
+            rows = pd.concat([rows, pd.DataFrame([{"band": "NDVI", "district": "A",
+                                                   "date": pd.Timestamp("2024-06-01"), "value": 0.5}])])
+        return rows
+
+    for lag, found in ((0, False), (30, True)):
+        cache = ObservationCache(str(tmp_path / str(lag)), lag_days=lag)
+        published["late"] = False
+        cache.update("modis", ["A"], "2024-05-01", "2024-06-20", fetch)
+        # The composite dated June 1 appears only after the daily products passed it
+        published["late"] = True
+        df = cache.update("modis", ["A"], "2024-05-01", "2024-06-21", fetch)
+        assert (df.band == "NDVI").any() == found
+        assert not df.duplicated(["band", "district", "date"]).any()
+
+
+def test_merge_categorical_dates(tmp_path):
+    # ColumnarRecords frames carry dates as an unordered categorical, one value
+    # per pixel and day. When the leading values repeat, pd.to_datetime caches
+    # them and returns a categorical again, which has no max().
+    cache = ObservationCache(str(tmp_path))
+    days = [str(d.date()) for d in pd.date_range("2024-05-01", "2024-05-31")]
+    df = pd.DataFrame({"band": "p", "district": "A", "date": pd.Categorical(sorted(days * 3)), "value": 1.0})
+
+    cache.merge("px", df, ["A"], "2024-05-01", "2024-06-01")
+    assert cache.coverage("px") == {"A": (datetime.date(2024, 5, 1), datetime.date(2024, 5, 31))}
+    assert len(cache.load("px", "2024-05-01", "2024-06-01", ["A"])) == 3 * 31
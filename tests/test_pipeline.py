@@ -0,0 +1,25 @@
+import pytest
+
+import pipeline
+
+
+def test_fingerprint_follows_local_imports(tmp_path):
+    (tmp_path / "page.py").write_text("import os\nimport helper\n")
+    (tmp_path / "helper.py").write_text("def f():\n    from deep import g\n")
+    (tmp_path / "deep.py").write_text("X = 1\n")
+    (tmp_path / "unused.py").write_text("Y = 1\n")
+    page = str(tmp_path / "page.py")
+    assert pipeline.local_modules(page) == [str(tmp_path / "deep.py"), str(tmp_path / "helper.py")]
+
+    stages = {"page": pipeline.Stage(page)}
+    fp = pipeline.fingerprint("page", [], stages)
+    (tmp_path / "unused.py").write_text("Y = 2\n")
+    assert pipeline.fingerprint("page", [], stages) == fp
+    (tmp_path / "deep.py").write_text("X = 2\n")
+    assert pipeline.fingerprint("page", [], stages) != fp
+
+
+@pytest.mark.parametrize("jobs", ["0", "-1"])
+def test_jobs_must_be_positive(jobs):
+    with pytest.raises(SystemExit):
+        pipeline.main(["--jobs", jobs, "--dry-run"])
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import regrid
+
+
+def test_sparse_lattice_nearest_matches_brute_force():
+    # A 0.25° lattice with about half of its cells empty, like gldas_predictors.csv
+    rng = np.random.default_rng(1)
+    gx, gy = np.meshgrid(75 + 0.25 * np.arange(17), 20 - 0.25 * np.arange(14))
+    keep = rng.random(gx.size) < 0.55
+    lon, lat = gx.ravel()[keep], gy.ravel()[keep]
+    index = regrid.build_index(lon, lat)
+    assert isinstance(index, regrid.GridIndex)
+
+    tx, ty = rng.uniform(74.8, 79.4, 2000), rng.uniform(16.5, 20.2, 2000)
+    got = index.nearest(tx, ty)
+    d = np.hypot(tx[:, None] - lon[None], ty[:, None] - lat[None])
+    assert (got >= 0).all()
+    np.testing.assert_allclose(d[np.arange(len(tx)), got], d.min(axis=1))
+
+    # max_dist still bounds the fallback
+    far = index.nearest(np.array([90.0]), np.array([10.0]), max_dist=0.5)
+    assert far.tolist() == [-1]
+
+
+def test_bilinear_with_fewer_than_four_scattered_points():
+    src = regrid.PointSource("s", [75.0, 75.3, 75.9], [19.0, 19.4, 19.1], [[1.0], [2.0], [3.0]], ["v"])
+    assert isinstance(src.index, regrid.TreeIndex)
+    out = src.sample(np.array([75.0, 75.5]), np.array([19.0, 19.2]), method="bilinear")
+    assert out.shape == (2, 1)
+    assert out[0, 0] == pytest.approx(1.0)
+    assert 1.0 < out[1, 0] < 3.0
+
+    one = regrid.PointSource("s", [75.0], [19.0], [[4.0]], ["v"])
+    assert one.sample(np.array([76.0]), np.array([18.0]), method="bilinear").tolist() == [[4.0]]
+
+
+def test_align_static_temporal_and_district_sources():
+    pixels = pd.DataFrame({"lon": [75.0, 75.5, 76.0], "lat": [19.0, 19.0, 19.0],
+                           "district": ["A", "A", "B"]})
+    # Static lattice source: the pixels sit on its points
+    gx, gy = np.meshgrid([75.0, 75.5, 76.0], [19.0, 18.5])
+    static = regrid.PointSource("gldas", gx.ravel(), gy.ravel(),
+                                np.column_stack([gx.ravel(), gy.ravel()]), ["x", "y"])
+    days = pd.date_range("2024-06-01", periods=3)
+    temporal = regrid.PointSource.from_long("rain", pd.DataFrame({
+        "date": np.repeat(days[:2], 2), "lon": [75.0, 76.0] * 2, "lat": [19.0] * 4,
+        "value": [1.0, 2.0, 3.0, 4.0]}))
+    ndvi = regrid.district_series(pd.DataFrame({
+        "district": ["A", "A", "B"], "date": [days[0], days[0], days[2]], "value": [0.2, 0.4, 0.7]}))
+
+    out = regrid.align(pixels, static=[static], temporal=[temporal], district=[("ndvi", ndvi)])
+    np.testing.assert_allclose(out["static"][["x", "y"]].to_numpy(), pixels[["lon", "lat"]].to_numpy())
+    assert list(out["dates"]) == list(days)
+    rain, nd = out["temporal"]["rain"], out["temporal"]["ndvi"]
+    assert rain.shape == nd.shape == (3, 3)
+    np.testing.assert_allclose(rain[:2, [0, 2]], [[1.0, 2.0], [3.0, 4.0]])
+    assert np.isnan(rain[2]).all()
+    np.testing.assert_allclose(nd[0, :2], [0.3, 0.3])
+    assert nd[2, 2] == pytest.approx(0.7) and np.isnan(nd[1]).all()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+import rf_local
+import static_grid
+
+
+def synthetic_grid(tmp_path):
+    # 30 × 40 pixels at 0.005°, one corner outside the districts
+    gx, gy = np.meshgrid(75 + 0.005 * np.arange(40), 19 - 0.005 * np.arange(30))
+    lon, lat = gx.ravel(), gy.ravel()
+    df = pd.DataFrame({"lon": lon, "lat": lat,
+                       "elev": 500 + 2000 * (lon - 75), "slope": 10 * (19 - lat),
+                       "ndvi": np.full(lon.size, 0.4)})
+    df.loc[(lon < 75.02) & (lat > 18.98), ["elev", "slope", "ndvi"]] = np.nan
+    static_grid.build_grid(df, root=str(tmp_path / "grid"))
+    store = static_grid.load_grid(str(tmp_path / "grid"))
+    grid = store.to_frame()
+    grid["district"] = np.where(grid.lon < 75.1, "West", "East")
+    return grid
+
+
+def synthetic_smap(grid, days=6):
+    # Coarse samples every 5th pixel; wetter at low elevation and on later days
+    coarse = grid.iloc[::5][["lon", "lat", "elev"]]
+    frames = []
+    for j, d in enumerate(pd.date_range("2024-06-01", periods=days)):
+        frames.append(pd.DataFrame({"date": d.strftime("%Y-%m-%d"), "lon": coarse.lon, "lat": coarse.lat,
+                                    "sm": 0.4 - 0.0005 * (coarse.elev - 500) + 0.01 * j}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_fit_and_predict_grid_on_static_grid(tmp_path):
+    grid = synthetic_grid(tmp_path)
+    smap = synthetic_smap(grid)
+    assert len(grid) == 30 * 40 - 4 * 4
+
+    X, y, names = rf_local.build_training_set(grid, smap, n_per_date=300)
+    assert X.shape == (len(y), len(names))
+    assert names[-3:] == ["sm_region", "doy_sin", "doy_cos"]
+
+    rf = rf_local.fit(X, y, n_jobs=1, trees=20)
+    ctx = rf_local.date_context(smap)
+    maps = rf_local.predict_grid(rf, grid, ctx, batch_rows=len(grid) * 2)
+    assert maps.shape == (len(ctx), len(grid)) and maps.dtype == np.float32
+    assert np.isfinite(maps).all()
+
+    truth = 0.4 - 0.0005 * (grid.elev.to_numpy() - 500) + 0.01 * np.arange(len(ctx))[:, None]
+    assert np.abs(maps - truth).mean() < 0.02
+    # the elevation gradient survives at 500 m
+    assert np.corrcoef(maps[0], grid.elev)[0, 1] < -0.95
+
+
+def test_downscale_local_maps_roundtrip(tmp_path):
+    grid = synthetic_grid(tmp_path)
+    smap = synthetic_smap(grid, days=3)
+    series, maps = rf_local.downscale_local(grid, smap, n_jobs=1, return_maps=True)
+    assert sorted(series.district.unique()) == ["East", "West"]
+    assert len(series) == 2 * 3
+    west = (grid.district == "West").to_numpy()
+    got = series[series.district == "West"].sm500m.to_numpy()
+    np.testing.assert_allclose(got, maps[:, west].mean(axis=1), rtol=1e-5)
+
+    dates = rf_local.date_context(smap).index
+    rf_local.write_maps(maps, grid, dates, root=str(tmp_path / "maps"))
+    out, lon, lat, meta = rf_local.load_maps(str(tmp_path / "maps"))
+    np.testing.assert_array_equal(out, maps)
+    np.testing.assert_array_equal(lon, grid.lon)
+    assert meta["dates"] == ["2024-06-01", "2024-06-02", "2024-06-03"]
+    assert meta["districts"] == ["East", "West"]
+    assert rf_local.load_maps(str(tmp_path / "none")) is None